@@ -0,0 +1,279 @@
+import ast
+import json
+import re
+from engine import RANKS, SUITS
+
+BET_TYPES = ('truco', 'six', 'nine', 'twelve')
+
+# Portuguese and English spellings the models use, mapped to the engine's names
+ACTION_ALIASES = {
+    'pass': 'pass', 'passar': 'pass', 'passo': 'pass', 'check': 'pass', 'none': 'pass',
+    'accept': 'accept', 'aceitar': 'accept', 'aceito': 'accept', 'aceita': 'accept', 'call': 'accept',
+    'run': 'run', 'correr': 'run', 'corro': 'run', 'corre': 'run', 'fold': 'run', 'fugir': 'run',
+    'bet': 'bet', 'apostar': 'bet', 'aposta': 'bet', 'aumentar': 'bet', 'raise': 'bet', 'trucar': 'bet',
+    'play': 'play', 'jogar': 'play', 'jogo': 'play',
+}
+BET_TYPE_ALIASES = {
+    'truco': 'truco', '3': 'truco',
+    'six': 'six', 'seis': 'six', '6': 'six',
+    'nine': 'nine', 'nove': 'nine', '9': 'nine',
+    'twelve': 'twelve', 'doze': 'twelve', '12': 'twelve',
+}
+RANK_ALIASES = {
+    'dama': 'Q', 'queen': 'Q', 'valete': 'J', 'jack': 'J', 'rei': 'K', 'king': 'K',
+    'ás': 'A', 'as': 'A', 'ace': 'A', 'a': 'A', 'q': 'Q', 'j': 'J', 'k': 'K',
+}
+SUIT_ALIASES = {
+    'paus': 'P', 'copas': 'C', 'espadas': 'E', 'ouros': 'O', 'ouro': 'O',
+    'clubs': 'P', 'hearts': 'C', 'spades': 'E', 'diamonds': 'O',
+    '♣': 'P', '♥': 'C', '♠': 'E', '♦': 'O',
+}
+
+# The regexes of the parser this module replaced, which eval'd the first match
+LEGACY_BET_DICT = re.compile(r'```python\s*(\{[^}]*\})\s*```|(\{[^}]*\})', re.DOTALL)
+LEGACY_PLAY_DICT = re.compile(r'```python\s*({.*?})\s*```|({.*?})', re.DOTALL)
+
+# A quoted string (kept as it is) or a bare word (quoted) in a dict literal
+LITERAL_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|([\wÀ-ſ]+)')
+CODE_BLOCK = re.compile(r'```(?:python|json|py)?\s*(.*?)```', re.DOTALL | re.IGNORECASE)
+DICT_LITERAL = re.compile(r'\{[^{}]*\}', re.DOTALL)
+
+# JSON schemas for providers that support structured outputs (response_format)
+BET_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'action': {'type': 'string', 'enum': ['pass', 'accept', 'run', 'bet']},
+        'bet_type': {'type': ['string', 'null'], 'enum': list(BET_TYPES) + [None]},
+    },
+    'required': ['action', 'bet_type'],
+    'additionalProperties': False,
+}
+PLAY_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'action': {'type': 'string', 'enum': ['play']},
+        'card': {'type': 'array', 'items': {'type': 'string'}, 'minItems': 2, 'maxItems': 2},
+    },
+    'required': ['action', 'card'],
+    'additionalProperties': False,
+}
+# Betting action plus the card for the round, for combined bet-and-play answers
+COMBINED_SCHEMA = {
+    'type': 'object',
+    'properties': dict(BET_SCHEMA['properties'], card=PLAY_SCHEMA['properties']['card']),
+    'required': ['action', 'bet_type', 'card'],
+    'additionalProperties': False,
+}
+
+
+class ActionParseError(ValueError):
+    """The response has no usable action"""
+
+
+def response_format(action_type, with_card=False):
+    """litellm response_format requesting a JSON object for the action"""
+    if action_type == 'bet':
+        schema = COMBINED_SCHEMA if with_card else BET_SCHEMA
+    else:
+        schema = PLAY_SCHEMA
+    return {
+        'type': 'json_schema',
+        'json_schema': {
+            'name': f'truco_{action_type}',
+            'schema': schema,
+            'strict': True,
+        },
+    }
+
+
+def _json_token(match):
+    """JSON string for a bare word or a single-quoted string, other strings unchanged"""
+    token = match.group(0)
+    if match.group(1) is not None:
+        return json.dumps(token, ensure_ascii=False)
+    if token[0] == "'":
+        return json.dumps(token[1:-1], ensure_ascii=False)
+    return token
+
+
+def _load(text):
+    """json first, then Python literals (single quotes), never eval"""
+    try:
+        return json.loads(text), True
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(text), True
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        pass
+    # Unquoted keys/values, e.g. {action: bet, bet_type: truco} or {"action": "play", card: [7, C]}
+    try:
+        return json.loads(LITERAL_TOKEN.sub(_json_token, text)), False
+    except ValueError:
+        return None, False
+
+
+def _candidates(content):
+    """Dicts found in the response, most likely answer first, with whether they parsed strictly"""
+    texts = []
+    # The last code block is the answer; earlier ones are usually examples or drafts
+    for block in reversed(CODE_BLOCK.findall(content)):
+        texts.append(block.strip())
+        texts.extend(reversed(DICT_LITERAL.findall(block)))
+    texts.extend(reversed(DICT_LITERAL.findall(content)))
+    texts.append(content.strip())
+
+    for text in texts:
+        value, strict = _load(text)
+        if isinstance(value, dict):
+            yield value, strict
+
+
+def _normalize_keys(value):
+    return {str(key).strip().lower(): item for key, item in value.items()}
+
+
+def _canonical(raw, aliases):
+    if raw is None:
+        return None
+    key = str(raw).strip().strip('\'"').lower()
+    return aliases.get(key)
+
+
+def normalize_card(raw):
+    """(rank, suit) from a card written as a list, "K P", "KP" or "Rei de Paus", or None"""
+    if isinstance(raw, str):
+        parts = [part for part in re.split(r'[\s,;/\-]+|\bde\b|\bof\b', raw.strip(' ()[]\'"')) if part]
+        if len(parts) == 1 and len(parts[0]) in (2, 3):
+            parts = [parts[0][:-1], parts[0][-1]]
+    elif isinstance(raw, (list, tuple)):
+        parts = [str(part) for part in raw]
+    elif isinstance(raw, dict):
+        raw = _normalize_keys(raw)
+        parts = [str(raw.get('rank', raw.get('valor', ''))), str(raw.get('suit', raw.get('naipe', '')))]
+    else:
+        return None
+    if len(parts) != 2:
+        return None
+
+    rank, suit = (part.strip(' \'"') for part in parts)
+    rank = rank.upper() if rank.upper() in RANKS else RANK_ALIASES.get(rank.lower())
+    suit = suit.upper() if suit.upper() in SUITS else SUIT_ALIASES.get(suit.lower())
+    if rank is None or suit is None:
+        return None
+    return (rank, suit)
+
+
+def _bet_action(value):
+    value = _normalize_keys(value)
+    action = _canonical(value.get('action', value.get('acao', value.get('ação'))), ACTION_ALIASES)
+    bet_type = _canonical(value.get('bet_type', value.get('bet', value.get('aposta'))), BET_TYPE_ALIASES)
+    if action is None:
+        # {"action": "truco"} and friends name the bet directly
+        bet_type = bet_type or _canonical(value.get('action'), BET_TYPE_ALIASES)
+        action = 'bet' if bet_type else None
+    if action == 'bet':
+        if bet_type is None:
+            raise ActionParseError("Bet action without a valid bet_type")
+        return {'action': 'bet', 'bet_type': bet_type}
+    if action in ('pass', 'accept', 'run'):
+        return {'action': action}
+    raise ActionParseError(f"Unknown betting action: {value.get('action')!r}")
+
+
+def _play_action(value, hand):
+    value = _normalize_keys(value)
+    action = _canonical(value.get('action', 'play'), ACTION_ALIASES)
+    if action != 'play':
+        raise ActionParseError(f"Expected a play action, got {value.get('action')!r}")
+    card = normalize_card(value.get('card', value.get('carta')))
+    if card is None:
+        raise ActionParseError(f"Unreadable card: {value.get('card')!r}")
+    if hand is not None and card not in {tuple(c) for c in hand}:
+        raise ActionParseError(f"Invalid card: {card} is not in the player's hand")
+    return {'action': 'play', 'card': list(card)}
+
+
+def legacy_parse_fails(content, action_type, hand=None):
+    """Whether the old regex + eval parser raised on this answer, costing a re-query.
+
+    Literals stand in for eval, which only differs on answers holding code.
+    A bet answer without an 'action' key did not raise: the old parser
+    returned None and the engine played it as a pass.
+    """
+    pattern = LEGACY_BET_DICT if action_type == 'bet' else LEGACY_PLAY_DICT
+    match = pattern.search(content)
+    if not match:
+        return True
+    try:
+        action = ast.literal_eval(match.group(1) or match.group(2))
+        if action_type == 'bet':
+            return 'action' in action and action['action'] == 'bet' and 'bet_type' not in action
+        return action['action'] != 'play' or (hand is not None and tuple(action['card']) not in {tuple(c) for c in hand})
+    except Exception:
+        return True
+
+
+def parse_action(content, action_type, hand=None):
+    """Parse a model answer into an action, returns (action, outcome).
+
+    The outcome is 'strict' when the answer held a well-formed dict with the
+    engine's own names, and 'tolerant' when it needed aliases, case or quoting
+    fixes, or was a bare keyword. Answers the old parser raised on, each of
+    which cost it a re-query, are 'rescued' instead. A bet answer
+    with a dict but no recognizable action is a 'fallback' pass, as it was
+    with the old parser and the engine. Raises ActionParseError when nothing
+    usable is found. hand=None accepts any card, for answers whose hand is unknown.
+    """
+    if not isinstance(content, str) or not content.strip():
+        raise ActionParseError("Empty response")
+
+    action, outcome, error = _parse(content, action_type, hand)
+    if action is not None:
+        if legacy_parse_fails(content, action_type, hand):
+            outcome = 'rescued'
+        return action, outcome
+    if action_type == 'bet' and not legacy_parse_fails(content, action_type, hand):
+        return {'action': 'pass'}, 'fallback'
+    raise error or ActionParseError("No action found in the response")
+
+
+def _parse(content, action_type, hand):
+    """(action, 'strict' or 'tolerant', None), or (None, None, the first error)"""
+    error = None
+    for value, strict in _candidates(content):
+        try:
+            action = _bet_action(value) if action_type == 'bet' else _play_action(value, hand)
+        except ActionParseError as e:
+            error = error or e
+            continue
+        exact = strict and all(
+            str(value.get(key)) == str(item) if key != 'card' else
+            [str(part) for part in value.get('card') or ()] == item
+            for key, item in action.items()
+        )
+        return action, 'strict' if exact else 'tolerant', None
+
+    # A bare keyword answer such as "Correr" or "truco"
+    word = content.strip().strip('`.!\'" \n').lower()
+    if action_type == 'bet':
+        if word in ACTION_ALIASES and ACTION_ALIASES[word] in ('pass', 'accept', 'run'):
+            return {'action': ACTION_ALIASES[word]}, 'tolerant', None
+        if word in BET_TYPE_ALIASES and not word.isdigit():
+            return {'action': 'bet', 'bet_type': BET_TYPE_ALIASES[word]}, 'tolerant', None
+    else:
+        card = normalize_card(word)
+        if card is not None and (hand is None or card in {tuple(c) for c in hand}):
+            return {'action': 'play', 'card': list(card)}, 'tolerant', None
+    return None, None, error
+
+
+def planned_card(content, hand):
+    """Card named next to a betting action in a combined bet-and-play answer, or None"""
+    hand = {tuple(card) for card in hand}
+    for value, _ in _candidates(content):
+        value = _normalize_keys(value)
+        card = normalize_card(value.get('card', value.get('carta')))
+        if card in hand:
+            return card
+    return None
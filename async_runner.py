@@ -0,0 +1,142 @@
+import asyncio
+import os
+import signal
+import sys
+import time
+from completion_cache import CompletionCache
+from bradley_terry import load_match_results
+from rating_service import RatingService
+from metrics import get_metrics
+from checkpoint import unfinished_checkpoints
+from budget_controller import BudgetController
+from llm_play import aplay_match, aplay_duplicate_match, AVAILABLE_MODELS, player_options_from_env
+
+# Concurrent requests allowed per provider prefix; the longest matching prefix wins
+PROVIDER_LIMITS = {
+    'gemini/': 32,
+    'openrouter/': 128,
+}
+DEFAULT_PROVIDER_LIMIT = 8
+MAX_MATCHES_IN_FLIGHT = 256
+ROUND_PAIRS = 32  # Pairings scheduled between two looks at the leaderboard tests
+
+
+class ProviderLimiter:
+    """One asyncio.Semaphore per provider prefix, shared by every match on the loop"""
+
+    def __init__(self, limits=None, default_limit=DEFAULT_PROVIDER_LIMIT):
+        self.limits = dict(PROVIDER_LIMITS if limits is None else limits)
+        self.default_limit = default_limit
+        self._semaphores = {}
+
+    def provider(self, model):
+        """Provider prefix a model's requests are counted against"""
+        matches = [prefix for prefix in self.limits if model.startswith(prefix)]
+        if matches:
+            return max(matches, key=len)
+        return model.split('/')[0] + '/'
+
+    def slot(self, model):
+        """Semaphore to hold while a request to this model is in flight"""
+        provider = self.provider(model)
+        semaphore = self._semaphores.get(provider)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.limits.get(provider, self.default_limit))
+            self._semaphores[provider] = semaphore
+        return semaphore
+
+
+async def run_tournament(pairs, limiter, cache=None, ratings=None, max_matches_in_flight=MAX_MATCHES_IN_FLIGHT,
+                         player_options=None, checkpoints=(), duplicate=False):
+    """Play every (model_A, model_B) pair concurrently, returns the number of failed matches.
+
+    Matches in `checkpoints` are resumed alongside the new pairs. Each finished
+    match is fed to the optional RatingService, which rewrites the live leaderboard.
+    With duplicate=True each pair is a duplicate pair of two matches (see
+    aplay_duplicate_match) taking one match slot and counting as one result.
+    """
+    match_slots = asyncio.Semaphore(max_matches_in_flight)
+
+    async def run_one(model_a=None, model_b=None, resume=None):
+        async with match_slots:
+            if resume is not None:
+                result = await aplay_match(cache=cache, limiter=limiter, resume=resume)
+            elif duplicate:
+                result = await aplay_duplicate_match(model_a, model_b, cache=cache, limiter=limiter,
+                                                     **(player_options or {}))
+            else:
+                result = await aplay_match(model_a, model_b, cache=cache, limiter=limiter, **(player_options or {}))
+        if result and result[2] and ratings:  # No winner when a duplicate pair ties
+            ratings.add_result(*result)
+            # The bootstrap is CPU-bound; keep it off the event loop
+            await asyncio.to_thread(ratings.write_leaderboard)
+
+    tasks = [asyncio.create_task(run_one(resume=checkpoint)) for checkpoint in checkpoints]
+    tasks += [asyncio.create_task(run_one(model_a, model_b)) for model_a, model_b in pairs]
+    try:
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    except asyncio.CancelledError:
+        # gather() has already cancelled its children; wait until they have unwound
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        cancelled = sum(task.cancelled() for task in tasks)
+        print(f"\nCancelled {cancelled} of {len(tasks)} matches")
+        raise
+
+    failures = [result for result in results if isinstance(result, Exception)]
+    for failure in failures:
+        print(f"Match failed: {failure!r}")
+    return len(failures)
+
+
+async def main(num_matches, resume=False, duplicate=False):
+    """Play up to num_matches new matches, or with resume=True finish the ones left in checkpoints/.
+
+    New matches are scheduled in rounds of ROUND_PAIRS pairings picked by a
+    BudgetController from the live ratings, and stop early once every
+    neighbour pair on the leaderboard is settled. duplicate=True plays
+    duplicate pairs, two matches each.
+    """
+    # Ctrl-C cancels the tournament task, which cancels every match in flight; their checkpoints stay for --resume
+    asyncio.get_running_loop().add_signal_handler(signal.SIGINT, asyncio.current_task().cancel)
+
+    cache_path = os.environ.get("TRUCO_COMPLETION_CACHE")
+    cache = CompletionCache(cache_path) if cache_path else None
+    ratings = RatingService(load_match_results())
+    controller = BudgetController(ratings, AVAILABLE_MODELS)
+    limiter = ProviderLimiter()
+    player_options = player_options_from_env()
+    matches_per_pair = 2 if duplicate else 1
+
+    start = time.perf_counter()
+    played = failures = 0
+    try:
+        if resume:
+            checkpoints = unfinished_checkpoints()
+            failures = await run_tournament([], limiter, cache=cache, ratings=ratings, checkpoints=checkpoints)
+            played = len(checkpoints)
+        while not resume and played < num_matches:
+            pairs = controller.select_pairs(min(ROUND_PAIRS, max(1, (num_matches - played) // matches_per_pair)))
+            if not pairs:
+                print("Every neighbour pair on the leaderboard is settled, no match left worth playing")
+                break
+            failures += await run_tournament(pairs, limiter, cache=cache, ratings=ratings,
+                                             player_options=player_options, duplicate=duplicate) * matches_per_pair
+            played += len(pairs) * matches_per_pair
+            controller.print_status()
+    except asyncio.CancelledError:
+        return 130
+    finally:
+        if cache:
+            print('Completion cache:', cache.stats())
+        get_metrics().write()
+    print(f"Played {played - failures}/{played} matches in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    # --duplicate plays duplicate pairs: the same deals twice with the models' seats swapped
+    args = [arg for arg in sys.argv[1:] if arg not in ('--resume', '--duplicate')]
+    sys.exit(asyncio.run(main(int(args[0]) if args else 64, resume='--resume' in sys.argv,
+                              duplicate='--duplicate' in sys.argv)))
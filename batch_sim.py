@@ -0,0 +1,138 @@
+import time
+import numpy as np
+from engine import RANKS, SUITS, NUM_CARDS, STRENGTH_TABLES
+
+# (10, 40) strength lookup: row = vira rank, column = card index
+STRENGTH = np.array(STRENGTH_TABLES, dtype=np.int16)
+
+HAND_SIZE = 3
+CARDS_PER_DEAL = 2 * HAND_SIZE + 1  # Two hands plus the vira
+
+
+def random_policy(hand_strength, available, opponent_strength, rng):
+    """Play a uniformly random card among the ones still in hand"""
+    scores = np.where(available, rng.random(available.shape), -1.0)
+    return scores.argmax(axis=1)
+
+
+def highest_card_policy(hand_strength, available, opponent_strength, rng):
+    """Always play the strongest card still in hand"""
+    return np.where(available, hand_strength, -1).argmax(axis=1)
+
+
+def lowest_winning_policy(hand_strength, available, opponent_strength, rng):
+    """Play the weakest card that beats the opponent, or the weakest card if none does.
+
+    When leading the round there is nothing to beat, so the strongest card is played.
+    """
+    if opponent_strength is None:
+        return highest_card_policy(hand_strength, available, opponent_strength, rng)
+
+    masked_low = np.where(available, hand_strength, np.iinfo(np.int16).max)
+    winning = available & (hand_strength > opponent_strength[:, None])
+    lowest_winning = np.where(winning, hand_strength, np.iinfo(np.int16).max).argmin(axis=1)
+    lowest = masked_low.argmin(axis=1)
+    return np.where(winning.any(axis=1), lowest_winning, lowest)
+
+
+POLICIES = {
+    'random': random_policy,
+    'highest': highest_card_policy,
+    'lowest_winning': lowest_winning_policy,
+}
+
+
+class BatchTrucoSimulator:
+    """Vectorized counterpart of TrucoEngine that plays many hands at once.
+
+    Cards use the same 0..39 indices as engine.CARDS. Betting is not simulated:
+    every hand is worth one point, and player A leads every round, as in play_match.
+    Policies are callables (hand_strength, available, opponent_strength, rng) -> column,
+    where hand_strength and available are (n, 3) arrays and opponent_strength is None
+    for the leading player.
+    """
+
+    def __init__(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+
+    def deal(self, n):
+        """Deal n independent hands, returns a dict of per-row arrays"""
+        # A uniformly random ordered 7-card sample per row: pick the 7 smallest
+        # keys with argpartition, then order them by their key
+        keys = self.rng.random((n, NUM_CARDS))
+        picked = np.argpartition(keys, CARDS_PER_DEAL, axis=1)[:, :CARDS_PER_DEAL]
+        order = np.take_along_axis(keys, picked, axis=1).argsort(axis=1)
+        cards = np.take_along_axis(picked, order, axis=1).astype(np.int8)
+
+        vira = cards[:, -1]
+        vira_rank = vira // len(SUITS)
+        strength = STRENGTH[vira_rank]
+        return {
+            'hands': cards[:, :2 * HAND_SIZE].reshape(n, 2, HAND_SIZE),
+            'vira': vira,
+            'manilha_rank': (vira_rank + 1) % len(RANKS),
+            'strength': strength,
+        }
+
+    def play_hands(self, deal, policy_a, policy_b):
+        """Play all three rounds of every dealt hand, returns (hand_winners, round_winners)"""
+        hands = deal['hands']
+        n = hands.shape[0]
+        rows = np.arange(n)
+
+        hand_strength = np.take_along_axis(deal['strength'], hands.reshape(n, -1), axis=1)
+        hand_strength = hand_strength.reshape(n, 2, HAND_SIZE)
+        available = np.ones((n, 2, HAND_SIZE), dtype=bool)
+        round_winners = np.empty((n, HAND_SIZE), dtype=np.int8)
+
+        for round_num in range(HAND_SIZE):
+            col_a = policy_a(hand_strength[:, 0], available[:, 0], None, self.rng)
+            strength_a = hand_strength[rows, 0, col_a]
+            available[rows, 0, col_a] = False
+
+            col_b = policy_b(hand_strength[:, 1], available[:, 1], strength_a, self.rng)
+            strength_b = hand_strength[rows, 1, col_b]
+            available[rows, 1, col_b] = False
+
+            round_winners[:, round_num] = np.where(strength_a > strength_b, 0, 1)
+
+        # Rounds never tie, so whoever takes two of the three rounds wins the hand
+        hand_winners = (round_winners.sum(axis=1) >= 2).astype(np.int8)
+        return hand_winners, round_winners
+
+    def simulate_hands(self, n, policy_a, policy_b):
+        """Deal and play n hands, returns the hand winner of each row"""
+        hand_winners, _ = self.play_hands(self.deal(n), policy_a, policy_b)
+        return hand_winners
+
+    def simulate_matches(self, n, policy_a, policy_b, target_score=12):
+        """Play n matches to target_score, returns (scores, hands_played) arrays"""
+        scores = np.zeros((n, 2), dtype=np.int16)
+        hands_played = np.zeros(n, dtype=np.int16)
+        active = np.arange(n)
+
+        while active.size:
+            hand_winners = self.simulate_hands(active.size, policy_a, policy_b)
+            scores[active, hand_winners] += 1
+            hands_played[active] += 1
+            active = active[scores[active].max(axis=1) < target_score]
+
+        return scores, hands_played
+
+
+if __name__ == '__main__':
+    simulator = BatchTrucoSimulator(seed=0)
+    num_hands = 1_000_000
+
+    for name_a, policy_a in POLICIES.items():
+        for name_b, policy_b in POLICIES.items():
+            start = time.perf_counter()
+            winners = simulator.simulate_hands(num_hands, policy_a, policy_b)
+            elapsed = time.perf_counter() - start
+            print(f"{name_a:>15} vs {name_b:<15} A wins {1 - winners.mean():.4f} "
+                  f"({num_hands / elapsed:,.0f} hands/s)")
+
+    scores, hands_played = simulator.simulate_matches(100_000, random_policy, random_policy)
+    a_wins = scores[:, 0] >= 12
+    print(f"random vs random matches: A wins {a_wins.mean():.4f} "
+          f"(std {a_wins.std():.4f}), mean hands per match {hands_played.mean():.2f}")
@@ -0,0 +1,160 @@
+import random
+import numpy as np
+from trace_store import TRACE_DIR, load_match_traces
+from duplicate import pair_duplicates
+
+# Every model also plays PRIOR_GAMES virtual wins and losses against a fixed
+# reference player. This keeps the fit finite for unbeaten (or winless)
+# models and acts as a weak prior pulling ratings towards the reference.
+PRIOR_GAMES = 1.0
+
+
+def load_match_results(trace_dir=TRACE_DIR):
+    """Read (model_A, model_B, winner) for every completed match in the trace files.
+
+    Both matches of a duplicate pair count as a single result, see duplicate.pair_duplicates.
+    """
+    matches = []
+    for records in load_match_traces(trace_dir, types={'match_start', 'match_end'}).values():
+        header = None
+        final_scores = None
+        for record in records:
+            if record['type'] == 'match_start':
+                header = record
+            else:
+                final_scores = record['final_scores']
+        if header is None or final_scores is None:
+            continue
+        matches.append((header['model_a'], header['model_b'], final_scores, header.get('duplicate_id')))
+    return pair_duplicates(matches)
+
+
+def win_matrix(models, results):
+    """wins[i, j] = number of matches model i won against model j"""
+    index = {model: i for i, model in enumerate(models)}
+    wins = np.zeros((len(models), len(models)))
+    for model_a, model_b, winner in results:
+        if model_a not in index or model_b not in index:
+            continue
+        i, j = index[model_a], index[model_b]
+        if winner == 'A':
+            wins[i, j] += 1
+        else:
+            wins[j, i] += 1
+    return wins
+
+
+def _with_reference(wins, prior_games):
+    """Append the virtual reference player as the last row/column (supports leading batch dims)"""
+    n = wins.shape[-1]
+    augmented = np.zeros(wins.shape[:-2] + (n + 1, n + 1))
+    augmented[..., :n, :n] = wins
+    augmented[..., :n, n] = prior_games
+    augmented[..., n, :n] = prior_games
+    return augmented
+
+
+def fit(wins, prior_games=PRIOR_GAMES, theta0=None, tol=1e-8, max_iter=10000):
+    """Fit Bradley-Terry log-strengths with Hunter's MM algorithm, returns (theta, iterations)
+
+    theta is centered to mean zero. theta0 warm-starts the iterations from a
+    previous fit. wins may carry leading batch dimensions (e.g. bootstrap
+    resamples), which are all fitted at once.
+    """
+    augmented = _with_reference(wins, prior_games)
+    games = augmented + np.swapaxes(augmented, -1, -2)
+    total_wins = augmented.sum(axis=-1)
+    n = wins.shape[-1]
+
+    strength = np.ones(augmented.shape[:-1])
+    if theta0 is not None:
+        strength[..., :n] = np.exp(theta0 - np.mean(theta0, axis=-1, keepdims=True))
+
+    for iteration in range(1, max_iter + 1):
+        denom = (games / (strength[..., :, None] + strength[..., None, :])).sum(axis=-1)
+        updated = total_wins / denom
+        # Keep the models' geometric mean at 1 so a centered warm start is already in scale
+        updated /= np.exp(np.mean(np.log(updated[..., :n]), axis=-1, keepdims=True))
+        converged = np.max(np.abs(np.log(updated) - np.log(strength))) < tol
+        strength = updated
+        if converged:
+            break
+
+    return np.log(strength[..., :n]), iteration
+
+
+def covariance(theta, wins, prior_games=PRIOR_GAMES):
+    """Laplace approximation of the posterior covariance of the centered theta"""
+    games = _with_reference(wins, prior_games)
+    games = games + games.T
+    n = len(theta)
+    # The prior games are taken against a reference at the mean rating
+    full_theta = np.append(theta, 0.0)
+    p = 1 / (1 + np.exp(full_theta[None, :] - full_theta[:, None]))
+    information = games * p * (1 - p)
+    hessian = np.diag(information.sum(axis=1)) - information
+    centering = np.eye(n) - 1 / n
+    return centering @ np.linalg.inv(hessian[:n, :n]) @ centering
+
+
+def variance_reduction(theta, cov, contrasts=None):
+    """Drop in total rating variance expected from one more match of each pair.
+
+    One match between i and j adds p(1-p) * d d^T to the posterior precision,
+    with d = e_i - e_j, whatever the outcome; Sherman-Morrison gives the new
+    covariance's trace. With contrasts (one column c per rating difference of
+    interest) it is the drop in the summed variances of c^T theta instead.
+    """
+    p = 1 / (1 + np.exp(theta[None, :] - theta[:, None]))
+    w = p * (1 - p)
+    diag = np.diag(cov)
+    # d^T cov d and ||C^T cov d||^2 for every pair at once
+    pair_var = diag[:, None] + diag[None, :] - 2 * cov
+    projected = cov if contrasts is None else cov @ contrasts
+    cov_sq = projected @ projected.T
+    sq_diag = np.diag(cov_sq)
+    pair_norm = sq_diag[:, None] + sq_diag[None, :] - 2 * cov_sq
+    reduction = w * pair_norm / (1 + w * pair_var)
+    np.fill_diagonal(reduction, -np.inf)
+    return reduction
+
+
+def select_pairs(models, results, k, rng=random, targets=None, retired=()):
+    """Pick k (model_A, model_B) pairings that shrink rating uncertainty the most.
+
+    Pairs are chosen greedily: after each pick the covariance is updated as if
+    that match had been played, so a batch for concurrent workers spreads out
+    instead of repeating the single most informative pair. Seats are random.
+    targets, (model, model) pairs, narrows the uncertainty to shrink down to
+    those rating differences; retired models are never picked.
+    """
+    wins = win_matrix(models, results)
+    theta, _ = fit(wins)
+    cov = covariance(theta, wins)
+    p = 1 / (1 + np.exp(theta[None, :] - theta[:, None]))
+    index = {model: i for i, model in enumerate(models)}
+    contrasts = None
+    if targets:
+        contrasts = np.zeros((len(models), len(targets)))
+        for column, (model_i, model_j) in enumerate(targets):
+            contrasts[index[model_i], column], contrasts[index[model_j], column] = 1.0, -1.0
+    excluded = [index[model] for model in retired if model in index]
+
+    pairs = []
+    for _ in range(k):
+        reduction = variance_reduction(theta, cov, contrasts)
+        reduction[excluded, :] = -np.inf
+        reduction[:, excluded] = -np.inf
+        if np.isneginf(reduction).all():
+            break
+        i, j = np.unravel_index(np.argmax(reduction), cov.shape)
+        d = np.zeros(len(models))
+        d[i], d[j] = 1.0, -1.0
+        cov_d = cov @ d
+        w = p[i, j] * (1 - p[i, j])
+        cov = cov - w * np.outer(cov_d, cov_d) / (1 + w * d @ cov_d)
+
+        pair = [models[i], models[j]]
+        rng.shuffle(pair)
+        pairs.append(tuple(pair))
+    return pairs
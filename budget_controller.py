@@ -0,0 +1,120 @@
+import math
+import random
+from statistics import NormalDist
+import numpy as np
+from bradley_terry import win_matrix, fit, covariance, select_pairs
+
+# Sequential test between neighbours on the leaderboard: H0 "no difference"
+# against H1 "the upper model is DELTA ahead in log-strength" (DELTA = 0.5 is
+# a 62% expected win rate), with error rates ALPHA and BETA
+DELTA = 0.5
+ALPHA = 0.05
+BETA = 0.05
+MIN_MATCHES = 10  # Matches a model plays before any test on it can stop
+MAX_MATCHES = 100  # Budget ceiling per model, however contested its neighbours stay
+STATUS_LABELS = {'ordered': 'ordem decidida', 'equivalent': 'equivalentes', 'contested': 'em disputa'}
+
+
+class BudgetController:
+    """Decides which models and pairings are still worth paying for.
+
+    The candidate models are ranked by a Bradley-Terry fit of the results in a
+    live RatingService, and each pair of neighbours in that ranking is tested
+    sequentially. With method='sprt' the test is Wald's SPRT on the normal
+    approximation of their rating difference d (standard error se from the
+    Laplace covariance): the log-likelihood ratio of d = DELTA against d = 0 is
+    (d * DELTA - DELTA**2 / 2) / se**2. Crossing log((1 - beta) / alpha) settles
+    the pair as ordered, crossing log(beta / (1 - alpha)) settles it as
+    equivalent, i.e. closer than DELTA and not worth more matches. With
+    method='overlap' a pair is ordered once the models' confidence intervals
+    stop overlapping, and equivalent once the interval of d fits in
+    (-DELTA, DELTA).
+
+    A model whose neighbour pairs are all settled (or that reached
+    max_matches) is retired, and new matches go only to the pairings that
+    shrink the variance of the contested differences the most.
+    """
+
+    def __init__(self, ratings, models, method='sprt', delta=DELTA, alpha=ALPHA, beta=BETA, confidence=0.95,
+                 min_matches=MIN_MATCHES, max_matches=MAX_MATCHES):
+        if method not in ('sprt', 'overlap'):
+            raise ValueError(f"Unknown method {method!r}, expected 'sprt' or 'overlap'")
+        self.ratings = ratings
+        self.models = list(models)
+        self.method = method
+        self.delta = delta
+        self.upper_bound = math.log((1 - beta) / alpha)
+        self.lower_bound = math.log(beta / (1 - alpha))
+        self.z = NormalDist().inv_cdf((1 + confidence) / 2)
+        self.min_matches = min_matches
+        self.max_matches = max_matches
+
+    def _fit(self):
+        """Matches played, ratings and their covariance for the candidate models"""
+        wins = win_matrix(self.models, self.ratings.results())
+        theta, _ = fit(wins)
+        return wins.sum(axis=0) + wins.sum(axis=1), theta, covariance(theta, wins)
+
+    def _status(self, test, upper_sd, lower_sd):
+        if self.method == 'sprt':
+            if test['llr'] >= self.upper_bound:
+                return 'ordered'
+            if test['llr'] <= self.lower_bound:
+                return 'equivalent'
+            return 'contested'
+        if test['diff'] > self.z * (upper_sd + lower_sd):
+            return 'ordered'
+        if abs(test['diff']) + self.z * test['se'] < self.delta:
+            return 'equivalent'
+        return 'contested'
+
+    def adjacent_tests(self):
+        """Test of every pair of neighbours in the current ranking, best models first"""
+        games, theta, cov = self._fit()
+        order = np.argsort(-theta, kind='stable')
+        tests = []
+        for upper, lower in zip(order, order[1:]):
+            diff = float(theta[upper] - theta[lower])
+            variance = float(cov[upper, upper] + cov[lower, lower] - 2 * cov[upper, lower])
+            test = {
+                'upper': self.models[upper],
+                'lower': self.models[lower],
+                'diff': diff,
+                'se': math.sqrt(variance),
+                'llr': (diff * self.delta - self.delta ** 2 / 2) / variance,
+                'matches': (int(games[upper]), int(games[lower])),
+            }
+            if min(test['matches']) < self.min_matches:
+                test['status'] = 'contested'
+            else:
+                test['status'] = self._status(test, math.sqrt(cov[upper, upper]), math.sqrt(cov[lower, lower]))
+            tests.append(test)
+        return tests
+
+    def retired_models(self, tests=None):
+        """Models whose place in the ranking is settled, or whose budget is spent"""
+        tests = self.adjacent_tests() if tests is None else tests
+        contested = {model for test in tests if test['status'] == 'contested' for model in (test['upper'], test['lower'])}
+        counts = {model: matches for test in tests for model, matches in zip((test['upper'], test['lower']),
+                                                                             test['matches'])}
+        return [model for model in self.models
+                if model not in contested or (self.max_matches is not None and counts.get(model, 0) >= self.max_matches)]
+
+    def select_pairs(self, k, rng=random):
+        """Up to k (model_A, model_B) pairings aimed at the contested neighbours, none once all are settled"""
+        tests = self.adjacent_tests()
+        retired = set(self.retired_models(tests))
+        targets = [(test['upper'], test['lower']) for test in tests
+                   if test['status'] == 'contested' and not {test['upper'], test['lower']} & retired]
+        if not targets:
+            return []
+        return select_pairs(self.models, self.ratings.results(), k, rng, targets=targets, retired=retired)
+
+    def print_status(self, tests=None):
+        tests = self.adjacent_tests() if tests is None else tests
+        print("| Par | Diferença | Erro padrão | LLR | Situação |")
+        print("|-----|-----------|-------------|-----|----------|")
+        for test in tests:
+            print(f"| {test['upper'].split('/')[-1]} > {test['lower'].split('/')[-1]} | {test['diff']:.2f} | "
+                  f"{test['se']:.2f} | {test['llr']:.2f} | {STATUS_LABELS[test['status']]} |")
+
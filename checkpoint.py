@@ -0,0 +1,155 @@
+import json
+import os
+from pathlib import Path
+
+CHECKPOINT_DIR = "checkpoints"
+
+
+class CheckpointMismatch(Exception):
+    """A resumed match asked for a decision that does not match the checkpoint"""
+
+
+def engine_snapshot(engine):
+    """Scores and deck RNG state of an engine, as plain JSON values"""
+    return json.loads(json.dumps({'scores': engine.scores, 'rng_state': engine.rng.getstate()}))
+
+
+class MatchCheckpoint:
+    """Decision log of an unfinished match, journaled after every decision.
+
+    The generator driving a match cannot be pickled, but the engine is seeded:
+    the seed plus the decisions so far determine the engine state. Resuming
+    replays the logged decisions on a fresh engine, checks the scores and deck
+    RNG against the snapshot taken at the last decision, and carries on with
+    live players from there. A resumed match keeps its checkpoint file;
+    decisions replayed from it are not written again.
+
+    The file is an append-only JSON lines journal: a header with the match
+    fields, then one line per decision, carrying the engine snapshot when it
+    changed since the previous line, and a {'match_id': ...} line when a resumed attempt first records. Each
+    decision costs one short append and fsync, however long the match.
+    """
+
+    def __init__(self, match_id, model_a, model_b, seed, engine=None, player_options=None, decisions=None,
+                 snapshot=None, checkpoint_dir=CHECKPOINT_DIR, checkpoint_id=None, duplicate_id=None, job_id=None):
+        self.match_id = match_id  # Trace match_id of the latest attempt
+        self.checkpoint_id = checkpoint_id or match_id
+        self.model_a = model_a
+        self.model_b = model_b
+        self.seed = seed
+        self.duplicate_id = duplicate_id  # Set for one half of a duplicate pair (see duplicate.py)
+        self.job_id = job_id  # Set for matches played from the job queue (see job_queue.py)
+        self.engine = engine
+        self.player_options = player_options or {}
+        self.decisions = decisions or []  # [player, action_type, action]
+        self.snapshot = snapshot  # Engine state when the last decision was asked for
+        self.path = Path(checkpoint_dir) / f"checkpoint_{self.checkpoint_id}.jsonl"
+        self._cursor = 0
+        self._journaled_match_id = None  # match_id the journal last recorded, None before its header
+        self._journaled_snapshot = None
+
+    @classmethod
+    def load(cls, path):
+        path = Path(path)
+        data = {}
+        decisions = []
+        snapshot = None
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # Partially written last line
+                if 'decision' in entry:
+                    decisions.append(entry['decision'])
+                    snapshot = entry.get('snapshot', snapshot)
+                else:
+                    data.update(entry)
+        checkpoint = cls(
+            data['match_id'], data['model_a'], data['model_b'], data['seed'],
+            player_options=data.get('player_options'), decisions=decisions,
+            snapshot=snapshot, checkpoint_dir=path.parent, checkpoint_id=data['checkpoint_id'],
+            duplicate_id=data.get('duplicate_id'), job_id=data.get('job_id'),
+        )
+        checkpoint._journaled_match_id = checkpoint.match_id
+        checkpoint._journaled_snapshot = snapshot
+        return checkpoint
+
+    def decisions_for(self, player):
+        """(action_type, action) logged for one seat, in order"""
+        return [(action_type, action) for name, action_type, action in self.decisions if name == player]
+
+    def record(self, player, action_type, action):
+        """Add a decision and persist the checkpoint; replayed decisions are only checked"""
+        snapshot = engine_snapshot(self.engine) if self.engine is not None else None
+        if self._cursor < len(self.decisions):
+            logged = self.decisions[self._cursor]
+            if logged[:2] != [player, action_type]:
+                raise CheckpointMismatch(f"Checkpoint {self.checkpoint_id} logged {logged[:2]}, "
+                                         f"replay produced {[player, action_type]}")
+            self._cursor += 1
+            replayed = self._cursor == len(self.decisions)
+            if replayed and None not in (snapshot, self.snapshot) and snapshot != self.snapshot:
+                raise CheckpointMismatch(f"Checkpoint {self.checkpoint_id}: replayed engine state differs "
+                                         f"from the saved one")
+            return
+        self.decisions.append([player, action_type, action])
+        self.snapshot = snapshot
+        self._cursor += 1
+        self.save()
+
+    def save(self):
+        """Journal the latest decision, after the header or match_id change it needs"""
+        entries = []
+        if self._journaled_match_id is None:
+            entries.append(self._header())
+        elif self._journaled_match_id != self.match_id:
+            entries.append({'match_id': self.match_id})
+        entry = {'decision': self.decisions[-1]}
+        if self.snapshot != self._journaled_snapshot:
+            entry['snapshot'] = self.snapshot  # Only changes between hands
+        entries.append(entry)
+        self._append(entries)
+        self._journaled_match_id = self.match_id
+        self._journaled_snapshot = self.snapshot
+
+    def _header(self):
+        return {
+            'checkpoint_id': self.checkpoint_id,
+            'match_id': self.match_id,
+            'model_a': self.model_a,
+            'model_b': self.model_b,
+            'seed': self.seed,
+            'duplicate_id': self.duplicate_id,
+            'job_id': self.job_id,
+            'player_options': self.player_options,
+        }
+
+    def _append(self, entries):
+        self.path.parent.mkdir(exist_ok=True)
+        data = ''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def remove(self):
+        """Drop the checkpoint once the match has a result"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def unfinished_checkpoints(checkpoint_dir=CHECKPOINT_DIR):
+    """Checkpoints of matches that never finished, oldest first"""
+    checkpoint_dir = Path(checkpoint_dir)
+    checkpoints = []
+    for path in sorted(checkpoint_dir.glob("checkpoint_*.jsonl")):
+        try:
+            checkpoints.append(MatchCheckpoint.load(path))
+        except FileNotFoundError:
+            continue  # The match finished since the directory was listed
+        except (ValueError, KeyError) as e:
+            print(f"Skipping unreadable checkpoint {path}: {e}")
+    return checkpoints
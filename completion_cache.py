@@ -0,0 +1,142 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+EVICT_BATCH = 256  # Least recently used rows read per eviction query
+
+def normalize_messages(messages):
+    """Drop formatting noise that does not change what the model sees"""
+    return [
+        {
+            'role': message['role'],
+            'content': message['content'].replace('\r\n', '\n').strip()
+            if isinstance(message['content'], str) else message['content'],
+        }
+        for message in messages
+    ]
+
+
+def cache_key(model, messages, params=None):
+    """Content hash of a completion request"""
+    payload = {
+        'model': model,
+        'messages': normalize_messages(messages),
+        'params': params or {},
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class CompletionCache:
+    """SQLite-backed store of completion responses with a size cap and LRU eviction.
+
+    Responses are stored as the JSON dict from `response.model_dump()`. The
+    database runs in WAL mode, so several processes can share one file. A
+    one-row cache_stats table keeps the total size and entry count, updated
+    in the same transaction as every insert and eviction, so neither needs a
+    scan of the table.
+    """
+
+    def __init__(self, path="completion_cache.sqlite", max_bytes=1024 ** 3):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            BEGIN IMMEDIATE;
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS completions_last_access ON completions (last_access);
+            CREATE TABLE IF NOT EXISTS cache_stats (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                bytes INTEGER NOT NULL,
+                entries INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO cache_stats VALUES (1, 0, 0);
+            COMMIT;
+        """)
+
+    def get(self, key):
+        """Return the cached response dict for key, or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE completions SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, model, response):
+        """Store a response dict and evict least recently used entries over the size cap"""
+        encoded = json.dumps(response, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT size FROM completions WHERE key = ?", (key,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO completions (key, model, response, size, created, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, model, encoded, len(encoded), now, now)
+                )
+                self._conn.execute(
+                    "UPDATE cache_stats SET bytes = bytes + ?, entries = entries + ? WHERE id = 1",
+                    (len(encoded) - (row[0] if row else 0), 0 if row else 1)
+                )
+                self._evict()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self):
+        """Delete least recently used rows, a batch at a time, until the cache fits in max_bytes"""
+        total = self._conn.execute("SELECT bytes FROM cache_stats WHERE id = 1").fetchone()[0]
+        while total > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM completions ORDER BY last_access LIMIT ?", (EVICT_BATCH,)
+            ).fetchall()
+            evicted = []
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                evicted.append((key,))
+                total -= size
+            if not evicted:
+                break
+            self._conn.executemany("DELETE FROM completions WHERE key = ?", evicted)
+            self._conn.execute("UPDATE cache_stats SET bytes = ?, entries = entries - ? WHERE id = 1",
+                               (total, len(evicted)))
+            self.evictions += len(evicted)
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT entries, bytes FROM cache_stats WHERE id = 1").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': entries,
+            'bytes': size,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,318 @@
+import json
+import sqlite3
+import sys
+import time
+from collections import deque
+from pathlib import Path
+from action_parser import ActionParseError, parse_action
+from event_log import EVENT_DIR, event_log_path, read_events
+from llm_play import DECISION_STATE_KEYS, format_game_state
+from replay import ReplayDivergence, event_replay, replay_decisions
+from trace_store import TRACE_DIR, trace_files, read_trace_records, legacy_match_id
+
+DEFAULT_INDEX_PATH = "decision_index.sqlite"
+
+# One row per decision; the parsed action is split into plain columns so the
+# behavioral queries never touch JSON
+DECISION_COLUMNS = (
+    'match_id', 'file', 'model', 'opponent', 'player', 'action_type', 'action', 'bet_type', 'card',
+    'my_score', 'opponent_score', 'current_bet', 'pending_bet', 'betting_round',
+    'prompt_tokens', 'cached_prompt_tokens', 'completion_tokens', 'reasoning_tokens', 'cost', 'latency', 'retries', 'cached',
+    'parse', 'parse_failures', 'planned',
+)
+
+# Per-model rates behind the README analyses: how often a model raises when it
+# could, and how it answers the opponent's bets
+BEHAVIOR_QUERY = """
+    SELECT
+        model,
+        COUNT(*) AS decisions,
+        AVG(action = 'bet') FILTER (WHERE action_type = 'bet') AS bet_rate,
+        AVG(action = 'bet') FILTER (WHERE action_type = 'bet' AND pending_bet IS NULL) AS aggressiveness,
+        AVG(action = 'run') FILTER (WHERE action_type = 'bet' AND pending_bet IS NOT NULL) AS run_rate,
+        AVG(action = 'accept') FILTER (WHERE action_type = 'bet' AND pending_bet IS NOT NULL) AS accept_rate,
+        AVG(planned) FILTER (WHERE action_type = 'play') AS planned_play_rate,
+        AVG(retries) AS retries,
+        AVG(latency) AS latency,
+        1.0 * SUM(cached_prompt_tokens) / SUM(prompt_tokens) AS prompt_cache_rate,
+        SUM(cost) AS cost
+    FROM decisions
+    GROUP BY model
+    ORDER BY model
+"""
+
+# What the tolerant action parser saves per model: every 'rescued' parse is an
+# answer the old regex + eval parser raised on, i.e. one paid re-query avoided,
+# priced at the model's average latency and cost per request
+PARSER_SAVINGS_QUERY = """
+    SELECT
+        model,
+        COUNT(*) AS decisions,
+        SUM(parse = 'rescued') AS requeries_avoided,
+        SUM(parse_failures) AS parse_failures,
+        SUM(parse = 'rescued') * SUM(latency) / SUM(retries + 1) AS latency_saved,
+        SUM(parse = 'rescued') * SUM(cost) / SUM(retries + 1) AS cost_saved
+    FROM decisions
+    WHERE parse IS NOT NULL
+    GROUP BY model
+    ORDER BY model
+"""
+
+
+class DecisionIndex:
+    """Indexed SQLite table with one row per logged decision, built from the trace files.
+
+    Ingestion is incremental: a trace file is only read again when its size
+    changed since it was last ingested (a segment still being written), and
+    then its rows are replaced.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = Path(path)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS matches (
+                match_id TEXT PRIMARY KEY,
+                model_a TEXT,
+                model_b TEXT,
+                seed TEXT  -- 64-bit seeds overflow SQLite integers
+            );
+            CREATE TABLE IF NOT EXISTS decisions (
+                {', '.join(DECISION_COLUMNS)}
+            );
+            CREATE INDEX IF NOT EXISTS decisions_model ON decisions (model, action_type);
+            CREATE INDEX IF NOT EXISTS decisions_match ON decisions (match_id);
+            CREATE INDEX IF NOT EXISTS decisions_file ON decisions (file);
+        """)
+
+    def ingest(self, trace_dir=TRACE_DIR, event_dir=EVENT_DIR):
+        """Add decisions from new or grown trace files, returns the number of files read.
+
+        Baseline traces, per-match files holding only the completions, get
+        one row per answer, with the game state rebuilt from the match event
+        log in event_dir.
+        """
+        ingested = dict(self._conn.execute("SELECT path, size FROM files"))
+        models = {
+            match_id: (model_a, model_b)
+            for match_id, model_a, model_b in self._conn.execute("SELECT match_id, model_a, model_b FROM matches")
+        }
+
+        files_read = 0
+        for path in trace_files(trace_dir):
+            size = path.stat().st_size
+            if ingested.get(str(path)) == size:
+                continue
+            with self._conn:
+                self._conn.execute("DELETE FROM decisions WHERE file = ?", (str(path),))
+                self._ingest_file(path, models, event_dir)
+                self._conn.execute("INSERT OR REPLACE INTO files (path, size) VALUES (?, ?)", (str(path), size))
+            files_read += 1
+        return files_read
+
+    def _ingest_file(self, path, models, event_dir):
+        rows = []
+        legacy_id = legacy_match_id(path)
+        completions = []  # Of a legacy per-match file, for baseline traces without decision records
+        decided = False
+        for record in read_trace_records(path):
+            record_type = record.get('type', 'completion')
+            match_id = record.get('match_id')
+            if record_type == 'match_start':
+                models[match_id] = (record['model_a'], record['model_b'])
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO matches (match_id, model_a, model_b, seed) VALUES (?, ?, ?, ?)",
+                    (match_id, record['model_a'], record['model_b'],
+                     str(record['seed']) if record.get('seed') is not None else None)
+                )
+            elif record_type == 'completion' and legacy_id is not None:
+                completions.append(record)
+            elif record_type == 'decision':
+                decided = True
+                rows.append(_decision_row(str(path), record, models.get(match_id)))
+
+        if completions and not decided:
+            seats = {record.get('player'): record.get('model') for record in completions}
+            self._conn.execute(
+                "INSERT OR REPLACE INTO matches (match_id, model_a, model_b, seed) VALUES (?, ?, ?, NULL)",
+                (legacy_id, seats.get('A'), seats.get('B'))
+            )
+            rows.extend(_completion_rows(str(path), legacy_id, completions, event_dir))
+
+        self._conn.executemany(
+            f"INSERT INTO decisions ({', '.join(DECISION_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(DECISION_COLUMNS))})",
+            rows
+        )
+
+    def query(self, sql, params=()):
+        """Run a read query against the index, returns a list of dict rows"""
+        cursor = self._conn.execute(sql, params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def behavior(self):
+        """Bet, aggressiveness, run and accept rates per model"""
+        return self.query(BEHAVIOR_QUERY)
+
+    def parser_savings(self):
+        """Re-queries, latency and cost the tolerant action parser avoided per model"""
+        return self.query(PARSER_SAVINGS_QUERY)
+
+    def close(self):
+        self._conn.close()
+
+
+def _usage_stats(completions):
+    """Token counts of the requests behind one answer, from their usage"""
+    usage = [((c.get('response') or {}).get('usage') or {}) for c in completions]
+    return {
+        'prompt_tokens': sum(u.get('prompt_tokens') or 0 for u in usage),
+        'completion_tokens': sum(u.get('completion_tokens') or 0 for u in usage),
+        'cached_prompt_tokens': sum(
+            (u.get('prompt_tokens_details') or {}).get('cached_tokens') or u.get('cache_read_input_tokens') or 0
+            for u in usage
+        ),
+        'reasoning_tokens': sum((u.get('completion_tokens_details') or {}).get('reasoning_tokens') or 0 for u in usage),
+        'retries': len(completions) - 1,
+    }
+
+
+def _response_content(completion):
+    choices = (completion.get('response') or {}).get('choices') or [{}]
+    return (choices[0].get('message') or {}).get('content')
+
+
+def _logged_states(match_id, event_dir):
+    """Game state and hand before each decision of a match, rebuilt from its event log, by (player, action_type)"""
+    states = {}
+    events = read_events(event_log_path(match_id, event_dir))
+    if events is None:
+        return states
+
+    def record(engine, player, action_type, action):
+        player_idx = 0 if player == 'A' else 1
+        hand = list(engine.player_hands[player_idx])
+        state = format_game_state(engine, hand, player_idx)
+        states.setdefault((player, action_type), deque()).append(
+            ({key: state[key] for key in DECISION_STATE_KEYS}, hand)
+        )
+
+    try:
+        replay_decisions(*event_replay(events), record)
+    except (ReplayDivergence, ValueError) as e:  # A forfeited match runs out of logged decisions
+        print(f"Event log of match {match_id} ends early: {e}")
+    return states
+
+
+def _completion_rows(path, match_id, completions, event_dir):
+    """Decision rows of a baseline trace: one per answer, with the requests whose answer did not parse as its retries"""
+    seats = {record.get('player'): record.get('model') for record in completions}
+    states = _logged_states(match_id, event_dir)
+    rows = []
+    failed = {}  # (player, action_type): completions whose answer did not parse, retried by the next one
+    for completion in completions:
+        key = (completion.get('player'), completion.get('action_type'))
+        logged = states.get(key)
+        state, hand = logged[0] if logged else ({}, None)
+        attempts = failed.pop(key, []) + [completion]
+        try:
+            action, outcome = parse_action(_response_content(completion), key[1], hand)
+        except ActionParseError:
+            failed[key] = attempts
+            continue
+        if logged:
+            logged.popleft()
+        rows.append(_completion_row(path, match_id, seats, key, action, outcome, attempts, state))
+
+    # A decision that never parsed forfeited the match; it still cost its requests
+    for key, attempts in failed.items():
+        rows.append(_completion_row(path, match_id, seats, key, {}, None, attempts, {}))
+    return rows
+
+
+def _completion_row(path, match_id, seats, key, action, outcome, attempts, state):
+    player, action_type = key
+    stats = _usage_stats(attempts)
+    stats.update(parse=outcome, parse_failures=len(attempts) - (outcome is not None), cached=False)
+    record = {'match_id': match_id, 'player': player, 'action_type': action_type, 'action': action,
+              'state': state}
+    record.update(stats)
+    return _decision_row(path, record, (seats.get('A'), seats.get('B')))
+
+
+def _decision_row(path, record, match_models):
+    action = record['action'] or {}
+    state = record.get('state') or {}
+
+    model = opponent = None
+    if match_models is not None:
+        model, opponent = match_models if record['player'] == 'A' else match_models[::-1]
+    card = action.get('card')
+
+    values = {
+        'match_id': record.get('match_id'),
+        'file': path,
+        'model': model,
+        'opponent': opponent,
+        'player': record['player'],
+        'action_type': record['action_type'],
+        'action': action.get('action'),
+        'bet_type': action.get('bet_type'),
+        'card': json.dumps(card, ensure_ascii=False) if card is not None else None,
+        'my_score': state.get('my_score'),
+        'opponent_score': state.get('opponent_score'),
+        'current_bet': state.get('current_bet'),
+        'pending_bet': state.get('pending_bet'),
+        'betting_round': state.get('betting_round'),
+        'prompt_tokens': record.get('prompt_tokens'),
+        'cached_prompt_tokens': record.get('cached_prompt_tokens'),
+        'completion_tokens': record.get('completion_tokens'),
+        'reasoning_tokens': record.get('reasoning_tokens'),
+        'cost': record.get('cost'),
+        'latency': record.get('latency'),
+        'retries': record.get('retries'),
+        'cached': record.get('cached'),
+        'parse': record.get('parse'),
+        'parse_failures': record.get('parse_failures'),
+        'planned': record.get('planned'),
+    }
+    return tuple(values[column] for column in DECISION_COLUMNS)
+
+
+if __name__ == '__main__':
+    index = DecisionIndex()
+    start = time.perf_counter()
+    files_read = index.ingest(sys.argv[1] if len(sys.argv) > 1 else TRACE_DIR,
+                              sys.argv[2] if len(sys.argv) > 2 else EVENT_DIR)
+    print(f"Ingested {files_read} trace files in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    rows = index.behavior()
+    elapsed = time.perf_counter() - start
+    print("| Modelo | Decisões | % Aposta | % Agressivo | % Corrida | % Aceite | % Prompt em cache "
+          "| % Carta planejada | Retries | Latência (s) |")
+    print("|--------|----------|----------|-------------|-----------|----------|-------------------"
+          "|-------------------|---------|--------------|")
+    for row in rows:
+        rates = [row[key] for key in ('bet_rate', 'aggressiveness', 'run_rate', 'accept_rate', 'prompt_cache_rate',
+                                      'planned_play_rate')]
+        print(f"| {(row['model'] or '?').split('/')[-1]} | {row['decisions']} | "
+              + " | ".join(f"{rate * 100:.1f}" if rate is not None else "-" for rate in rates)
+              + f" | {row['retries']:.2f} | "
+              + (f"{row['latency']:.2f}" if row['latency'] is not None else "-") + " |")
+    print(f"Query took {elapsed * 1000:.1f}ms")
+
+    savings = index.parser_savings()
+    if savings:
+        print("\n| Modelo | Decisões | Re-consultas evitadas | Falhas de parse | Latência poupada (s) | Custo poupado ($) |")
+        print("|--------|----------|-----------------------|-----------------|----------------------|-------------------|")
+        for row in savings:
+            print(f"| {(row['model'] or '?').split('/')[-1]} | {row['decisions']} | {row['requeries_avoided']} | "
+                  f"{row['parse_failures']} | {row['latency_saved'] or 0:.2f} | {row['cost_saved'] or 0:.4f} |")
+    index.close()
@@ -0,0 +1,137 @@
+import json
+import sys
+import time
+from engine import CARD_INDEX
+from mcts_player import MATCH_POINTS
+from replay import replay_rows, replay_corpus_rows, print_skipped
+from trace_store import TRACE_DIR, atomic_write
+
+DEFAULT_OUTPUT_PATH = "decision_quality.json"
+
+
+def run_points(engine):
+    """Points the opponent scores if the pending bet is run from, as in TrucoEngine.run_from_bet"""
+    return engine.bet_stack[-2]['value'] if len(engine.bet_stack) > 1 else 1
+
+
+def lowest_winning_card(engine, player_idx):
+    """Weakest card in hand that beats the card on the table, or None when leading or nothing wins"""
+    table = engine.played_cards[2 * len(engine.round_winners):]
+    if not table:
+        return None
+    to_beat = engine.strength[CARD_INDEX[table[0][1]]]
+    winning = [card for card in engine.player_hands[player_idx] if engine.strength[CARD_INDEX[card]] > to_beat]
+    return min(winning, key=lambda card: engine.strength[CARD_INDEX[card]]) if winning else None
+
+
+def bet_features(engine, player_idx, action):
+    """Quality features of a betting decision, read from the engine before it is applied.
+
+    The equity is that of the dealt hand, so it only describes the decision in
+    round 1; later rounds depend on the cards already played.
+    """
+    features = {'equity': engine.hand_equity(player_idx), 'round': len(engine.round_winners) + 1}
+    if action.get('action') == 'run' and engine.pending_bet_response and engine.bet_stack:
+        opponent = engine.bet_stack[-1]['team']
+        # Running gave the opponent the match, e.g. running from "nove" at 10x9
+        features['run_concedes_match'] = engine.scores[opponent] + run_points(engine) >= MATCH_POINTS
+    return features
+
+
+def play_features(engine, player_idx, action):
+    """Quality features of a card play, read from the engine before it is applied"""
+    if len(engine.player_hands[player_idx]) < 2:
+        return None  # The last card is played automatically
+    best = lowest_winning_card(engine, player_idx)
+    card = tuple(action.get('card') or ())
+    return {
+        'responding': player_idx == 1,
+        'could_win': best is not None,
+        'lowest_winning': card == best if best is not None else None,
+        # A winning card stronger than needed, when a weaker one also won the round
+        'overkill': (best is not None and card != best and card in engine.player_hands[player_idx]
+                     and engine.strength[CARD_INDEX[card]] > engine.strength[CARD_INDEX[best]]),
+    }
+
+
+def decision_features(engine, player, action_type, action):
+    """replay_rows hook: the quality features row of one logged decision, or None"""
+    player_idx = 0 if player == 'A' else 1
+    if action_type == 'bet':
+        features = bet_features(engine, player_idx, action)
+    else:
+        features = play_features(engine, player_idx, action)
+    if features is not None:
+        features['action'] = action.get('action')
+    return features
+
+
+def match_features(match_id, records):
+    """Features of every logged decision of one match, replayed from its seed or event log"""
+    return replay_rows(match_id, records, decision_features)
+
+
+def _mean(values):
+    values = [value for value in values if value is not None]
+    return sum(values) / len(values) if values else None
+
+
+def aggregate(rows):
+    """Per-model quality aggregates from the decision rows"""
+    by_model = {}
+    for row in rows:
+        by_model.setdefault(row['model'], []).append(row)
+
+    summary = {}
+    for model, model_rows in sorted(by_model.items()):
+        bets = [row for row in model_rows if row['action_type'] == 'bet']
+        runs = [row for row in bets if row['action'] == 'run']
+        first_round = [row for row in bets if row['round'] == 1]  # Where the dealt hand's equity applies
+        responses = [row for row in model_rows if row['action_type'] == 'play' and row['could_win']]
+        summary[model] = {
+            'bet_decisions': len(bets),
+            'play_decisions': sum(row['action_type'] == 'play' for row in model_rows),
+            'equity_when_betting': _mean(row['equity'] for row in first_round if row['action'] == 'bet'),
+            'equity_when_accepting': _mean(row['equity'] for row in first_round if row['action'] == 'accept'),
+            'equity_when_running': _mean(row['equity'] for row in first_round if row['action'] == 'run'),
+            'equity_when_passing': _mean(row['equity'] for row in first_round if row['action'] == 'pass'),
+            'runs': len(runs),
+            'runs_conceding_match': sum(bool(row.get('run_concedes_match')) for row in runs),
+            'winnable_responses': len(responses),
+            'lowest_winning_rate': _mean(float(row['lowest_winning']) for row in responses),
+            'overkill_rate': _mean(float(row['overkill']) for row in responses),
+        }
+    return summary
+
+
+def score_corpus(trace_dir=TRACE_DIR, workers=None):
+    """(rows, skipped): decision rows for every match in the traces, replayed across worker processes,
+    and the reason of each match that could not be replayed"""
+    return replay_corpus_rows(decision_features, trace_dir, workers)
+
+
+def write_summary(summary, path=DEFAULT_OUTPUT_PATH):
+    """Write the per-model aggregates as JSON, replacing the file atomically"""
+    atomic_write(path, json.dumps(summary, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    start = time.perf_counter()
+    rows, skipped = score_corpus(sys.argv[1] if len(sys.argv) > 1 else TRACE_DIR)
+    summary = aggregate(rows)
+    write_summary(summary)
+    elapsed = time.perf_counter() - start
+
+    def pct(value):
+        return f"{value * 100:.1f}" if value is not None else "-"
+
+    print("| Modelo | Equity ao apostar | Equity ao aceitar | Equity ao correr | Corridas | Corridas que entregaram o jogo "
+          "| % Menor carta vencedora | % Carta forte demais |")
+    print("|--------|-------------------|-------------------|------------------|----------|--------------------------------"
+          "|-------------------------|----------------------|")
+    for model, row in summary.items():
+        print(f"| {model.split('/')[-1]} | {pct(row['equity_when_betting'])} | {pct(row['equity_when_accepting'])} | "
+              f"{pct(row['equity_when_running'])} | {row['runs']} | {row['runs_conceding_match']} | "
+              f"{pct(row['lowest_winning_rate'])} | {pct(row['overkill_rate'])} |")
+    print(f"Scored {len(rows)} decisions in {elapsed:.1f}s, wrote {DEFAULT_OUTPUT_PATH}")
+    print_skipped(skipped)
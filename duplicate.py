@@ -0,0 +1,56 @@
+import uuid
+
+# Duplicate matches, as in duplicate bridge: the same seeded deals are played
+# twice with the models swapped between seats A and B. Every model holds both
+# sides of every deal, so the cards cancel out of the pair's score and what
+# is left is mostly the difference in play.
+
+
+def new_duplicate_id():
+    """Identifier shared by the two matches of a duplicate pair"""
+    return uuid.uuid4().hex[:12]
+
+
+def match_winner(scores):
+    return 'A' if scores['A'] >= 12 else 'B'
+
+
+def duplicate_result(first, second):
+    """Score a duplicate pair from its two matches' (model_A, model_B, final_scores).
+
+    The pair goes to the model with the larger point margin summed over both
+    matches. Returns (model_A, model_B, winner) with the first match's seats,
+    winner being None when the margins tie.
+    """
+    model_a, model_b, scores = first
+    if (second[0], second[1]) != (model_b, model_a):
+        raise ValueError(f"Not a mirrored pair: {first[:2]} and {second[:2]}")
+    mirrored = second[2]
+    margin = (scores['A'] - scores['B']) + (mirrored['B'] - mirrored['A'])
+    return (model_a, model_b, 'A' if margin > 0 else 'B' if margin < 0 else None)
+
+
+def pair_duplicates(matches):
+    """Results of finished matches given as (model_A, model_B, final_scores, duplicate_id), in order.
+
+    Ordinary matches, and duplicate halves whose mirror never finished, count
+    as one (model_A, model_B, winner) each. A complete pair counts once, at its
+    first match, as its duplicate_result; tied pairs are left out.
+    """
+    halves = {}
+    for match in matches:
+        if match[3] is not None:
+            halves.setdefault(match[3], []).append(match)
+
+    results = []
+    scored = set()
+    for model_a, model_b, scores, duplicate_id in matches:
+        pair = halves.get(duplicate_id)
+        if pair is None or len(pair) != 2:
+            results.append((model_a, model_b, match_winner(scores)))
+        elif duplicate_id not in scored:
+            scored.add(duplicate_id)
+            result = duplicate_result(pair[0][:3], pair[1][:3])
+            if result[2] is not None:
+                results.append(result)
+    return results
@@ -0,0 +1,202 @@
+import sys
+import time
+from engine import TrucoEngine, CARD_INDEX, NUM_CARDS, RANKS, SUITS
+from mcts_player import HandState, MATCH_POINTS, MAX_UTILITY, utility
+from replay import replay_rows, replay_corpus_rows, print_skipped
+from trace_store import TRACE_DIR
+
+MAX_TABLE_ENTRIES = 2_000_000  # Transposition table size before it is cleared
+
+
+def state_key(engine, betting_done):
+    """Compact integer hash of everything the rest of the hand depends on.
+
+    The key packs the vira rank, scores, bets, betting flags, rounds won and
+    the card on the table in mixed radix above two 40-bit masks of the cards
+    left in each hand. It is exact, so two positions share a key only when
+    they play out identically. Scores are below 12 in any unfinished hand.
+    """
+    key = 0
+    table = engine.played_cards[2 * len(engine.round_winners):]
+    round_winners = sum(winner << i for i, winner in enumerate(engine.round_winners))
+    for radix, value in (
+        (len(RANKS), engine.vira_index // len(SUITS)),
+        (MATCH_POINTS, engine.scores[0]),
+        (MATCH_POINTS, engine.scores[1]),
+        (13, engine.current_bet),
+        (5, len(engine.bet_stack)),
+        (2, engine.bet_stack[-1]['team'] if engine.bet_stack else 0),
+        (2, betting_done),
+        (2, engine.current_betting_player),
+        (2, bool(engine.pending_bet_response)),
+        (3, len(engine.round_winners)),
+        (4, round_winners),
+        (NUM_CARDS + 1, CARD_INDEX[table[0][1]] if table else NUM_CARDS),
+    ):
+        key = key * radix + value
+    for player_idx in (0, 1):
+        for card in engine.player_hands[player_idx]:
+            key |= 1 << (2 * NUM_CARDS + CARD_INDEX[card] + NUM_CARDS * player_idx)
+    return key
+
+
+def applied_action(engine, action):
+    """Action key for what the engine actually does with a logged action dict.
+
+    Betting actions the engine rejects fall back to 'pass', and a pass on a
+    pending bet accepts it, as in TrucoEngine.betting_phase_steps.
+    """
+    if action['action'] == 'play':
+        return ('play', tuple(action['card']))
+    pending = bool(engine.pending_bet_response)
+    if action['action'] == 'bet':
+        key = ('bet', action.get('bet_type'))
+        legal = HandState(engine, False)._legal_bet_actions()
+        if key in legal:
+            return key
+    elif action['action'] == 'accept' and pending:
+        return ('accept',)
+    elif action['action'] == 'run' and pending:
+        return ('run',)
+    return ('accept',) if pending else ('pass',)
+
+
+class EndgameSolver:
+    """Exact minimax over the rest of a hand with both hands known.
+
+    Covers the betting phases and card play in the order match_steps drives
+    them. Values are net points for the player to act: points won minus
+    points conceded, with reaching 12 worth another 12 (mcts_player.utility).
+    Results go in a transposition table keyed on state_key that is kept
+    across calls, so the decisions of one hand, and repeated deals, are
+    mostly table hits.
+
+    Logged decisions were made without seeing the opponent's cards, so regret
+    against this solver is an upper bound on what any real player could avoid.
+    """
+
+    def __init__(self, max_entries=MAX_TABLE_ENTRIES):
+        self.engine = TrucoEngine()
+        self.table = {}
+        self.max_entries = max_entries
+        self.hits = 0
+        self.nodes = 0
+
+    def action_values(self, root_state, betting_done):
+        """{action key: value for the player to act} from an EngineState snapshot"""
+        engine = self.engine
+        engine.restore(root_state)
+        state = HandState(engine, betting_done)
+        decision = state.decision()
+        if decision is None:
+            return {}
+        player_idx, legal = decision
+        snapshot = engine.snapshot()
+        scores = tuple(engine.scores)
+        sign = 1 if player_idx == 0 else -1
+
+        values = {}
+        for action in legal:
+            finished = state.apply(action)
+            values[action] = sign * self._solve(state.betting_done, finished, scores)
+            engine.restore(snapshot)
+            state.betting_done, state.finished = betting_done, False
+        return values
+
+    def _solve(self, betting_done, finished, scores):
+        """Value of the engine's position for player A, with the engine left in an arbitrary state.
+
+        `scores` are the scores the hand started at: once the hand is finished
+        the engine's scores already include the points it awarded.
+        """
+        engine = self.engine
+        state = HandState(engine, betting_done, finished)
+        decision = state.decision()  # Plays forced last cards
+        if decision is None:
+            return utility(scores, engine.scores, 0) * MAX_UTILITY
+
+        key = state_key(engine, state.betting_done)
+        value = self.table.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.nodes += 1
+
+        player_idx, legal = decision
+        snapshot = engine.snapshot()
+        done = state.betting_done
+        values = []
+        for action in legal:
+            finished = state.apply(action)
+            values.append(self._solve(state.betting_done, finished, scores))
+            engine.restore(snapshot)
+            state.betting_done, state.finished = done, False
+        value = max(values) if player_idx == 0 else min(values)
+
+        if len(self.table) >= self.max_entries:
+            self.table.clear()
+        self.table[key] = value
+        return value
+
+
+_solver = None
+
+def decision_regret(engine, player, action_type, action):
+    """replay_rows hook: one logged decision scored against the solver, or None"""
+    global _solver
+    if _solver is None:
+        _solver = EndgameSolver()  # One table per worker process, shared by its matches
+    player_idx = 0 if player == 'A' else 1
+    if action_type == 'play' and len(engine.player_hands[player_idx]) < 2:
+        return None
+    values = _solver.action_values(engine.snapshot(), betting_done=action_type == 'play')
+    chosen = applied_action(engine, action)
+    if chosen not in values:
+        return None
+    best = max(values.values())
+    return {
+        'action': list(chosen),
+        'value': values[chosen],
+        'best_value': best,
+        'regret': best - values[chosen],
+    }
+
+
+def score_match(match_id, records):
+    """Regret of every logged decision of one match, as a list of row dicts"""
+    return replay_rows(match_id, records, decision_regret)
+
+
+def regret_by_model(rows):
+    """Per (model, action_type) decisions, optimal rate and mean and total regret"""
+    totals = {}
+    for row in rows:
+        total = totals.setdefault((row['model'], row['action_type']), {'decisions': 0, 'optimal': 0, 'regret': 0.0})
+        total['decisions'] += 1
+        total['optimal'] += row['regret'] <= 1e-9
+        total['regret'] += row['regret']
+    return [
+        {'model': model, 'action_type': action_type, 'decisions': total['decisions'],
+         'optimal_rate': total['optimal'] / total['decisions'],
+         'mean_regret': total['regret'] / total['decisions'], 'total_regret': total['regret']}
+        for (model, action_type), total in sorted(totals.items())
+    ]
+
+
+def score_corpus(trace_dir=TRACE_DIR, workers=None):
+    """Score every logged decision across worker processes, returns (rows, reasons of the skipped matches)"""
+    return replay_corpus_rows(decision_regret, trace_dir, workers)
+
+
+if __name__ == '__main__':
+    start = time.perf_counter()
+    rows, skipped = score_corpus(sys.argv[1] if len(sys.argv) > 1 else TRACE_DIR)
+    elapsed = time.perf_counter() - start
+
+    print("| Modelo | Decisão | Decisões | % Ótimas | Regret médio (pts) | Regret total (pts) |")
+    print("|--------|---------|----------|----------|--------------------|--------------------|")
+    for row in regret_by_model(rows):
+        print(f"| {row['model'].split('/')[-1]} | {row['action_type']} | {row['decisions']} | "
+              f"{row['optimal_rate'] * 100:.1f} | {row['mean_regret']:.3f} | {row['total_regret']:.1f} |")
+    print(f"Scored {len(rows)} decisions in {elapsed:.1f}s")
+    print_skipped(skipped)
@@ -1,16 +1,72 @@
 import random
 
+RANKS = ['4', '5', '6', '7', 'Q', 'J', 'K', 'A', '2', '3']
+SUITS = ['P', 'C', 'E', 'O']  # Paus, Copas, Espadas, Ouros
+NUM_CARDS = len(RANKS) * len(SUITS)
+
+# Compact card encoding: index = rank_idx * 4 + suit_idx (0..39), in the same
+# order as the deck built by TrucoEngine._create_deck
+CARDS = [(rank, suit) for rank in RANKS for suit in SUITS]
+CARD_INDEX = {card: idx for idx, card in enumerate(CARDS)}
+
+def card_to_index(card):
+    """Convert a (rank, suit) card to its 0..39 index"""
+    return CARD_INDEX[tuple(card)]
+
+def index_to_card(idx):
+    """Convert a 0..39 card index back to its (rank, suit) tuple"""
+    return CARDS[idx]
+
+def _build_strength_table(vira_rank_idx):
+    """Strength of every card index for a given vira rank (higher wins)"""
+    manilha_rank_idx = (vira_rank_idx + 1) % len(RANKS)
+    table = []
+    for idx in range(NUM_CARDS):
+        rank_idx, suit_idx = divmod(idx, len(SUITS))
+        # Suit breaks ties: Paus > Copas > Espadas > Ouros
+        suit_strength = len(SUITS) - 1 - suit_idx
+        if rank_idx == manilha_rank_idx:
+            # Manilhas beat every regular card
+            table.append(NUM_CARDS + suit_strength)
+        else:
+            table.append(rank_idx * len(SUITS) + suit_strength)
+    return table
+
+# One 40-entry strength table per possible vira rank
+STRENGTH_TABLES = [_build_strength_table(rank_idx) for rank_idx in range(len(RANKS))]
+
+class EngineState:
+    """Compact, immutable-by-convention copy of a TrucoEngine's mutable state.
+
+    Lists that moves mutate in place are stored as tuples; everything that is
+    only ever replaced (deck, vira, manilhas, dealt hands, bet entries) is
+    shared by reference, so taking a snapshot never copies more than a few
+    small tuples.
+    """
+    __slots__ = (
+        'scores', 'deck', 'vira', 'vira_index', 'manilhas', 'strength',
+        'player_hands', 'dealt_hands', 'played_cards', 'bet_stack', 'current_bet',
+        'round_winners', 'game_finished', 'current_betting_player',
+        'betting_complete', 'pending_bet_response', 'last_bet_action',
+        'skip_round', 'bet_accepted',
+    )
+
 class TrucoEngine:
-    RANKS = ['4', '5', '6', '7', 'Q', 'J', 'K', 'A', '2', '3']
-    SUITS = ['P', 'C', 'E', 'O']  # Paus, Copas, Espadas, Ouros
+    RANKS = RANKS
+    SUITS = SUITS
     
-    def __init__(self):
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)  # Per-engine RNG so deals can be reproduced
         self.scores = [0, 0]  # Team scores by index
         self.teams = [[1], [2]]  # Team players by index
         self.deck = []
         self.vira = None
+        self.vira_index = None
         self.manilhas = []
+        self.strength = None  # Strength table for the current vira
         self.player_hands = {0: [], 1: []}  # Cards for each player
+        self.dealt_hands = {0: [], 1: []}  # Full 3-card hands as dealt
+        self.played_cards = []  # (player_idx, card) in play order for the current hand
         self.bet_stack = []
         self.current_bet = 1
         self.round_winners = []  # Track winners of each round in the hand
@@ -21,32 +77,37 @@ class TrucoEngine:
         self.last_bet_action = None
         self.skip_round = False
         self.bet_accepted = False
+        self.move_log = []  # Snapshots taken before each applied move, for undo()
         
     def new_hand(self):
         """Initialize a new hand: shuffle the deck, deal three cards to each player, set the single vira, and determine the manilhas"""
         self.round_winners = []  # Reset round winners
+        self.played_cards = []
         self._create_deck()
-        random.shuffle(self.deck)
+        self.rng.shuffle(self.deck)
         
         # Deal 3 cards to each player
         self.player_hands = {
-            0: [self.deck.pop() for _ in range(3)],
-            1: [self.deck.pop() for _ in range(3)]
+            0: [CARDS[self.deck.pop()] for _ in range(3)],
+            1: [CARDS[self.deck.pop()] for _ in range(3)]
         }
+        self.dealt_hands = {0: list(self.player_hands[0]), 1: list(self.player_hands[1])}
             
         # Set vira and determine manilhas
-        self.vira = self.deck.pop()
+        self.vira_index = self.deck.pop()
+        self.vira = CARDS[self.vira_index]
         self._set_manilhas()
         self.current_bet = 1
         self.bet_stack = []
         
     def _create_deck(self):
-        """Create a 40-card deck"""
-        self.deck = [(rank, suit) for rank in self.RANKS for suit in self.SUITS]
+        """Create a 40-card deck of card indices"""
+        self.deck = list(range(NUM_CARDS))
         
     def _set_manilhas(self):
         """Determine manilhas based on vira"""
         vira_idx = self.RANKS.index(self.vira[0])
+        self.strength = STRENGTH_TABLES[vira_idx]
         manilha_rank = self.RANKS[(vira_idx + 1) % len(self.RANKS)]
         
         # Order by suit strength: Paus > Copas > Espadas > Ouros
@@ -59,35 +120,20 @@ class TrucoEngine:
         
     def _compare_cards(self, card1, card2):
         """Compare two cards, returns True if card1 wins"""
-        # Check if either card is a manilha
-        card1_manilha_idx = -1
-        card2_manilha_idx = -1
-        
-        for idx, manilha in enumerate(self.manilhas):
-            if card1 == manilha:
-                card1_manilha_idx = idx
-            if card2 == manilha:
-                card2_manilha_idx = idx
-                
-        # If both are manilhas, higher manilha wins
-        if card1_manilha_idx >= 0 and card2_manilha_idx >= 0:
-            return card1_manilha_idx < card2_manilha_idx
-            
-        # If only one is manilha, it wins
-        if card1_manilha_idx >= 0:
-            return True
-        if card2_manilha_idx >= 0:
-            return False
-            
-        # Neither is manilha, compare by rank; if equal, use suit as a tiebreaker.
-        rank1 = self.RANKS.index(card1[0])
-        rank2 = self.RANKS.index(card2[0])
-        if rank1 == rank2:
-            # Compare suits based on defined strength: Paus > Copas > Espadas > Ouros.
-            return self.SUITS.index(card1[1]) < self.SUITS.index(card2[1])
-        else:
-            return rank1 > rank2
+        strength = self.strength
+        return strength[CARD_INDEX[card1]] > strength[CARD_INDEX[card2]]
+
+    def compare_indices(self, idx1, idx2):
+        """Compare two card indices, returns True if idx1 wins"""
+        return self.strength[idx1] > self.strength[idx2]
         
+    def hand_equity(self, player_idx, table=None):
+        """Win probability of the player's dealt hand from the precomputed equity table"""
+        from hand_equity import get_default_table
+        if table is None:
+            table = get_default_table()
+        return table.lookup(self.vira_index, self.dealt_hands[player_idx])
+
     def resolve_round(self, played_cards):
         """Resolve a round with played cards, returns winning team index"""
         if len(played_cards) != 2:
@@ -96,6 +142,12 @@ class TrucoEngine:
         winner = 0 if self._compare_cards(played_cards[0], played_cards[1]) else 1
         self.round_winners.append(winner)
         return winner
+
+    def resolve_round_indices(self, idx1, idx2):
+        """Resolve a round with played card indices, returns winning team index"""
+        winner = 0 if self.strength[idx1] > self.strength[idx2] else 1
+        self.round_winners.append(winner)
+        return winner
         
     def handle_bet(self, bet_type, team):
         """Handle betting (truco/six/nine/twelve)"""
@@ -248,13 +300,14 @@ class TrucoEngine:
                 if self.current_betting_player == 0:  # Both passed
                     self.betting_complete = True
 
-    def run_betting_phase(self, get_bet_action):
+    def betting_phase_steps(self):
+        """Generator form of run_betting_phase: yields the player to act and receives their action"""
         self.start_betting_phase()
         bet_actions = []
         
         while not self.betting_complete:
             current_player = self.current_betting_player
-            action = get_bet_action(current_player)
+            action = yield current_player
             
             try:
                 self.handle_player_bet_action(action, current_player)
@@ -276,9 +329,94 @@ class TrucoEngine:
                 
         return bet_actions
 
+    def run_betting_phase(self, get_bet_action):
+        steps = self.betting_phase_steps()
+        try:
+            player_idx = next(steps)
+            while True:
+                player_idx = steps.send(get_bet_action(player_idx))
+        except StopIteration as stop:
+            return stop.value
+
     def play_card(self, player_idx, card):
         """Play a card from a player's hand"""
         if card in self.player_hands[player_idx]:
             self.player_hands[player_idx].remove(card)
+            self.played_cards.append((player_idx, card))
         else:
             raise ValueError("Card not in player's hand")
+
+    def snapshot(self):
+        """Capture the current game state in an EngineState"""
+        state = EngineState()
+        state.scores = tuple(self.scores)
+        state.deck = self.deck
+        state.vira = self.vira
+        state.vira_index = self.vira_index
+        state.manilhas = self.manilhas
+        state.strength = self.strength
+        state.player_hands = (tuple(self.player_hands[0]), tuple(self.player_hands[1]))
+        state.dealt_hands = self.dealt_hands
+        state.played_cards = tuple(self.played_cards)
+        state.bet_stack = tuple(self.bet_stack)
+        state.current_bet = self.current_bet
+        state.round_winners = tuple(self.round_winners)
+        state.game_finished = self.game_finished
+        state.current_betting_player = self.current_betting_player
+        state.betting_complete = self.betting_complete
+        state.pending_bet_response = self.pending_bet_response
+        state.last_bet_action = self.last_bet_action
+        state.skip_round = self.skip_round
+        state.bet_accepted = self.bet_accepted
+        return state
+
+    def restore(self, state):
+        """Reset the engine to a state captured by snapshot()"""
+        self.scores = list(state.scores)
+        self.deck = state.deck
+        self.vira = state.vira
+        self.vira_index = state.vira_index
+        self.manilhas = state.manilhas
+        self.strength = state.strength
+        self.player_hands = {0: list(state.player_hands[0]), 1: list(state.player_hands[1])}
+        self.dealt_hands = state.dealt_hands
+        self.played_cards = list(state.played_cards)
+        self.bet_stack = list(state.bet_stack)
+        self.current_bet = state.current_bet
+        self.round_winners = list(state.round_winners)
+        self.game_finished = state.game_finished
+        self.current_betting_player = state.current_betting_player
+        self.betting_complete = state.betting_complete
+        self.pending_bet_response = state.pending_bet_response
+        self.last_bet_action = state.last_bet_action
+        self.skip_round = state.skip_round
+        self.bet_accepted = state.bet_accepted
+
+    def _apply(self, move, *args):
+        """Run a move, recording the prior state so it can be undone"""
+        state = self.snapshot()
+        try:
+            result = move(*args)
+        except Exception:
+            self.restore(state)
+            raise
+        self.move_log.append(state)
+        return result
+
+    def apply_bet_action(self, action, player_idx):
+        """Undoable handle_player_bet_action"""
+        return self._apply(self.handle_player_bet_action, action, player_idx)
+
+    def apply_play_card(self, player_idx, card):
+        """Undoable play_card"""
+        return self._apply(self.play_card, player_idx, card)
+
+    def apply_resolve_round(self, played_cards):
+        """Undoable resolve_round"""
+        return self._apply(self.resolve_round, played_cards)
+
+    def undo(self):
+        """Revert the most recently applied move"""
+        if not self.move_log:
+            raise ValueError("No move to undo")
+        self.restore(self.move_log.pop())
@@ -0,0 +1,225 @@
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from engine import TrucoEngine, CARDS
+from mcts_player import HandState, action_to_dict
+from llm_play import run_match
+from replay import NullEventLogger
+
+DEFAULT_BASELINE_PATH = "engine_baseline.json"
+TOLERANCE = 0.25  # Allowed slowdown (or memory growth) against the baseline before the run fails
+
+
+def _legal_bet_actions(engine):
+    return HandState(engine, False)._legal_bet_actions()
+
+
+def passive_policy(legal, rng):
+    """Pass, or accept every bet"""
+    return legal[0]
+
+
+def aggressive_policy(legal, rng):
+    """Raise whenever possible"""
+    return legal[-1] if legal[-1][0] == 'bet' else legal[0]
+
+
+def random_policy(legal, rng):
+    return rng.choice(legal)
+
+
+BET_POLICIES = {
+    'passive': passive_policy,
+    'aggressive': aggressive_policy,
+    'random': random_policy,
+}
+
+
+class ScriptedBot:
+    """Player reading the engine it is seated at, betting with a BET_POLICIES policy and playing random cards"""
+
+    def __init__(self, name, engine, player_idx, policy, rng):
+        self.name = name
+        self.model = f"scripted-{policy.__name__}"
+        self.engine = engine
+        self.player_idx = player_idx
+        self.policy = policy
+        self.rng = rng
+        self.total_cost = 0.0
+
+    def decide_bet(self, game_state):
+        return action_to_dict(self.policy(_legal_bet_actions(self.engine), self.rng))
+
+    def decide_play(self, game_state):
+        return {'action': 'play', 'card': list(self.rng.choice(self.engine.player_hands[self.player_idx]))}
+
+
+class CountingEventLogger(NullEventLogger):
+    """NullEventLogger that counts the hands dealt"""
+
+    def __init__(self):
+        super().__init__()
+        self.hands = 0
+
+    def log_hand_start(self, *args, **kwargs):
+        self.hands += 1
+
+
+def measure(func, loops, repeat=5):
+    """Best time per call over `repeat` runs of `loops` calls, in seconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(loops)
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best
+
+
+def bench_compare_cards(loops):
+    engine = TrucoEngine(seed=0)
+    engine.new_hand()
+    pairs = [(CARDS[i], CARDS[(i * 7 + 3) % len(CARDS)]) for i in range(len(CARDS))]
+    compare = engine._compare_cards
+    for i in range(loops):
+        compare(*pairs[i % len(pairs)])
+
+
+def bench_resolve_round(loops):
+    engine = TrucoEngine(seed=0)
+    engine.new_hand()
+    played = [[CARDS[i], CARDS[(i * 7 + 3) % len(CARDS)]] for i in range(len(CARDS))]
+    for i in range(loops):
+        engine.round_winners = []
+        engine.resolve_round(played[i % len(played)])
+
+
+def bench_create_deck(loops):
+    engine = TrucoEngine(seed=0)
+    for _ in range(loops):
+        engine._create_deck()
+
+
+def bench_new_hand(loops):
+    engine = TrucoEngine(seed=0)
+    for _ in range(loops):
+        engine.new_hand()
+
+
+def _bench_betting(policy):
+    def bench(loops):
+        engine = TrucoEngine(seed=0)
+        rng = random.Random(0)
+        engine.new_hand()
+        for _ in range(loops):
+            # Reset what a betting phase changes, without paying for a new deal
+            engine.scores = [0, 0]
+            engine.game_finished = False
+            engine.bet_stack = []
+            engine.current_bet = 1
+            engine.run_betting_phase(lambda player_idx: action_to_dict(policy(_legal_bet_actions(engine), rng)))
+    bench.__name__ = f"bench_betting_{policy.__name__}"
+    return bench
+
+
+def play_matches(num_matches, policy_a=random_policy, policy_b=random_policy, seed=0):
+    """Bot-vs-bot matches through run_match, returns the number of hands played"""
+    rng = random.Random(seed)
+    hands = 0
+    for match in range(num_matches):
+        engine = TrucoEngine(seed=seed + match)
+        event_logger = CountingEventLogger()
+        run_match(engine, ScriptedBot('A', engine, 0, policy_a, rng), ScriptedBot('B', engine, 1, policy_b, rng),
+                  event_logger)
+        hands += event_logger.hands
+    return hands
+
+
+def peak_match_memory(seed=0):
+    """Peak bytes allocated while one engine instance plays a full match"""
+    play_matches(1, seed=seed)  # Warm up imports and caches outside the trace
+    tracemalloc.start()
+    try:
+        play_matches(1, seed=seed)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+MICRO_BENCHMARKS = {
+    'compare_cards': (bench_compare_cards, 200_000),
+    'resolve_round': (bench_resolve_round, 200_000),
+    'create_deck': (bench_create_deck, 100_000),
+    'new_hand': (bench_new_hand, 50_000),
+    'betting_passive': (_bench_betting(passive_policy), 50_000),
+    'betting_aggressive': (_bench_betting(aggressive_policy), 50_000),
+    'betting_random': (_bench_betting(random_policy), 50_000),
+}
+
+
+def run_suite(scale=1.0, num_matches=200):
+    """Throughput of every benchmark (operations per second) plus peak memory per engine"""
+    results = {}
+    for name, (func, loops) in MICRO_BENCHMARKS.items():
+        results[f'{name}_per_sec'] = 1 / measure(func, max(1, int(loops * scale)))
+
+    num_matches = max(1, int(num_matches * scale))
+    play_matches(2)  # Warm-up
+    start = time.perf_counter()
+    hands = play_matches(num_matches)
+    elapsed = time.perf_counter() - start
+    results['matches_per_sec'] = num_matches / elapsed
+    results['match_hands_per_sec'] = hands / elapsed
+    results['peak_match_bytes'] = peak_match_memory()
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Regressions against the baseline: (metric, value, baseline value) rows"""
+    regressions = []
+    for metric, value in results.items():
+        expected = baseline.get(metric)
+        if expected is None:
+            continue
+        if metric.endswith('_bytes'):
+            regressed = value > expected * (1 + tolerance)
+        else:
+            regressed = value < expected * (1 - tolerance)
+        if regressed:
+            regressions.append((metric, value, expected))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Engine micro and macro benchmarks against a stored baseline")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--scale', type=float, default=1.0, help="multiply every loop count, e.g. 0.1 for a quick run")
+    args = parser.parse_args()
+
+    baseline_path = Path(args.baseline)
+    if not args.save_baseline and not baseline_path.exists():
+        sys.exit(f"No baseline at {baseline_path}: run with --save-baseline on the reference commit first")
+    baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+    results = run_suite(args.scale)
+
+    print("| Benchmark | Resultado | Baseline | Variação |")
+    print("|-----------|-----------|----------|----------|")
+    for metric, value in results.items():
+        expected = baseline.get(metric)
+        change = f"{(value / expected - 1) * 100:+.1f}%" if expected else "-"
+        print(f"| {metric} | {value:,.0f} | " + (f"{expected:,.0f}" if expected else "-") + f" | {change} |")
+
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(results, indent=2))
+        print(f"Saved baseline to {baseline_path}")
+        sys.exit(0)
+
+    regressions = compare(results, baseline, args.tolerance)
+    for metric, value, expected in regressions:
+        print(f"REGRESSION {metric}: {value:,.0f} vs baseline {expected:,.0f}")
+    sys.exit(1 if regressions else 0)
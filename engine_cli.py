@@ -0,0 +1,137 @@
+import argparse
+import random
+import subprocess
+import sys
+import time
+from engine import TrucoEngine, CARD_INDEX
+from mcts_player import MATCH_POINTS
+from duplicate import duplicate_result
+from engine_benchmark import BET_POLICIES, ScriptedBot, CountingEventLogger
+from llm_play import run_match
+from replay import replay_corpus, print_replay_report
+from trace_store import TRACE_DIR, load_match_traces
+
+# Engine-only entry point: nothing here imports the LLM stack (litellm, tenacity, requests),
+# which llm_play only loads on the first completion
+BET_ACTIONS = {'pass', 'bet', 'accept', 'run'}
+
+
+def _scripted_match(policy_a, policy_b, seed, rng):
+    """Final scores and hands played of one bot-vs-bot match"""
+    engine = TrucoEngine(seed=seed)
+    event_logger = CountingEventLogger()
+    run_match(engine, ScriptedBot('A', engine, 0, BET_POLICIES[policy_a], rng),
+              ScriptedBot('B', engine, 1, BET_POLICIES[policy_b], rng), event_logger)
+    return {'A': engine.scores[0], 'B': engine.scores[1]}, event_logger.hands
+
+
+def simulate(num_matches, policy_a='random', policy_b='random', seed=0, duplicate=False):
+    """Bot-vs-bot matches, returns (wins per policy seat, hands played).
+
+    With duplicate=True every seed is also played with the policies swapped
+    and the wins count duplicate pairs; wins[None] holds the tied pairs.
+    """
+    rng = random.Random(seed)
+    wins = {'A': 0, 'B': 0, None: 0}
+    hands = 0
+    for match in range(num_matches):
+        scores, played = _scripted_match(policy_a, policy_b, seed + match, rng)
+        hands += played
+        if not duplicate:
+            wins['A' if scores['A'] > scores['B'] else 'B'] += 1
+            continue
+        mirrored, played = _scripted_match(policy_b, policy_a, seed + match, rng)
+        hands += played
+        wins[duplicate_result(('A', 'B', scores), ('B', 'A', mirrored))[2]] += 1
+    return wins, hands
+
+
+def trace_problems(records):
+    """What is wrong with one match's trace records, without replaying it"""
+    problems = []
+    starts = [record for record in records if record.get('type') == 'match_start']
+    ends = [record for record in records if record.get('type') == 'match_end']
+    if len(starts) != 1:
+        problems.append(f"{len(starts)} match_start records")
+    elif starts[0].get('seed') is None:
+        problems.append("no seed, cannot be replayed")
+    elif not starts[0].get('model_a') or not starts[0].get('model_b'):
+        problems.append("missing model names")
+    if len(ends) > 1:
+        problems.append(f"{len(ends)} match_end records")
+    elif ends and max(ends[0].get('final_scores', {}).values(), default=0) < MATCH_POINTS:
+        problems.append(f"final scores {ends[0].get('final_scores')} below {MATCH_POINTS}")
+
+    for record in records:
+        if record.get('type') != 'decision':
+            continue
+        action = record.get('action')
+        if record.get('player') not in ('A', 'B') or not isinstance(action, dict):
+            problems.append(f"malformed decision {record}")
+        elif record.get('action_type') == 'bet' and action.get('action') not in BET_ACTIONS:
+            problems.append(f"unknown bet action {action}")
+        elif record.get('action_type') == 'play' and tuple(action.get('card') or ()) not in CARD_INDEX:
+            problems.append(f"unknown card {action}")
+        elif record.get('action_type') not in ('bet', 'play'):
+            problems.append(f"unknown action type {record.get('action_type')}")
+    return problems
+
+
+def validate(trace_dir=TRACE_DIR):
+    """(match_id, problems) of every trace with problems, plus the number of traces checked"""
+    traces = load_match_traces(trace_dir, types={'match_start', 'decision', 'match_end'})
+    invalid = [(match_id, problems) for match_id, records in traces.items() if (problems := trace_problems(records))]
+    return invalid, len(traces)
+
+
+def startup_times(modules=('engine_cli', 'llm_play', 'litellm'), repeat=3):
+    """Best seconds to import each module in a fresh interpreter"""
+    times = {}
+    for module in modules:
+        code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+        times[module] = min(float(subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                                 check=True).stdout) for _ in range(repeat))
+    return times
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Engine-only tasks, without loading the LLM stack")
+    commands = parser.add_subparsers(dest='command', required=True)
+    simulate_parser = commands.add_parser('simulate', help="bot-vs-bot matches")
+    simulate_parser.add_argument('--matches', type=int, default=100)
+    simulate_parser.add_argument('--policy-a', choices=sorted(BET_POLICIES), default='random')
+    simulate_parser.add_argument('--policy-b', choices=sorted(BET_POLICIES), default='random')
+    simulate_parser.add_argument('--seed', type=int, default=0)
+    simulate_parser.add_argument('--duplicate', action='store_true', help="play every deal twice with seats swapped")
+    replay_parser = commands.add_parser('replay', help="replay traces and compare the final scores")
+    replay_parser.add_argument('trace_dir', nargs='?', default=TRACE_DIR)
+    replay_parser.add_argument('--workers', type=int, default=None)
+    validate_parser = commands.add_parser('validate', help="check trace records without replaying them")
+    validate_parser.add_argument('trace_dir', nargs='?', default=TRACE_DIR)
+    commands.add_parser('startup', help="import time of this CLI against llm_play and litellm")
+    args = parser.parse_args()
+
+    if args.command == 'simulate':
+        start = time.perf_counter()
+        wins, hands = simulate(args.matches, args.policy_a, args.policy_b, args.seed, args.duplicate)
+        elapsed = time.perf_counter() - start
+        print("| Jogador | Política | Vitórias | % Vit |")
+        print("|---------|----------|----------|-------|")
+        for seat, policy in (('A', args.policy_a), ('B', args.policy_b)):
+            print(f"| {seat} | {policy} | {wins[seat]} | {wins[seat] / args.matches * 100:.1f} |")
+        if args.duplicate:
+            print(f"| - | empate | {wins[None]} | {wins[None] / args.matches * 100:.1f} |")
+        played = 2 * args.matches if args.duplicate else args.matches
+        print(f"Played {played} matches ({hands} hands) in {elapsed:.2f}s")
+    elif args.command == 'replay':
+        counts = print_replay_report(replay_corpus(args.trace_dir, args.workers))
+        sys.exit(1 if counts.get('diverged') or counts.get('score_mismatch') else 0)
+    elif args.command == 'validate':
+        invalid, checked = validate(args.trace_dir)
+        for match_id, problems in invalid:
+            print(f"{match_id}: {'; '.join(problems)}")
+        print(f"Validated {checked} traces, {len(invalid)} with problems")
+        sys.exit(1 if invalid else 0)
+    else:
+        for module, seconds in startup_times().items():
+            print(f"import {module}: {seconds:.3f}s")
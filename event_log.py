@@ -0,0 +1,119 @@
+import json
+from pathlib import Path
+
+EVENT_DIR = "match_history"
+BET_SEQUENCE = ('truco', 'six', 'nine', 'twelve')
+
+
+def event_log_path(match_id, event_dir=EVENT_DIR):
+    """Event log of a match, next to its human readable history"""
+    return Path(event_dir) / f"match_{match_id}.events.jsonl"
+
+
+class EventLogRecorder:
+    """MatchEventLogger wrapper that also keeps every event as a JSON dict, for save().
+
+    Events are named after the logger methods without 'log_' and carry their
+    arguments by name, so a match traced without a seed can be rebuilt from
+    its deals and actions.
+    """
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.records = []
+
+    def __getattr__(self, name):
+        return getattr(self.logger, name)  # match_id, events
+
+    def log_hand_start(self, vira, manilhas, hands):
+        self.records.append({'event': 'hand_start', 'vira': vira, 'manilhas': manilhas, 'hands': hands})
+        self.logger.log_hand_start(vira, manilhas, hands)
+
+    def log_betting_action(self, player, action):
+        self.records.append({'event': 'betting_action', 'player': player, 'action': action})
+        self.logger.log_betting_action(player, action)
+
+    def log_card_play(self, player, card):
+        self.records.append({'event': 'card_play', 'player': player, 'card': card})
+        self.logger.log_card_play(player, card)
+
+    def log_round_end(self, round_num, winner):
+        self.records.append({'event': 'round_end', 'round': round_num, 'winner': winner})
+        self.logger.log_round_end(round_num, winner)
+
+    def log_hand_end(self, winner, scores, ended_by_run=False):
+        self.records.append({'event': 'hand_end', 'winner': winner, 'scores': scores, 'ended_by_run': ended_by_run})
+        if ended_by_run:
+            self.logger.log_hand_end(winner=winner, scores=scores, ended_by_run=True)
+        else:
+            self.logger.log_hand_end(winner=winner, scores=scores)
+
+    def log_match_end(self, final_scores, winner, costs):
+        self.records.append({'event': 'match_end', 'final_scores': final_scores, 'winner': winner, 'costs': costs})
+        self.logger.log_match_end(final_scores=final_scores, winner=winner, costs=costs)
+
+    def save(self, event_dir=EVENT_DIR):
+        path = event_log_path(self.logger.match_id, event_dir)
+        path.parent.mkdir(exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for record in self.records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return path
+
+
+def read_events(path):
+    """Events of one event log, or None if the match has none.
+
+    Accepts the event name under 'event' or 'type', with or without the
+    'log_' prefix of the logger method.
+    """
+    try:
+        f = open(path, encoding="utf-8")
+    except FileNotFoundError:
+        return None
+    events = []
+    with f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                break  # Partially written last line
+            name = event.get('event', event.get('type', ''))
+            event['event'] = name[len('log_'):] if name.startswith('log_') else name
+            events.append(event)
+    return events
+
+
+def event_decisions(events):
+    """(deals, decisions) of a match rebuilt from its events.
+
+    deals holds (vira, hand A, hand B) per hand and decisions the
+    (action_type, action) of each player in order, as load_trace returns
+    them. Bets get the next bet type of the hand, and the third card of each
+    player, which the engine plays automatically, is not a decision.
+    """
+    deals = []
+    decisions = {'A': [], 'B': []}
+    bets = 0
+    cards_played = {'A': 0, 'B': 0}
+    for event in events:
+        name = event['event']
+        if name == 'hand_start':
+            hands = event['hands']
+            deals.append((tuple(event['vira']), [tuple(card) for card in hands['A']],
+                          [tuple(card) for card in hands['B']]))
+            bets = 0
+            cards_played = {'A': 0, 'B': 0}
+        elif name == 'betting_action':
+            action = {'action': event['action']}
+            if event['action'] == 'bet':
+                action['bet_type'] = BET_SEQUENCE[min(bets, len(BET_SEQUENCE) - 1)]
+                bets += 1
+            decisions[event['player']].append(('bet', action))
+        elif name == 'card_play':
+            cards_played[event['player']] += 1
+            if cards_played[event['player']] < 3:
+                decisions[event['player']].append(('play', {'action': 'play', 'card': list(event['card'])}))
+    return deals, decisions
@@ -0,0 +1,126 @@
+import mmap
+import struct
+import sys
+import time
+from itertools import combinations
+from math import comb
+from pathlib import Path
+from engine import SUITS, NUM_CARDS, STRENGTH_TABLES, card_to_index
+
+# Card strength is a total order (suits break every tie, not only between
+# manilhas), and every vira rank induces the same shape of order. So a
+# (vira, hand) pair is fully described by the strength positions (0..39) of
+# the vira and of the three cards, which folds all 10 vira ranks and 4 vira
+# suits into 36 possible vira positions (the vira is never a manilha).
+#
+# Equity is the probability of winning the hand against a uniformly random
+# opponent hand drawn from the 36 unseen cards, with both players playing
+# their cards strongest first and no betting.
+
+MAGIC = b'TRUCOEQ1'
+HEADER = struct.Struct('<8sII')  # magic, vira positions, hand slots per vira
+NUM_VIRA_POSITIONS = NUM_CARDS - len(SUITS)
+NUM_HAND_SLOTS = comb(NUM_CARDS, 3)
+
+DEFAULT_TABLE_PATH = Path(__file__).parent / 'hand_equity.bin'
+
+
+def _build_positions(strength):
+    """Dense 0..39 strength position of every card index"""
+    order = sorted(range(NUM_CARDS), key=lambda idx: strength[idx])
+    positions = [0] * NUM_CARDS
+    for position, idx in enumerate(order):
+        positions[idx] = position
+    return positions
+
+# POSITIONS[vira_rank][card_idx] -> strength position of that card
+POSITIONS = [_build_positions(strength) for strength in STRENGTH_TABLES]
+
+
+def hand_slot(positions):
+    """Colex rank of a set of three distinct strength positions"""
+    p0, p1, p2 = sorted(positions)
+    return p0 + comb(p1, 2) + comb(p2, 3)
+
+
+def canonical_key(vira, hand):
+    """Map a (vira, hand) pair of cards or card indices to its (vira position, hand slot)"""
+    vira_idx = card_to_index(vira) if isinstance(vira, (tuple, list)) else int(vira)
+    positions = POSITIONS[vira_idx // len(SUITS)]
+    hand_idx = [card_to_index(card) if isinstance(card, (tuple, list)) else int(card) for card in hand]
+    if len(hand_idx) != 3:
+        raise ValueError("Hand equity is defined for 3-card hands only")
+    return positions[vira_idx], hand_slot(positions[idx] for idx in hand_idx)
+
+
+class EquityTable:
+    """Read-only, memory-mapped view over a table written by build_equity_table"""
+
+    def __init__(self, path=DEFAULT_TABLE_PATH):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, vira_positions, hand_slots = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or (vira_positions, hand_slots) != (NUM_VIRA_POSITIONS, NUM_HAND_SLOTS):
+            self._mmap.close()
+            raise ValueError(f"Not a hand equity table: {self.path}")
+        self._values = memoryview(self._mmap)[HEADER.size:].cast('f')
+
+    def lookup(self, vira, hand):
+        """Win probability of a 3-card hand under the given vira"""
+        vira_position, slot = canonical_key(vira, hand)
+        return self._values[vira_position * NUM_HAND_SLOTS + slot]
+
+    def close(self):
+        self._values.release()
+        self._mmap.close()
+
+
+_default_table = None
+
+def get_default_table():
+    """Load the default equity table once per process"""
+    global _default_table
+    if _default_table is None:
+        _default_table = EquityTable(DEFAULT_TABLE_PATH)
+    return _default_table
+
+
+def build_equity_table(path=DEFAULT_TABLE_PATH, chunk_size=512):
+    """Enumerate every (vira position, hand) pair and write the equity table to path"""
+    import numpy as np  # Only needed to build the table, not to read it
+
+    values = np.full((NUM_VIRA_POSITIONS, NUM_HAND_SLOTS), np.nan, dtype=np.float32)
+    opponents_per_hand = comb(NUM_CARDS - 4, 3)
+
+    for vira_position in range(NUM_VIRA_POSITIONS):
+        remaining = [p for p in range(NUM_CARDS) if p != vira_position]
+        combos = list(combinations(remaining, 3))
+        slots = np.array([hand_slot(combo) for combo in combos])
+        # Each hand sorted strongest first, which is also the order it is played in
+        hands = np.array([combo[::-1] for combo in combos], dtype=np.int8)
+        masks = (np.uint64(1) << hands.astype(np.uint64)).sum(axis=1, dtype=np.uint64)
+
+        for start in range(0, len(hands), chunk_size):
+            mine = hands[start:start + chunk_size, None, :]
+            rounds_won = (mine > hands[None, :, :]).sum(axis=2)
+            disjoint = (masks[start:start + chunk_size, None] & masks[None, :]) == 0
+            wins = ((rounds_won >= 2) & disjoint).sum(axis=1)
+            values[vira_position, slots[start:start + chunk_size]] = wins / opponents_per_hand
+
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, NUM_VIRA_POSITIONS, NUM_HAND_SLOTS))
+        f.write(values.tobytes())
+
+
+if __name__ == '__main__':
+    output_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_TABLE_PATH
+    start = time.perf_counter()
+    build_equity_table(output_path)
+    print(f"Built {output_path} in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    table = EquityTable(output_path)
+    print(f"Loaded in {(time.perf_counter() - start) * 1000:.2f}ms")
+    print(f"Example: vira 4P, hand [3P, 3C, 2P] -> {table.lookup(('4', 'P'), [('3', 'P'), ('3', 'C'), ('2', 'P')]):.4f}")
@@ -0,0 +1,313 @@
+import json
+import os
+import random
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from checkpoint import unfinished_checkpoints
+from completion_cache import CompletionCache
+from bradley_terry import load_match_results
+from rating_service import RatingService
+from budget_controller import BudgetController
+from duplicate import new_duplicate_id, pair_duplicates
+from llm_play import play_match, AVAILABLE_MODELS, player_options_from_env
+
+DEFAULT_QUEUE_PATH = "job_queue.sqlite"
+LEASE_SECONDS = 300  # A claimed job whose lease runs out goes back to the queue
+MAX_ATTEMPTS = 3
+
+
+class Job:
+    """A claimed play_match job; `attempt` identifies the claim that owns the lease"""
+
+    def __init__(self, job_id, model_a, model_b, seed, player_options, attempt, worker, duplicate_id=None):
+        self.job_id = job_id
+        self.model_a = model_a
+        self.model_b = model_b
+        self.seed = seed
+        self.player_options = player_options
+        self.attempt = attempt
+        self.worker = worker
+        self.duplicate_id = duplicate_id
+
+
+class JobQueue:
+    """Durable SQLite queue of play_match jobs shared by worker processes and hosts.
+
+    Workers claim a job under a lease, renew it while the match runs and
+    complete it with the result. A worker that dies stops renewing, and once
+    the lease expires another worker claims the job again. Results are keyed
+    by job, so a job completed twice (a worker that outlived its lease) is
+    counted once. Each job's seed is drawn when it is enqueued, so a retried
+    job deals the same cards and can pick up the dead worker's checkpoint.
+    The two matches of a duplicate pair are separate jobs sharing a seed and
+    a duplicate_id, and are scored together once both are done.
+
+    The database uses a rollback journal rather than WAL, which needs shared
+    memory and does not work for hosts sharing the file over a network
+    filesystem. Leases compare wall clocks, so hosts need synchronized clocks.
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False, isolation_level=None)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                model_a TEXT NOT NULL,
+                model_b TEXT NOT NULL,
+                seed TEXT NOT NULL,  -- 64-bit seeds overflow SQLite integers
+                duplicate_id TEXT,  -- Shared by the two jobs of a duplicate pair
+                player_options TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',  -- pending, claimed, done, failed or cancelled
+                worker TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_until REAL,
+                error TEXT,
+                created REAL NOT NULL,
+                finished REAL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, job_id);
+            CREATE TABLE IF NOT EXISTS results (
+                job_id INTEGER PRIMARY KEY REFERENCES jobs (job_id),
+                model_a TEXT NOT NULL,
+                model_b TEXT NOT NULL,
+                winner TEXT,  -- NULL when a player forfeited
+                score_a INTEGER,
+                score_b INTEGER,
+                worker TEXT NOT NULL,
+                finished REAL NOT NULL
+            );
+        """)
+
+    def _transaction(self, statements):
+        """Run statements(conn) in a write transaction taken up front, returns its result"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return result
+
+    def enqueue(self, pairs, player_options=None, duplicate=False):
+        """Add one job per (model_A, model_B) pair, or with duplicate=True a mirrored
+        pair of jobs on the same seed, returns their job ids"""
+        options = json.dumps(player_options or {}, sort_keys=True)
+        rng = random.SystemRandom()
+        now = time.time()
+        jobs = []
+        for model_a, model_b in pairs:
+            seed = str(rng.getrandbits(64))
+            if duplicate:
+                duplicate_id = new_duplicate_id()
+                jobs += [(model_a, model_b, seed, duplicate_id), (model_b, model_a, seed, duplicate_id)]
+            else:
+                jobs.append((model_a, model_b, seed, None))
+
+        def insert(conn):
+            return [
+                conn.execute(
+                    "INSERT INTO jobs (model_a, model_b, seed, duplicate_id, player_options, created) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (model_a, model_b, seed, duplicate_id, options, now)
+                ).lastrowid
+                for model_a, model_b, seed, duplicate_id in jobs
+            ]
+        return self._transaction(insert)
+
+    def claim(self, worker, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        """Lease the oldest pending (or abandoned) job to worker, returns a Job or None"""
+        now = time.time()
+
+        def take(conn):
+            # Abandoned jobs out of attempts will not be retried
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = COALESCE(error, 'lease expired') "
+                "WHERE status = 'claimed' AND lease_until < ? AND attempts >= ?",
+                (now, max_attempts)
+            )
+            row = conn.execute(
+                "SELECT job_id, model_a, model_b, seed, player_options, attempts, duplicate_id FROM jobs "
+                "WHERE status = 'pending' OR (status = 'claimed' AND lease_until < ?) "
+                "ORDER BY job_id LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            job_id, model_a, model_b, seed, options, attempts, duplicate_id = row
+            conn.execute(
+                "UPDATE jobs SET status = 'claimed', worker = ?, attempts = ?, lease_until = ? WHERE job_id = ?",
+                (worker, attempts + 1, now + lease_seconds, job_id)
+            )
+            return Job(job_id, model_a, model_b, int(seed), json.loads(options), attempts + 1, worker, duplicate_id)
+        return self._transaction(take)
+
+    def renew(self, job, lease_seconds=LEASE_SECONDS):
+        """Extend the job's lease, returns False if the worker no longer holds it"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE job_id = ? AND worker = ? AND attempts = ? AND status = 'claimed'",
+                (time.time() + lease_seconds, job.job_id, job.worker, job.attempt)
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job, result):
+        """Record play_match's result for the job, returns False if it already had one"""
+        now = time.time()
+
+        def record(conn):
+            winner = result[2] if result else None
+            scores = result.scores if result else {}
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO results (job_id, model_a, model_b, winner, score_a, score_b, worker, finished) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.job_id, job.model_a, job.model_b, winner, scores.get('A'), scores.get('B'), job.worker, now)
+            ).rowcount == 1
+            conn.execute(
+                "UPDATE jobs SET status = 'done', finished = ?, lease_until = NULL WHERE job_id = ? AND status != 'done'",
+                (now, job.job_id)
+            )
+            return inserted
+        return self._transaction(record)
+
+    def fail(self, job, error, max_attempts=MAX_ATTEMPTS):
+        """Give the job back for another attempt, or mark it failed once out of attempts"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "error = ?, lease_until = NULL "
+                "WHERE job_id = ? AND worker = ? AND attempts = ? AND status = 'claimed'",
+                (max_attempts, error, job.job_id, job.worker, job.attempt)
+            )
+
+    def cancel_pending(self, models):
+        """Drop the pending jobs of any of these models, returns how many were dropped"""
+        models = list(models)
+        if not models:
+            return 0
+        placeholders = ", ".join("?" * len(models))
+        with self._lock:
+            return self._conn.execute(
+                f"UPDATE jobs SET status = 'cancelled' WHERE status = 'pending' "
+                f"AND (model_a IN ({placeholders}) OR model_b IN ({placeholders}))",
+                models + models
+            ).rowcount
+
+    def results(self):
+        """(model_A, model_B, winner) of every completed job without a forfeit, in job order,
+        followed by one result per complete duplicate pair (see duplicate.pair_duplicates)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT r.model_a, r.model_b, r.winner, r.score_a, r.score_b, j.duplicate_id "
+                "FROM results r JOIN jobs j ON j.job_id = r.job_id WHERE r.winner IS NOT NULL ORDER BY r.job_id"
+            ).fetchall()
+        singles = [(model_a, model_b, winner) for model_a, model_b, winner, _, _, duplicate_id in rows
+                   if duplicate_id is None]
+        halves = [(model_a, model_b, {'A': score_a, 'B': score_b}, duplicate_id)
+                  for model_a, model_b, _, score_a, score_b, duplicate_id in rows if duplicate_id is not None]
+        return singles + pair_duplicates(halves)
+
+    def counts(self):
+        """Number of jobs per status"""
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _checkpoint_for(job):
+    """Checkpoint left by an earlier attempt at this job, if any"""
+    for checkpoint in unfinished_checkpoints():
+        if checkpoint.job_id == job.job_id:
+            return checkpoint
+    return None
+
+
+def _renew_until(queue, job, lease_seconds, stop):
+    while not stop.wait(lease_seconds / 3):
+        if not queue.renew(job, lease_seconds):
+            print(f"Lost the lease on job {job.job_id}")
+            return
+
+
+def work(queue, worker, cache=None, lease_seconds=LEASE_SECONDS):
+    """Claim and play jobs until none is left to claim, returns the number completed"""
+    completed = 0
+    while True:
+        job = queue.claim(worker, lease_seconds)
+        if job is None:
+            return completed
+        stop = threading.Event()
+        threading.Thread(target=_renew_until, args=(queue, job, lease_seconds, stop), daemon=True).start()
+        try:
+            result = play_match(job.model_a, job.model_b, seed=job.seed, cache=cache, resume=_checkpoint_for(job),
+                                duplicate_id=job.duplicate_id, job_id=job.job_id, **job.player_options)
+        except Exception as e:
+            print(f"Job {job.job_id} failed: {e!r}")
+            queue.fail(job, repr(e))
+            continue
+        finally:
+            stop.set()
+        queue.complete(job, result)
+        completed += 1
+
+
+def run_worker(path=DEFAULT_QUEUE_PATH, threads=8):
+    """One worker process playing up to `threads` matches at a time, returns the number completed"""
+    queue = JobQueue(path)
+    cache_path = os.environ.get("TRUCO_COMPLETION_CACHE")
+    cache = CompletionCache(cache_path) if cache_path else None
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            futures = [executor.submit(work, queue, f"{worker}:{i}", cache) for i in range(threads)]
+            return sum(future.result() for future in futures)
+    finally:
+        queue.close()
+
+
+if __name__ == '__main__':
+    # python job_queue.py enqueue [matches] [--duplicate] | work [processes] [threads per process] | status
+    duplicate = '--duplicate' in sys.argv
+    sys.argv = [arg for arg in sys.argv if arg != '--duplicate']
+    command = sys.argv[1] if len(sys.argv) > 1 else 'status'
+    queue = JobQueue()
+
+    if command == 'enqueue':
+        num_matches = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+        # Matches go to the leaderboard neighbours whose order is still contested
+        # (the queue results when there are any, as they include matches played on other hosts)
+        controller = BudgetController(RatingService(queue.results() or load_match_results()), AVAILABLE_MODELS)
+        controller.print_status()
+        cancelled = queue.cancel_pending(controller.retired_models())
+        if cancelled:
+            print(f"Cancelled {cancelled} pending jobs of retired models")
+        # Duplicate pairs are two matches each, so the same number of matches is paid for
+        pairs = controller.select_pairs(max(1, num_matches // 2) if duplicate else num_matches)
+        job_ids = queue.enqueue(pairs, player_options_from_env(), duplicate)
+        print(f"Enqueued {len(job_ids)} jobs")
+    elif command == 'work':
+        processes = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+        threads = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [executor.submit(run_worker, queue.path, threads) for _ in range(processes)]
+            completed = sum(future.result() for future in futures)
+        print(f"Completed {completed} jobs in {time.perf_counter() - start:.1f}s")
+
+    print('Jobs:', queue.counts())
+    results = queue.results()
+    if results:
+        RatingService(results).write_leaderboard()
+        print(f"Wrote the leaderboard from {len(results)} results")
+    queue.close()
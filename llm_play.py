@@ -1,17 +1,23 @@
+import asyncio
+import functools
 import os
+import time
 from pathlib import Path
 import json
-import math
 import random
 from engine import TrucoEngine
+from mcts_player import MCTSPlayer
 from human_readable_match import format_match_events
-from litellm import completion, completion_cost
-import requests
 from datetime import datetime, timezone
 import uuid
 from match_events import MatchEventLogger
-import re
-from tenacity import retry, stop_after_attempt, retry_if_exception_type, wait_exponential
+from event_log import EventLogRecorder
+from completion_cache import CompletionCache, cache_key
+from trace_store import get_trace_writer
+from checkpoint import MatchCheckpoint, CheckpointMismatch, unfinished_checkpoints
+from action_parser import parse_action, planned_card, response_format
+from metrics import get_metrics
+from duplicate import new_duplicate_id, duplicate_result
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import sys
 
@@ -24,27 +30,83 @@ def generate_match_id():
     match_id = uuid.uuid4().hex[:8]
     return f"{timestamp}_{match_id}"
 
+# Parts of the game state kept with each logged decision
+DECISION_STATE_KEYS = ('my_score', 'opponent_score', 'current_bet', 'pending_bet', 'betting_round')
+
 class MatchTraceLogger:
-    def __init__(self, model_a, model_b, match_id):
+    def __init__(self, model_a, model_b, match_id, writer=None, checkpoint=None):
         self.model_a = model_a
         self.model_b = model_b
-        self.trace_dir = Path("match_traces")
-        self.trace_dir.mkdir(exist_ok=True)
-        
-        self.trace_file = self.trace_dir / f"match_trace_{match_id}.jsonl"
+        self.match_id = match_id
+        # Records of every match go through one shared background writer
+        self.writer = writer or get_trace_writer()
+        # Optional MatchCheckpoint persisted after every decision
+        self.checkpoint = checkpoint
+
+    def _write(self, record):
+        record['match_id'] = self.match_id
+        self.writer.write(record)
+
+    def close(self):
+        """Block until this match's records are on disk, raises the error if some were lost"""
+        self.writer.flush(self.match_id)
+
+    def log_match_start(self, seed, resumed_from=None, duplicate_id=None):
+        """Header record with everything needed to replay the match offline"""
+        record = {
+            'type': 'match_start',
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'model_a': self.model_a,
+            'model_b': self.model_b,
+            'seed': seed,
+        }
+        if resumed_from is not None:
+            record['resumed_from'] = resumed_from
+        if duplicate_id is not None:
+            record['duplicate_id'] = duplicate_id
+        self._write(record)
+
+    def log_decision(self, player, action_type, action, state=None, stats=None):
+        """Record the action the match loop actually received from a player.
+
+        `state` is the game state the player saw and `stats` the request
+        accounting from TrucoPlayer.decision_stats(), both for the decision index.
+        """
+        record = {
+            'type': 'decision',
+            'player': player,
+            'action_type': action_type,
+            'action': action,
+        }
+        if state is not None:
+            record['state'] = {key: state[key] for key in DECISION_STATE_KEYS}
+        if stats is not None:
+            record.update(stats)
+        self._write(record)
+        if self.checkpoint is not None:
+            self.checkpoint.record(player, action_type, action)
+
+    def log_match_end(self, final_scores):
+        self._write({
+            'type': 'match_end',
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'final_scores': final_scores,
+        })
         
-    def log_completion(self, model, messages, response, player, action_type):
+    def log_completion(self, model, messages, response, player, action_type, cached=False, latency=None, cost=None):
         trace = {
+            'type': 'completion',
             'timestamp': datetime.now(timezone.utc).isoformat(),
             'model': model,
             'player': player,
             'action_type': action_type,
             'messages': messages,
-            'response': response.model_dump() if hasattr(response, 'model_dump') else response,
+            'response': response,  # model_dump() runs on the writer thread
+            'cached': cached,
+            'latency': latency,
+            'cost': cost,
         }
-        
-        with open(self.trace_file, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(trace, ensure_ascii=False) + '\n')
+        self._write(trace)
 
 class LLMResponseError(Exception):
     def __init__(self, message, player_name=None, model=None, game_state=None, raw_response=None):
@@ -63,14 +125,48 @@ class LLMResponseError(Exception):
         detailed_message = "\n".join(filter(None, [message] + error_details))
         super().__init__(detailed_message)
 
-def format_game_state(engine, player_cards, player_num):
+def _litellm():
+    """litellm, imported on the first completion: it alone takes seconds to import,
+    which engine-only users of this module (replay, analysis, benchmarks) never need"""
+    import litellm
+    return litellm
+
+# Retrying is left to retry_llm_errors, so that every request, including the
+# 429s and 5xx the SDKs under litellm would retry on their own, is counted and
+# timed in the decision stats and metrics
+REQUEST_OPTIONS = {'timeout': 300, 'max_retries': 0, 'num_retries': 0}
+
+def retry_llm_errors(func):
+    """tenacity retry of LLMResponseError (5 attempts, exponential wait), with tenacity imported on the first call"""
+    retrying = None
+
+    def retrying_func():
+        nonlocal retrying
+        if retrying is None:
+            from tenacity import retry, stop_after_attempt, retry_if_exception_type, wait_exponential
+            retrying = retry(stop=stop_after_attempt(5), wait=wait_exponential(),
+                             retry=retry_if_exception_type(LLMResponseError))(func)
+        return retrying
+
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            return await retrying_func()(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return retrying_func()(*args, **kwargs)
+    return wrapper
+
+def format_game_state(engine, player_cards, player_num, include_equity=False):
     """Format game state for LLM consumption"""
     # Calculate if there's a pending bet to respond to
     pending_bet = None
     if engine.bet_stack and engine.bet_stack[-1]['team'] != player_num:
         pending_bet = engine.bet_stack[-1]['type']
 
-    return {
+    state = {
         'my_cards': player_cards,
         'vira': engine.vira,
         'manilhas': engine.manilhas,
@@ -81,20 +177,25 @@ def format_game_state(engine, player_cards, player_num):
         'pending_bet': pending_bet,
         'betting_round': len(engine.bet_stack) + 1
     }
+    if include_equity:
+        # Equity of the dealt hand, for analysis only (not shown in the prompts)
+        state['hand_equity'] = engine.hand_equity(player_num)
+    return state
 
-class TrucoPlayer:
-    def __init__(self, name, model='openai/gpt-4o-mini', trace_logger=None):
-        self.name = name
-        self.model = model
-        self.total_cost = 0.0
-        self.trace_logger = trace_logger
-        
-    @retry(stop=stop_after_attempt(5), wait=wait_exponential(), retry=retry_if_exception_type(LLMResponseError))
-    def decide_bet(self, game_state):
-        """Decide whether to make/respond to a bet"""
-        rules = """Você é um jogador de Truco tomando uma decisão sobre apostas.
+# Prompt text that never changes between calls. The static rules and answer
+# formats live in the system prompt and only the game state goes in the user
+# message, so every request of a kind shares a byte-identical prefix that
+# providers can serve from their prompt cache.
+GAME_RULES = """O Truco é disputado em mãos. Cada mão vale inicialmente 1 ponto, e ganha o jogo quem fizer 12 pontos. 
+Cada jogador recebe três cartas por mão.
+
+Uma carta é virada (a vira) e a carta seguinte em seus 4 naipes são as Manilhas, na ordem de força:
+- Paus (mais forte)
+- Copas
+- Espadas
+- Ouros (mais fraca)"""
 
-IMPORTANTE: Se houver uma aposta pendente, você DEVE responder com uma das ações:
+BETTING_RULES = """IMPORTANTE: Se houver uma aposta pendente, você DEVE responder com uma das ações:
 - 'accept' para aceitar a aposta (apenas se houver uma aposta pendente)
 - 'run' para correr (apenas se houver uma aposta pendente)
 - 'bet' com o próximo valor para aumentar
@@ -107,14 +208,7 @@ Nota: 'accept' só é válido quando há uma aposta pendente!
 
 Regras de apostas:
 
-O Truco é disputado em mãos. Cada mão vale inicialmente 1 ponto, e ganha o jogo quem fizer 12 pontos. 
-Cada jogador recebe três cartas por mão.
-
-Uma carta é virada (a vira) e a carta seguinte em seus 4 naipes são as Manilhas, na ordem de força:
-- Paus (mais forte)
-- Copas
-- Espadas
-- Ouros (mais fraca)
+""" + GAME_RULES + """
 
 A mão é dividida em 3 rodadas. Em cada rodada, cada jogador joga uma carta.
 Quem ganhar 2 rodadas ganha a mão e marca os pontos.
@@ -130,146 +224,254 @@ Ao ser trucado, pode-se:
 2. Aumentar para o próximo valor
 3. Correr (o adversário ganha os pontos da aposta anterior)"""
 
-        state_info = f"""
-Estado atual do jogo:
-- Suas cartas: {game_state['my_cards']}
-- Vira: {game_state['vira']}
-- Manilhas: {game_state['manilhas']}
-- Seu placar: {game_state['my_score']}
-- Placar adversário: {game_state['opponent_score']}
-- Aposta atual: {game_state['current_bet']}
-- Rodada de apostas: {game_state['betting_round']}
-- Histórico de apostas: {game_state['bet_history']}
-- Aposta pendente: {game_state['pending_bet'] if game_state['pending_bet'] else 'Nenhuma'}
+CARD_STRENGTH = """Força das cartas (da mais fraca para mais forte):
+4 < 5 < 6 < 7 < Q < J < K < A < 2 < 3 < Manilhas
 
-Qual sua decisão sobre apostas? Retorne um dicionário Python, num bloco de código Python (três crases ``` antes e depois), com uma das seguintes estruturas:
+Manilhas (da mais forte para mais fraca):
+- Manilha de Paus (mais forte) - P
+- Manilha de Copas - C
+- Manilha de Espadas - E
+- Manilha de Ouros (mais fraca) - O"""
+
+BET_ANSWER_FORMAT = """Nas decisões sobre apostas, retorne um dicionário Python, num bloco de código Python (três crases ``` antes e depois), com uma das seguintes estruturas:
 
 1. Para não fazer aposta:
 ```python
-{{'action': 'pass'}}
+{'action': 'pass'}
 ```
 
 2. Para pedir truco/aumentar aposta:
-   {{"action": "bet", "bet_type": "truco/six/nine/twelve"}}
+   {"action": "bet", "bet_type": "truco/six/nine/twelve"}
    Exemplo:
 ```python
-{{"action": "bet", "bet_type": "truco"}}
+{"action": "bet", "bet_type": "truco"}
 ```
 
 3. Para aceitar uma aposta pendente:
 ```python
-{{'action': 'accept'}}
+{'action': 'accept'}
 ```
 
 4. Para correr de uma aposta pendente:
 ```python
-   {{'action': 'run'}}
-```
-"""
+   {'action': 'run'}
+```"""
 
-        messages = [
-            {"role": "system", "content": rules},
-            {"role": "user", "content": state_info}
-        ]
-        
-        try:
-            if 'openrouter' in self.model:
-                response = completion(model=self.model,
-                                    messages=messages,
-                                    timeout=300,
-                                    extra_body={
-                                        "include_reasoning": True,
-                                        "provider": {
-                                            "sort":"throughput"
-                                        }
-                                    })
-            else:
-                response = completion(model=self.model,
-                                    messages=messages,
-                                    timeout=300)
-                
-            if self.trace_logger:
-                self.trace_logger.log_completion(
-                    model=self.model,
-                    messages=messages,
-                    response=response,
-                    player=self.name,
-                    action_type='bet'
-                )
-            
-            # Only track cost for non-openrouter models
-            try:
-                cost = completion_cost(completion_response=response)
-                formatted_cost = f"${float(cost):.10f}"
-                #print(formatted_cost)
-                self.total_cost += float(cost)
-            except:
-                pass
-            
-            content = response.choices[0].message.content
-            #print(content)
-                
-            # Look for content between ```python and ``` or just {...}
-            match = re.search(r'```python\s*(\{[^}]*\})\s*```|(\{[^}]*\})', content, re.DOTALL)
-            if not match:
-                print("Invalid LLM response format in decide_bet. Full response:")
-                print(content)
-                raise LLMResponseError(
-                    "Invalid LLM response format in decide_bet",
-                    player_name=self.name,
-                    model=self.model,
-                    game_state=game_state,
-                    raw_response=content
-                )
-                
-            # Use the first group that matched (either inside ``` or standalone)
-            dict_str = match.group(1) or match.group(2)
-            action = eval(dict_str)
-            
-            # Validate the action has required fields
-            if 'action' not in action:
-                return None
-                
-            if action['action'] == 'bet' and 'bet_type' not in action:
-                print("LLM response missing 'bet_type' in decide_bet. Full response:")
-                print(content)
-                raise LLMResponseError(
-                    "Invalid bet action in decide_bet - missing bet_type",
-                    player_name=self.name,
-                    model=self.model,
-                    game_state=game_state,
-                    raw_response=content
-                )
-                
-            return action
-            
-        except Exception as e:
-            print(f"LLM parsing error in decide_bet for model: {self.model}. Raw response:")
-            if 'content' in locals():
-                print(content)
-            raise LLMResponseError(
-                f"Error parsing LLM response in decide_bet: {str(e)}",
-                player_name=self.name,
-                model=self.model,
-                game_state=game_state,
-                raw_response=content if 'content' in locals() else None
-            )
-            
-    @retry(stop=stop_after_attempt(5), wait=wait_exponential(), retry=retry_if_exception_type(LLMResponseError))
-    def decide_play(self, game_state):
-        """Decide which card to play"""
-        rules = """Você é um jogador de Truco decidindo qual carta jogar.
+PLAY_ANSWER_FORMAT = """Ao escolher uma carta, retorne um dicionário Python, num bloco de código Python (três crases ``` antes e depois), com a estrutura: {"action": "play", "card": ["rank", "suit"]}
+Exemplo: 
+```python
+{"action": "play", "card": ["K", "P"]}
+```"""
 
-Regras do jogo:
-O Truco é disputado em mãos. Cada mão vale inicialmente 1 ponto, e ganha o jogo quem fizer 12 pontos. 
-Cada jogador recebe três cartas por mão.
+BET_SYSTEM_PROMPT = "Você é um jogador de Truco tomando uma decisão sobre apostas.\n\n" + BETTING_RULES + "\n\n" + BET_ANSWER_FORMAT
+PLAY_SYSTEM_PROMPT = ("Você é um jogador de Truco decidindo qual carta jogar.\n\nRegras do jogo:\n" + GAME_RULES
+                      + "\n\n" + CARD_STRENGTH + "\n\n" + PLAY_ANSWER_FORMAT)
+SESSION_SYSTEM_PROMPT = (
+    "Você é um jogador de Truco. Nesta conversa você toma todas as decisões de uma mão: "
+    "apostas e cartas. Cada mensagem traz o que mudou no jogo desde a anterior.\n\n"
+    + BETTING_RULES + "\n\n" + CARD_STRENGTH + "\n\n" + BET_ANSWER_FORMAT + "\n\n" + PLAY_ANSWER_FORMAT
+)
+COMBINED_SYSTEM_PROMPT = BET_SYSTEM_PROMPT + "\n\n" + CARD_STRENGTH
+BET_QUESTION = "Qual sua decisão sobre apostas?"
+PLAY_QUESTION = "Qual carta você quer jogar?"
+COMBINED_QUESTION = """Qual sua decisão sobre apostas? Diga também qual carta você vai jogar nesta rodada se as apostas terminarem assim: inclua no mesmo dicionário a chave "card" com a carta. Exemplo:
+```python
+{"action": "pass", "card": ["K", "P"]}
+```"""
 
-Uma carta é virada (a vira) e a carta seguinte em seus 4 naipes são as Manilhas, na ordem de força:
-- Paus (mais forte)
-- Copas
-- Espadas
-- Ouros (mais fraca)"""
+# Providers that only cache a prompt prefix marked with cache_control; OpenAI,
+# DeepSeek and others cache long prefixes automatically
+CACHE_CONTROL_MARKERS = ('anthropic/', 'claude')
+
+# Labels for the state fields a session message may carry, in message order
+SESSION_STATE_FIELDS = (
+    ('my_cards', 'Suas cartas'),
+    ('vira', 'Vira'),
+    ('manilhas', 'Manilhas'),
+    ('my_score', 'Seu placar'),
+    ('opponent_score', 'Placar adversário'),
+    ('current_bet', 'Aposta atual'),
+    ('betting_round', 'Rodada de apostas'),
+    ('bet_history', 'Histórico de apostas'),
+    ('pending_bet', 'Aposta pendente'),
+)
+
+class HandSession:
+    """Multi-turn conversation that carries a player through one hand.
+
+    The first message of a hand has the full state; later ones only the fields
+    that changed, appended after the model's previous answers. The growing
+    conversation is itself a stable prefix, so each request re-sends mostly
+    cached tokens. A new hand (scores or vira changed, or cards that were not
+    in the hand) starts a new conversation.
+    """
+
+    def __init__(self):
+        self.history = []
+        self.hand_key = None
+        self.hand_cards = set()
+        self.last_state = {}
+
+    def _new_hand(self, game_state):
+        hand_key = (game_state['my_score'], game_state['opponent_score'], tuple(game_state['vira']))
+        cards = {tuple(card) for card in game_state['my_cards']}
+        return hand_key != self.hand_key or not cards <= self.hand_cards
+
+    def messages(self, player, game_state, action_type, question):
+        """Messages for the next decision; the exchange is kept only once it is committed"""
+        if self._new_hand(game_state):
+            self.history = [player._system_message(SESSION_SYSTEM_PROMPT)]
+            self.hand_key = (game_state['my_score'], game_state['opponent_score'], tuple(game_state['vira']))
+            self.hand_cards = {tuple(card) for card in game_state['my_cards']}
+            self.last_state = {}
+            header = "Nova mão. Estado atual do jogo:"
+        else:
+            header = "O que mudou no jogo:"
+
+        lines = []
+        for key, label in SESSION_STATE_FIELDS:
+            value = game_state[key]
+            if key == 'pending_bet' and not value:
+                value = 'Nenhuma'
+            if key not in self.last_state or self.last_state[key] != value:
+                lines.append(f"- {label}: {value}")
+        if not lines:
+            lines.append("- Nada mudou desde a sua última decisão")
+        content = "\n".join([header] + lines + ["", question])
+        return self.history + [{"role": "user", "content": content}]
+
+    def commit(self, messages, answer, game_state):
+        """Keep a request and its valid answer in the conversation"""
+        self.history = messages + [{"role": "assistant", "content": answer}]
+        self.last_state = {
+            key: (game_state[key] if key != 'pending_bet' or game_state[key] else 'Nenhuma')
+            for key, _ in SESSION_STATE_FIELDS
+        }
+        # Copies, since the engine keeps mutating its lists
+        self.last_state['my_cards'] = list(game_state['my_cards'])
+        self.last_state['bet_history'] = [dict(bet) for bet in game_state['bet_history']]
+
+def usage_tokens(response):
+    """(prompt, completion, reasoning, cached prompt) token counts of a response, zeros when not reported"""
+    usage = getattr(response, 'usage', None)
+    if usage is None:
+        return (0, 0, 0, 0)
+    details = getattr(usage, 'completion_tokens_details', None)
+    prompt_details = getattr(usage, 'prompt_tokens_details', None)
+    # OpenAI-style prompt_tokens_details, or Anthropic's cache_read_input_tokens
+    cached = getattr(prompt_details, 'cached_tokens', 0) or getattr(usage, 'cache_read_input_tokens', 0) or 0
+    return (
+        getattr(usage, 'prompt_tokens', 0) or 0,
+        getattr(usage, 'completion_tokens', 0) or 0,
+        getattr(details, 'reasoning_tokens', 0) or 0,
+        cached,
+    )
+
+class TrucoPlayer:
+    def __init__(self, name, model='openai/gpt-4o-mini', trace_logger=None, cache=None, limiter=None, session=False,
+                 structured=False, combined=False, stream=False):
+        self.name = name
+        self.model = model
+        self.total_cost = 0.0
+        self.trace_logger = trace_logger
+        self.cache = cache  # Optional CompletionCache shared between players
+        self.limiter = limiter  # Optional ProviderLimiter for async requests
+        self._attempts = []  # Requests made for the decision in progress, retries included
+        self.session = HandSession() if session else None  # Multi-turn prompts, one conversation per hand
+        self.structured = structured  # Ask for a JSON action through response_format
+        self.stream = stream  # Stream responses to measure time to first byte
+        self.combined = combined  # Ask for the round's card together with each betting action
+        self._plan = None  # (card, hand, stake, scores) from the last combined answer
+        self._plan_used = False
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+
+    def _completion_params(self, action_type):
+        """Provider-specific request parameters that affect the response"""
+        params = {}
+        if 'openrouter' in self.model:
+            params = {
+                'extra_body': {
+                    "include_reasoning": True,
+                    "provider": {
+                        "sort":"throughput"
+                    }
+                }
+            }
+        if self.structured:
+            params['response_format'] = response_format(action_type, with_card=self.combined)
+        return params
+
+    def _completion(self, messages, action_type):
+        """Call the model, going through the completion cache when one is set.
+
+        Returns (response, cached, ttfb); ttfb is only measured when streaming.
+        """
+        params = self._completion_params(action_type)
+        if self.cache is not None:
+            cached_response = self.cache.get(cache_key(self.model, messages, params))
+            if cached_response is not None:
+                return _litellm().ModelResponse(**cached_response), True, None
 
+        if not self.stream:
+            return _litellm().completion(model=self.model, messages=messages, **REQUEST_OPTIONS, **params), False, None
+        start = time.perf_counter()
+        ttfb = None
+        chunks = []
+        for chunk in _litellm().completion(model=self.model, messages=messages, **REQUEST_OPTIONS, stream=True,
+                                stream_options={"include_usage": True}, **params):
+            if ttfb is None:
+                ttfb = time.perf_counter() - start
+            chunks.append(chunk)
+        return _litellm().stream_chunk_builder(chunks, messages=messages), False, ttfb
+
+    async def _acompletion(self, messages, action_type):
+        """Async _completion, holding the provider's concurrency slot while the request runs"""
+        params = self._completion_params(action_type)
+        if self.cache is not None:
+            cached_response = self.cache.get(cache_key(self.model, messages, params))
+            if cached_response is not None:
+                return _litellm().ModelResponse(**cached_response), True, None
+
+        if self.limiter is None:
+            return await self._arequest(messages, params)
+        async with self.limiter.slot(self.model):
+            return await self._arequest(messages, params)
+
+    async def _arequest(self, messages, params):
+        if not self.stream:
+            return await _litellm().acompletion(model=self.model, messages=messages, **REQUEST_OPTIONS, **params), False, None
+        start = time.perf_counter()
+        ttfb = None
+        chunks = []
+        async for chunk in await _litellm().acompletion(model=self.model, messages=messages, **REQUEST_OPTIONS, stream=True,
+                                             stream_options={"include_usage": True}, **params):
+            if ttfb is None:
+                ttfb = time.perf_counter() - start
+            chunks.append(chunk)
+        return _litellm().stream_chunk_builder(chunks, messages=messages), False, ttfb
+
+    def _cache_response(self, messages, response, action_type):
+        """Store a response once it parsed into a valid action, so retries never replay a bad answer"""
+        if self.cache is not None:
+            key = cache_key(self.model, messages, self._completion_params(action_type))
+            self.cache.put(key, self.model, response.model_dump())
+        
+    def _system_message(self, text):
+        """System prompt, with a cache breakpoint for providers that need an explicit one"""
+        if any(marker in self.model for marker in CACHE_CONTROL_MARKERS):
+            return {"role": "system", "content": [
+                {"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}
+            ]}
+        return {"role": "system", "content": text}
+
+    def _bet_question(self):
+        return COMBINED_QUESTION if self.combined else BET_QUESTION
+
+    def _bet_messages(self, game_state):
+        """Build the bet decision prompt"""
+        if self.session is not None:
+            return self.session.messages(self, game_state, 'bet', self._bet_question())
         state_info = f"""
 Estado atual do jogo:
 - Suas cartas: {game_state['my_cards']}
@@ -277,140 +479,274 @@ Estado atual do jogo:
 - Manilhas: {game_state['manilhas']}
 - Seu placar: {game_state['my_score']}
 - Placar adversário: {game_state['opponent_score']}
-- Rodada de apostas: {game_state['betting_round']}
 - Aposta atual: {game_state['current_bet']}
+- Rodada de apostas: {game_state['betting_round']}
+- Histórico de apostas: {game_state['bet_history']}
+- Aposta pendente: {game_state['pending_bet'] if game_state['pending_bet'] else 'Nenhuma'}
 
-Força das cartas (da mais fraca para mais forte):
-4 < 5 < 6 < 7 < Q < J < K < A < 2 < 3 < Manilhas
+{self._bet_question()}"""
 
-Manilhas (da mais forte para mais fraca):
-- Manilha de Paus (mais forte) - P
-- Manilha de Copas - C
-- Manilha de Espadas - E
-- Manilha de Ouros (mais fraca) - O
+        messages = [
+            self._system_message(COMBINED_SYSTEM_PROMPT if self.combined else BET_SYSTEM_PROMPT),
+            {"role": "user", "content": state_info}
+        ]
+        return messages
 
-Qual carta você quer jogar? Retorne um dicionário Python, num bloco de código Python (três crases ``` antes e depois), com a estrutura: {{"action": "play", "card": ["rank", "suit"]}}
-Exemplo: 
-```python
-{{"action": "play", "card": ["K", "P"]}}
-```"""
+    def _play_messages(self, game_state):
+        """Build the card play prompt"""
+        if self.session is not None:
+            return self.session.messages(self, game_state, 'play', PLAY_QUESTION)
+        state_info = f"""
+Estado atual do jogo:
+- Suas cartas: {game_state['my_cards']}
+- Vira: {game_state['vira']}
+- Manilhas: {game_state['manilhas']}
+- Seu placar: {game_state['my_score']}
+- Placar adversário: {game_state['opponent_score']}
+- Rodada de apostas: {game_state['betting_round']}
+- Aposta atual: {game_state['current_bet']}
+
+{PLAY_QUESTION}"""
 
         messages = [
-            {"role": "system", "content": rules},
+            self._system_message(PLAY_SYSTEM_PROMPT),
             {"role": "user", "content": state_info}
         ]
-        
-        #print(state_info)
+        return messages
+
+    def _request_error(self, method, error, game_state, latency):
+        """Wrap a failed completion request so tenacity retries it"""
+        self._attempts.append({'latency': latency, 'cost': 0.0, 'cached': False, 'tokens': (0, 0, 0, 0)})
+        print(f"LLM request error in {method} for model: {self.model}: {error!r}")
+        return LLMResponseError(
+            f"LLM request failed in {method}: {str(error)}",
+            player_name=self.name,
+            model=self.model,
+            game_state=game_state,
+            raw_response=None
+        )
+
+    def _process_response(self, action_type, messages, response, cached, game_state, latency, ttfb=None):
+        """Log, account for and parse a completion into an action"""
+        method = 'decide_bet' if action_type == 'bet' else 'decide_play'
+        content = None
         try:
-            if 'openrouter' in self.model:
-                response = completion(model=self.model,
-                                    messages=messages,
-                                    timeout=300,
-                                    extra_body={
-                                        "include_reasoning": True,
-                                        "provider": {
-                                            "sort":"throughput"
-                                        }
-                                    })
-            else:
-                response = completion(model=self.model,
-                                    messages=messages,
-                                    timeout=300)
-                
+            # Cache hits are free. litellm has no prices for some models (e.g. most
+            # of OpenRouter); those responses are counted as cost errors
+            cost = 0.0
+            cost_error = False
+            if not cached:
+                try:
+                    cost = float(_litellm().completion_cost(completion_response=response))
+                    self.total_cost += cost
+                except Exception:
+                    cost_error = True
+            tokens = usage_tokens(response)
+            attempt = {'latency': latency, 'ttfb': ttfb, 'cost': cost, 'cost_error': cost_error, 'cached': cached,
+                       'tokens': tokens, 'parse': 'failed'}
+            self._attempts.append(attempt)
+            if not cached:
+                self.prompt_tokens += tokens[0]
+                self.cached_prompt_tokens += tokens[3]
+
             if self.trace_logger:
                 self.trace_logger.log_completion(
                     model=self.model,
                     messages=messages,
                     response=response,
                     player=self.name,
-                    action_type='play'
+                    action_type=action_type,
+                    cached=cached,
+                    latency=latency,
+                    cost=cost
                 )
             
-            try:
-                cost = completion_cost(completion_response=response)
-                formatted_cost = f"${float(cost):.10f}"
-                #print(formatted_cost)
-                self.total_cost += float(cost)
-            except:
-                pass
-            
             content = response.choices[0].message.content
             #print(content)
-            
-            # Look for content between ```python and ``` or just {...}
-            match = re.search(r'```python\s*({.*?})\s*```|({.*?})', content, re.DOTALL)
-            if not match:
-                print("Invalid LLM response format in decide_play. Full response:")
-                print(content)
-                raise LLMResponseError(
-                    "No valid dictionary found in LLM response in decide_play",
-                    player_name=self.name,
-                    model=self.model,
-                    game_state=game_state,
-                    raw_response=content
-                )
+            action, attempt['parse'] = parse_action(content, action_type, game_state['my_cards'])
                 
-            # Use the first group that matched (either inside ``` or standalone)
-            dict_str = match.group(1) or match.group(2)
-            action = eval(dict_str)
-            
-            # Validate the action has required fields
-            if action['action'] != 'play' or 'card' not in action:
-                print("Invalid play action format in decide_play. Full response:")
-                print(content)
-                raise LLMResponseError(
-                    "Invalid play action in decide_play - missing required fields",
-                    player_name=self.name,
-                    model=self.model,
-                    game_state=game_state,
-                    raw_response=content
-                )
-                
-            if action['action'] == 'play':
-                # Validate that the chosen card is indeed in the provided game state.
-                if tuple(action['card']) not in game_state['my_cards']:
-                    print("Decided card is not among the available cards in game_state.")
-                    raise LLMResponseError(
-                        "Invalid card: not in player's hand",
-                        player_name=self.name,
-                        model=self.model,
-                        game_state=game_state,
-                        raw_response=content
-                    )
-                    
-            return action
-            
         except Exception as e:
-            print(f"LLM parsing error in decide_play for model: {self.model}. Raw response:")
-            if 'content' in locals():
+            print(f"LLM parsing error in {method} for model: {self.model}. Raw response:")
+            if content is not None:
                 print(content)
             raise LLMResponseError(
-                f"Error parsing LLM response in decide_play: {str(e)}",
+                f"Error parsing LLM response in {method}: {str(e)}",
                 player_name=self.name,
                 model=self.model,
                 game_state=game_state,
-                raw_response=content if 'content' in locals() else None
+                raw_response=content
             )
 
-def play_match(model_A='openai/gpt-4o-mini', model_B='openai/gpt-4o-mini'):
-    """Play a single match between two LLM players"""
-    engine = TrucoEngine()
-    
-    # Generate unique match ID
-    match_id = generate_match_id()
-    
-    # Initialize loggers
-    trace_logger = MatchTraceLogger(model_A, model_B, match_id)
-    
-    # Create players with different strategies
-    player_a = TrucoPlayer("A", model=model_A, trace_logger=trace_logger)
-    player_b = TrucoPlayer("B", model=model_B, trace_logger=trace_logger)
+        if not cached:
+            self._cache_response(messages, response, action_type)
+        if self.session is not None:
+            self.session.commit(messages, content, game_state)
+        if self.combined and action_type == 'bet':
+            self._plan = self._make_plan(action, content, game_state)
+        return action
 
-    # Initialize event logger
-    event_logger = MatchEventLogger(player_a.model, player_b.model, match_id)
+    def _make_plan(self, action, content, game_state):
+        """Remember the card from a combined answer, with the stake it assumed.
 
-    print(f"\n=== Game Started! ===\nTeam {player_a.model} vs Team {player_b.model}")
-    
+        Passing keeps the current stake and accepting makes the pending bet the
+        stake. A raise leaves the stake open, so it gets no plan.
+        """
+        if action['action'] == 'pass':
+            stake = game_state['current_bet']
+        elif action['action'] == 'accept' and game_state['bet_history']:
+            stake = game_state['bet_history'][-1]['value']
+        else:
+            return None
+        card = planned_card(content, game_state['my_cards'])
+        if card is None:
+            return None
+        hand = frozenset(tuple(c) for c in game_state['my_cards'])
+        return card, hand, stake, (game_state['my_score'], game_state['opponent_score'])
+
+    def _planned_play(self, game_state):
+        """The planned card if the betting ended the way the plan assumed, else None"""
+        plan, self._plan = self._plan, None
+        if plan is None:
+            return None
+        card, hand, stake, scores = plan
+        if (hand != frozenset(tuple(c) for c in game_state['my_cards']) or stake != game_state['current_bet']
+                or scores != (game_state['my_score'], game_state['opponent_score'])):
+            return None
+        self._plan_used = True
+        return {'action': 'play', 'card': list(card)}
+
+    def decision_stats(self):
+        """Summarize the requests behind the last decision and start a new one"""
+        attempts, self._attempts = self._attempts, []
+        planned, self._plan_used = self._plan_used, False
+        return {
+            'planned': planned,  # Card taken from a combined bet-and-play answer, no request made
+            'retries': max(len(attempts) - 1, 0),
+            'latency': sum(a['latency'] for a in attempts),
+            'cost': sum(a['cost'] for a in attempts),
+            'cached': bool(attempts) and attempts[-1]['cached'],
+            'prompt_tokens': sum(a['tokens'][0] for a in attempts),
+            'completion_tokens': sum(a['tokens'][1] for a in attempts),
+            'reasoning_tokens': sum(a['tokens'][2] for a in attempts),
+            'cached_prompt_tokens': sum(a['tokens'][3] for a in attempts),
+            # 'strict', 'tolerant', 'rescued' or 'fallback' for the accepted answer (see action_parser)
+            'parse': attempts[-1].get('parse') if attempts else None,
+            'parse_failures': sum(a.get('parse') == 'failed' for a in attempts),
+            'cost_errors': sum(a.get('cost_error', False) for a in attempts),
+            'ttfb': attempts[-1].get('ttfb') if attempts else None,
+        }
+
+    @retry_llm_errors
+    def decide_bet(self, game_state):
+        """Decide whether to make/respond to a bet"""
+        messages = self._bet_messages(game_state)
+        start = time.perf_counter()
+        try:
+            response, cached, ttfb = self._completion(messages, 'bet')
+        except Exception as e:
+            raise self._request_error('decide_bet', e, game_state, time.perf_counter() - start)
+        return self._process_response('bet', messages, response, cached, game_state, time.perf_counter() - start, ttfb)
+
+    @retry_llm_errors
+    def decide_play(self, game_state):
+        """Decide which card to play"""
+        planned = self._planned_play(game_state)
+        if planned is not None:
+            return planned
+        messages = self._play_messages(game_state)
+        start = time.perf_counter()
+        try:
+            response, cached, ttfb = self._completion(messages, 'play')
+        except Exception as e:
+            raise self._request_error('decide_play', e, game_state, time.perf_counter() - start)
+        return self._process_response('play', messages, response, cached, game_state, time.perf_counter() - start, ttfb)
+
+    @retry_llm_errors
+    async def adecide_bet(self, game_state):
+        """Async decide_bet for the asyncio tournament runner"""
+        messages = self._bet_messages(game_state)
+        start = time.perf_counter()
+        try:
+            response, cached, ttfb = await self._acompletion(messages, 'bet')
+        except Exception as e:
+            raise self._request_error('decide_bet', e, game_state, time.perf_counter() - start)
+        return self._process_response('bet', messages, response, cached, game_state, time.perf_counter() - start, ttfb)
+
+    @retry_llm_errors
+    async def adecide_play(self, game_state):
+        """Async decide_play for the asyncio tournament runner"""
+        planned = self._planned_play(game_state)
+        if planned is not None:
+            return planned
+        messages = self._play_messages(game_state)
+        start = time.perf_counter()
+        try:
+            response, cached, ttfb = await self._acompletion(messages, 'play')
+        except Exception as e:
+            raise self._request_error('decide_play', e, game_state, time.perf_counter() - start)
+        return self._process_response('play', messages, response, cached, game_state, time.perf_counter() - start, ttfb)
+
+class ResumingPlayer:
+    """Answers with the decisions a checkpoint logged for its seat, then hands over to the live player"""
+
+    def __init__(self, player, decisions):
+        self.player = player
+        self.decisions = list(decisions)
+        self._replayed = False
+
+    def __getattr__(self, name):
+        return getattr(self.player, name)
+
+    def _logged(self, action_type):
+        self._replayed = bool(self.decisions)
+        if not self._replayed:
+            return None
+        logged_type, action = self.decisions.pop(0)
+        if logged_type != action_type:
+            raise CheckpointMismatch(f"Player {self.player.name} logged a {logged_type} decision, "
+                                     f"resumed match asked for {action_type}")
+        return action
+
+    def decision_stats(self):
+        """None for replayed decisions, which made no request"""
+        return None if self._replayed else self.player.decision_stats()
+
+    def decide_bet(self, game_state):
+        action = self._logged('bet')
+        return action if action is not None else self.player.decide_bet(game_state)
+
+    def decide_play(self, game_state):
+        action = self._logged('play')
+        return action if action is not None else self.player.decide_play(game_state)
+
+    async def adecide_bet(self, game_state):
+        action = self._logged('bet')
+        return action if action is not None else await self.player.adecide_bet(game_state)
+
+    async def adecide_play(self, game_state):
+        action = self._logged('play')
+        return action if action is not None else await self.player.adecide_play(game_state)
+
+def _betting_steps(engine):
+    """Run the betting phase, yielding one (player_idx, 'bet', state) request per decision"""
+    steps = engine.betting_phase_steps()
+    player_idx = next(steps)
+    while True:
+        state = format_game_state(engine, engine.player_hands[player_idx], player_idx)
+        action = yield (player_idx, 'bet', state)
+        try:
+            player_idx = steps.send(action)
+        except StopIteration as stop:
+            return stop.value
+
+def match_steps(engine, event_logger):
+    """Play hands on engine until the match ends, returns False if a player forfeited.
+
+    This is a generator: it yields (player_idx, action_type, state) for every
+    decision and expects the player's action to be sent back, or the player's
+    exception to be thrown in. run_match and arun_match drive it with sync or
+    async players, so the rules of the match loop live in one place.
+    """
     while not engine.game_finished:
         engine.new_hand()
         
@@ -434,13 +770,8 @@ def play_match(model_A='openai/gpt-4o-mini', model_B='openai/gpt-4o-mini'):
                 break
             
             
-            def get_bet_action(player_idx):
-                player = player_a if player_idx == 0 else player_b
-                state = format_game_state(engine, engine.player_hands[player_idx], player_idx)
-                return player.decide_bet(state)
-    
             try:
-                bet_results = engine.run_betting_phase(get_bet_action)
+                bet_results = yield from _betting_steps(engine)
                 for (p_idx, action) in bet_results:
                     player_name = 'A' if p_idx == 0 else 'B'
                     event_logger.log_betting_action(
@@ -456,7 +787,7 @@ def play_match(model_A='openai/gpt-4o-mini', model_B='openai/gpt-4o-mini'):
                     print("LLM parsing error from Player B. Awarding win to Player A.")
                     engine.scores[0] = 12
                 engine.game_finished = True
-                return
+                return False
     
             if engine.skip_round:
                 # A mão foi encerrada por um "run": a aposta não foi aceita,
@@ -479,13 +810,13 @@ def play_match(model_A='openai/gpt-4o-mini', model_B='openai/gpt-4o-mini'):
             else:
                 try:
                     state_a = format_game_state(engine, engine.player_hands[0], 0)
-                    play_a = player_a.decide_play(state_a)
+                    play_a = yield (0, 'play', state_a)
                     card_a = tuple(play_a['card'])
                 except LLMResponseError as e:
                     print(f"Error from Player A after 3 attempts: {e}. Awarding win to Player B.")
                     engine.scores[1] = 12
                     engine.game_finished = True
-                    return
+                    return False
                 #print(f"Player A plays: {card_a}")
                 engine.play_card(0, card_a)
             event_logger.log_card_play('A', card_a)
@@ -497,13 +828,13 @@ def play_match(model_A='openai/gpt-4o-mini', model_B='openai/gpt-4o-mini'):
             else:
                 try:
                     state_b = format_game_state(engine, engine.player_hands[1], 1)
-                    play_b = player_b.decide_play(state_b)
+                    play_b = yield (1, 'play', state_b)
                     card_b = tuple(play_b['card'])
                 except LLMResponseError as e:
                     print(f"Error from Player B after 3 attempts: {e}. Awarding win to Player A.")
                     engine.scores[0] = 12
                     engine.game_finished = True
-                    return
+                    return False
                 #print(f"Player B plays: {card_b}")
                 engine.play_card(1, card_b)
             event_logger.log_card_play('B', card_b)
@@ -533,10 +864,147 @@ def play_match(model_A='openai/gpt-4o-mini', model_B='openai/gpt-4o-mini'):
                 if engine.game_finished:
                     break
                 break
+
+    return True
+
+def _log_decision(trace_logger, player, action_type, action, state, wall_time):
+    stats = player.decision_stats() if hasattr(player, 'decision_stats') else None
+    if stats is not None:
+        stats['wall_time'] = wall_time
+        get_metrics().record(player.model, action_type, wall_time, stats)
+    if trace_logger:
+        trace_logger.log_decision(player.name, action_type, action, state, stats)
+
+def _log_failed_decision(player, action_type, wall_time):
+    stats = player.decision_stats() if hasattr(player, 'decision_stats') else None
+    if stats is not None:
+        get_metrics().record(player.model, action_type, wall_time, stats, failed=True)
+
+def run_match(engine, player_a, player_b, event_logger, trace_logger=None):
+    """Play a match with players exposing decide_bet/decide_play, returns False on forfeit.
+
+    The same loop drives LLM players, reference bots and replays of logged decisions.
+    """
+    players = (player_a, player_b)
+    steps = match_steps(engine, event_logger)
+    try:
+        request = next(steps)
+        while True:
+            player_idx, action_type, state = request
+            player = players[player_idx]
+            start = time.perf_counter()
+            try:
+                if action_type == 'bet':
+                    action = player.decide_bet(state)
+                else:
+                    action = player.decide_play(state)
+            except Exception as e:
+                _log_failed_decision(player, action_type, time.perf_counter() - start)
+                request = steps.throw(e)
+                continue
+            _log_decision(trace_logger, player, action_type, action, state, time.perf_counter() - start)
+            request = steps.send(action)
+    except StopIteration as stop:
+        return stop.value
+
+async def arun_match(engine, player_a, player_b, event_logger, trace_logger=None):
+    """run_match for players exposing adecide_bet/adecide_play"""
+    players = (player_a, player_b)
+    steps = match_steps(engine, event_logger)
+    try:
+        request = next(steps)
+        while True:
+            player_idx, action_type, state = request
+            player = players[player_idx]
+            start = time.perf_counter()
+            try:
+                if action_type == 'bet':
+                    action = await player.adecide_bet(state)
+                else:
+                    action = await player.adecide_play(state)
+            except Exception as e:
+                _log_failed_decision(player, action_type, time.perf_counter() - start)
+                request = steps.throw(e)
+                continue
+            _log_decision(trace_logger, player, action_type, action, state, time.perf_counter() - start)
+            request = steps.send(action)
+    except StopIteration as stop:
+        return stop.value
+
+def _make_player(name, model, engine, seed, trace_logger, cache, limiter, player_options):
+    """TrucoPlayer for an LLM model, or an MCTSPlayer for 'mcts-<iterations>' (e.g. 'mcts-4000').
+
+    The MCTS player searches without a time budget, seeded from the match
+    seed, so its games replay exactly, and in the match's own process so that
+    concurrent matches do not each start a worker pool.
+    """
+    prefix, _, iterations = model.partition('-')
+    if prefix == 'mcts' and iterations.isdigit():
+        return MCTSPlayer(name, engine, 0 if name == 'A' else 1, iterations=int(iterations), time_budget=None,
+                          workers=1, seed=seed)
+    return TrucoPlayer(name, model=model, trace_logger=trace_logger, cache=cache, limiter=limiter, **player_options)
+
+def _start_match(model_A, model_B, seed, cache=None, limiter=None, resume=None, duplicate_id=None, job_id=None,
+                 **player_options):
+    """Create the engine, players and loggers for a new match, or for one resumed from a MatchCheckpoint"""
+    if resume is not None:
+        model_A, model_B, seed, duplicate_id = resume.model_a, resume.model_b, resume.seed, resume.duplicate_id
+        player_options = resume.player_options
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(64)
+    engine = TrucoEngine(seed=seed)
     
+    # Generate unique match ID
+    match_id = generate_match_id()
+    
+    # Initialize loggers
+    if resume is not None:
+        resumed_from, resume.match_id, resume.engine = resume.match_id, match_id, engine
+        checkpoint = resume
+    else:
+        resumed_from = None
+        checkpoint = MatchCheckpoint(match_id, model_A, model_B, seed, engine=engine, player_options=player_options,
+                                     duplicate_id=duplicate_id, job_id=job_id)
+    trace_logger = MatchTraceLogger(model_A, model_B, match_id, checkpoint=checkpoint)
+    trace_logger.log_match_start(seed, resumed_from, duplicate_id)
+    
+    # Create players with different strategies
+    player_a = _make_player("A", model_A, engine, seed, trace_logger, cache, limiter, player_options)
+    player_b = _make_player("B", model_B, engine, seed, trace_logger, cache, limiter, player_options)
+    if resume is not None:
+        # Fast-forward through the logged decisions without new requests
+        player_a = ResumingPlayer(player_a, resume.decisions_for("A"))
+        player_b = ResumingPlayer(player_b, resume.decisions_for("B"))
+        print(f"\nResuming match {resumed_from} after {len(resume.decisions)} decisions")
+
+    # Initialize event logger
+    event_logger = EventLogRecorder(MatchEventLogger(player_a.model, player_b.model, match_id))
+
+    print(f"\n=== Game Started! ===\nTeam {player_a.model} vs Team {player_b.model}")
+    return engine, player_a, player_b, event_logger, trace_logger
+
+class MatchResult(tuple):
+    """(model_A, model_B, winner) of a finished match, with its final scores as .scores"""
+
+    def __new__(cls, model_a, model_b, winner, scores):
+        result = super().__new__(cls, (model_a, model_b, winner))
+        result.scores = scores
+        return result
+
+    def __getnewargs__(self):
+        return (*self, self.scores)
+
+def _finish_match(engine, player_a, player_b, event_logger, trace_logger):
+    """Log the result of a completed match and save its human readable history and event log.
+
+    Returns a MatchResult, (model_A, model_B, winner) for rating updates.
+    """
     print(f"\n=== Game Complete! ===\nTeam {player_a.model} score: {engine.scores[0]} - Team {player_b.model} score: {engine.scores[1]}\nWinner: Team {'A' if engine.scores[0] >= 12 else 'B'}")
+    for player in (player_a, player_b):
+        print(f"Prompt tokens {player.model}: {player.prompt_tokens} ({player.cached_prompt_tokens} cached)")
     
     # Log match end
+    trace_logger.log_match_end({'A': engine.scores[0], 'B': engine.scores[1]})
     event_logger.log_match_end(
         final_scores={'A': engine.scores[0], 'B': engine.scores[1]},
         winner='A' if engine.scores[0] >= 12 else 'B',
@@ -551,17 +1019,114 @@ def play_match(model_A='openai/gpt-4o-mini', model_B='openai/gpt-4o-mini'):
     readable_file = match_history_dir / f"match_{event_logger.match_id}.txt"
     with open(readable_file, "w", encoding="utf-8") as f:
         f.write(readable_output)
+    event_logger.save(match_history_dir)
+
+    return MatchResult(player_a.model, player_b.model, 'A' if engine.scores[0] >= 12 else 'B',
+                       {'A': engine.scores[0], 'B': engine.scores[1]})
 
-def get_model_pair(available_models, weights):
-    """Select two different models using weighted random sampling"""
-    first = random.choices(available_models, weights=weights, k=1)[0]
-    remaining_models = [m for m in available_models if m != first]
-    remaining_weights = [w for m, w in zip(available_models, weights) if m != first]
-    second = random.choices(remaining_models, weights=remaining_weights, k=1)[0]
-    return (first, second)
+def play_match(model_A='openai/gpt-4o-mini', model_B='openai/gpt-4o-mini', seed=None, cache=None, resume=None,
+               duplicate_id=None, job_id=None, **player_options):
+    """Play a single match between two LLM players, or an LLM and the 'mcts-<iterations>' bot.
 
+    The deals are drawn from a per-match RNG seeded with `seed` (a fresh random
+    seed if None), which is recorded in the trace header for replay. Passing a
+    CompletionCache lets reruns reuse earlier responses. player_options go to
+    both TrucoPlayers: session=True keeps one multi-turn conversation per hand
+    (see HandSession), structured=True requests JSON actions through
+    response_format and combined=True asks for the round's card along with each
+    betting action, skipping the play request when the bet stands. Returns (model_A, model_B, winner), or None if a player
+    forfeited.
+
+    The match is checkpointed after every decision and the checkpoint removed
+    once it ends; resume=MatchCheckpoint continues an interrupted match from its
+    last decision, with the models, seed and options it was started with.
+    duplicate_id marks the match as one half of a duplicate pair in the trace
+    (see play_duplicate_match), and job_id records the job queue job in the
+    checkpoint, so a retried job resumes its own match.
+    """
+    match = _start_match(model_A, model_B, seed, cache, resume=resume, duplicate_id=duplicate_id, job_id=job_id,
+                         **player_options)
+    try:
+        result = _finish_match(*match) if run_match(*match) else None
+    finally:
+        match[4].close()
+    # Only once the trace holds the whole match; until then the checkpoint can still resume it
+    match[4].checkpoint.remove()
+    return result
+
+async def aplay_match(model_A='openai/gpt-4o-mini', model_B='openai/gpt-4o-mini', seed=None, cache=None, limiter=None,
+                      resume=None, duplicate_id=None, **player_options):
+    """play_match on the event loop, with requests gated by an optional ProviderLimiter"""
+    match = _start_match(model_A, model_B, seed, cache, limiter, resume, duplicate_id, **player_options)
+    try:
+        result = _finish_match(*match) if await arun_match(*match) else None
+    finally:
+        await asyncio.to_thread(match[4].close)
+    match[4].checkpoint.remove()
+    return result
+
+def play_duplicate_match(model_X, model_Y, seed=None, cache=None, **player_options):
+    """Play the same deals twice, model_X in seat A and then in seat B, and score the pair.
+
+    Both matches share one seed, so hand by hand the same cards go to the same
+    seats. Returns duplicate.duplicate_result's (model_X, model_Y, winner),
+    with winner None when the point margins tie, or None if a match was forfeited.
+    """
+    seed = random.SystemRandom().getrandbits(64) if seed is None else seed
+    duplicate_id = new_duplicate_id()
+    first = play_match(model_X, model_Y, seed, cache, duplicate_id=duplicate_id, **player_options)
+    second = play_match(model_Y, model_X, seed, cache, duplicate_id=duplicate_id, **player_options) if first else None
+    if not second:
+        return None
+    return duplicate_result((*first[:2], first.scores), (*second[:2], second.scores))
+
+async def aplay_duplicate_match(model_X, model_Y, seed=None, cache=None, limiter=None, **player_options):
+    """play_duplicate_match on the event loop, with both matches of the pair played concurrently"""
+    seed = random.SystemRandom().getrandbits(64) if seed is None else seed
+    duplicate_id = new_duplicate_id()
+    first, second = await asyncio.gather(
+        aplay_match(model_X, model_Y, seed, cache, limiter, duplicate_id=duplicate_id, **player_options),
+        aplay_match(model_Y, model_X, seed, cache, limiter, duplicate_id=duplicate_id, **player_options),
+        return_exceptions=True,  # Let the other match finish before a failure propagates
+    )
+    for half in (first, second):
+        if isinstance(half, BaseException):
+            raise half
+    if not first or not second:
+        return None
+    return duplicate_result((*first[:2], first.scores), (*second[:2], second.scores))
+
+def player_options_from_env():
+    """TrucoPlayer options for the runners: TRUCO_SESSION_PROMPTS=1 for one
+    conversation per hand, TRUCO_STRUCTURED_OUTPUT=1 for JSON-schema answers,
+    TRUCO_COMBINED_DECISIONS=1 for bet-and-play answers, TRUCO_STREAM=1 to
+    stream responses and measure time to first byte"""
+    return {
+        'session': os.environ.get("TRUCO_SESSION_PROMPTS") == "1",
+        'structured': os.environ.get("TRUCO_STRUCTURED_OUTPUT") == "1",
+        'combined': os.environ.get("TRUCO_COMBINED_DECISIONS") == "1",
+        'stream': os.environ.get("TRUCO_STREAM") == "1",
+    }
+
+# Lista de modelos disponíveis (deve ter pelo menos 2)
+AVAILABLE_MODELS = [
+    'gemini/gemini-2.0-flash-lite-preview-02-05',
+    'gemini/gemini-2.0-flash',
+    'gemini/gemini-1.5-pro',
+    'openrouter/openai/gpt-4o-mini',
+    'openrouter/openai/gpt-4o',
+    'openrouter/openai/o3-mini',
+    'openrouter/deepseek/deepseek-chat',
+    'openrouter/deepseek/deepseek-r1',
+    'openrouter/anthropic/claude-3.5-sonnet',
+    'openrouter/anthropic/claude-3.5-haiku',
+    'openrouter/qwen/qwen-max',
+    'openrouter/qwen/qwen-turbo',
+    'openrouter/qwen/qwen-plus'
+]
 
 def get_openrouter_credits():
+    import requests
     # curl https://openrouter.ai/api/v1/credits \-H "Authorization: Bearer <token>"
     response = requests.get(
         "https://openrouter.ai/api/v1/credits",
@@ -573,67 +1138,50 @@ def get_openrouter_credits():
     return round(data['data']['total_credits'] - data['data']['total_usage'])
 
 if __name__ == '__main__':
+    from bradley_terry import load_match_results
+    from rating_service import RatingService
+    from budget_controller import BudgetController
     #print(get_openrouter_credits())
     #import time
     #time.sleep(1000)
     NUM_MATCHES = 16  # Set the number of matches to run in parallel
-    # Load previous match counts
-    try:
-        with open('model_matches.json', 'r') as f:
-            model_matches = json.load(f)
-    except FileNotFoundError:
-        model_matches = {}
-
-    # Lista de modelos disponíveis (deve ter pelo menos 2)
-    available_models = [
-        'gemini/gemini-2.0-flash-lite-preview-02-05',
-        'gemini/gemini-2.0-flash',
-        'gemini/gemini-1.5-pro',
-        'openrouter/openai/gpt-4o-mini',
-        'openrouter/openai/gpt-4o',
-        'openrouter/openai/o3-mini',
-        'openrouter/deepseek/deepseek-chat',
-        'openrouter/deepseek/deepseek-r1',
-        'openrouter/anthropic/claude-3.5-sonnet',
-        'openrouter/anthropic/claude-3.5-haiku',
-        'openrouter/qwen/qwen-max',
-        'openrouter/qwen/qwen-turbo',
-        'openrouter/qwen/qwen-plus'
-    ]
-
-    # Calculate total matches across all models
-    total_matches = sum(model_matches.get(model.split('/')[-1], 0) for model in available_models)
-    
-    # Calculate UCB weights for each model
-    active_models = []
-    weights = []
-    for model in available_models:
-        matches = model_matches.get(model.split('/')[-1], 0)
-        if matches < 30:  # Still keep the max matches limit
-            active_models.append(model)
-            # UCB formula: sqrt(ln(total_matches)/(matches + 1))
-            # Add 1 to matches to handle 0 matches case
-            weight = math.sqrt(math.log(total_matches + 1)/(matches + 1))
-            weights.append(weight)
-    
-    if len(active_models) < 2:
-        print("Not enough active models to play matches (need at least 2)")
-        sys.exit(1)
-        
-    print('Active models and weights:', {model: weight for model, weight in zip(active_models, weights)})
+    # --resume finishes the matches an earlier run left in checkpoints/ instead of starting new ones
+    resume = '--resume' in sys.argv
+    ratings = RatingService(load_match_results())
+    # Pairings for the leaderboard neighbours whose order is still contested (see BudgetController)
+    controller = BudgetController(ratings, AVAILABLE_MODELS)
+    controller.print_status()
+    pairs = controller.select_pairs(NUM_MATCHES)
+    if not pairs and not resume:
+        print("Every neighbour pair on the leaderboard is settled, no match left worth playing")
+        sys.exit(0)
+
+    # Opt-in completion cache, e.g. TRUCO_COMPLETION_CACHE=completion_cache.sqlite
+    cache_path = os.environ.get("TRUCO_COMPLETION_CACHE")
+    cache = CompletionCache(cache_path) if cache_path else None
+    player_options = player_options_from_env()
     executor = ThreadPoolExecutor(max_workers=min(get_openrouter_credits(), 8))
     try:
-        futures = [
-            executor.submit(
-                play_match,
-                model_A=models[0],
-                model_B=models[1],
-            )
-            for _ in range(NUM_MATCHES)
-            for models in [get_model_pair(active_models, weights)]
-        ]
+        if resume:
+            futures = [executor.submit(play_match, cache=cache, resume=checkpoint)
+                       for checkpoint in unfinished_checkpoints()]
+            print(f"Resuming {len(futures)} unfinished matches")
+        else:
+            futures = [
+                executor.submit(
+                    play_match,
+                    model_A=models[0],
+                    model_B=models[1],
+                    cache=cache,
+                    **player_options,
+                )
+                for models in pairs
+            ]
         for future in as_completed(futures):
-            future.result()
+            result = future.result()
+            if result:
+                ratings.add_result(*result)
+                ratings.write_leaderboard()
     except KeyboardInterrupt:
         print("\nKeyboardInterrupt received: canceling pending matches and shutting down...")
         for future in futures:
@@ -641,3 +1189,6 @@ if __name__ == '__main__':
         sys.exit(0)
     finally:
         executor.shutdown(wait=False)
+        if cache:
+            print('Completion cache:', cache.stats())
+        get_metrics().write()
@@ -0,0 +1,305 @@
+import asyncio
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from engine import TrucoEngine, CARDS
+
+NEXT_BET = {None: 'truco', 'truco': 'six', 'six': 'nine', 'nine': 'twelve', 'twelve': None}
+MATCH_POINTS = 12
+MAX_UTILITY = 2 * MATCH_POINTS  # Largest possible swing, used to scale rewards to [-1, 1]
+
+
+class HandState:
+    """Drives the rest of a hand on an engine in the same order as play_match.
+
+    Each round runs a betting phase (player A acts first), then A plays, then B
+    plays. A player left with a single card plays it automatically.
+
+    Once the hand is won the engine still holds its leftover cards, so a hand
+    that finished can only be told apart by `finished`; pass it on when
+    rebuilding a state from the same engine.
+    """
+
+    def __init__(self, engine, betting_done, finished=False):
+        self.engine = engine
+        self.betting_done = betting_done
+        self.finished = finished or engine.game_finished or engine.skip_round
+
+    def decision(self):
+        """Return (player_idx, legal actions) for the next choice, or None when the hand is over"""
+        engine = self.engine
+        while not self.finished:
+            if not self.betting_done:
+                return engine.current_betting_player, self._legal_bet_actions()
+
+            player_idx = len(self._table_cards())
+            hand = engine.player_hands[player_idx]
+            if len(hand) > 1:
+                return player_idx, [('play', card) for card in hand]
+            self.apply(('play', hand[0]))
+        return None
+
+    def apply(self, action):
+        """Apply an action key returned by decision(), returns whether the hand is over"""
+        engine = self.engine
+        if not self.betting_done:
+            engine.handle_player_bet_action(action_to_dict(action), engine.current_betting_player)
+            if engine.betting_complete:
+                self.betting_done = True
+                self.finished = engine.skip_round or engine.game_finished
+            return self.finished
+
+        player_idx = len(self._table_cards())
+        engine.play_card(player_idx, action[1])
+        if player_idx == 1:
+            engine.resolve_round([card for _, card in self._table_cards()])
+            hand_winner = engine.check_hand_winner()
+            if hand_winner is not None:
+                engine.award_hand_points(hand_winner)
+                self.finished = True
+            else:
+                engine.start_betting_phase()
+                self.betting_done = False
+                self.finished = engine.game_finished
+        return self.finished
+
+    def _table_cards(self):
+        """Cards played in the current, unresolved round"""
+        return self.engine.played_cards[2 * len(self.engine.round_winners):]
+
+    def _legal_bet_actions(self):
+        engine = self.engine
+        next_bet = NEXT_BET[engine.bet_stack[-1]['type'] if engine.bet_stack else None]
+        actions = [('accept',), ('run',)] if engine.pending_bet_response else [('pass',)]
+        if next_bet:
+            actions.append(('bet', next_bet))
+        return actions
+
+
+def action_to_dict(action):
+    """Convert an action key into the dict format used by TrucoPlayer"""
+    if action[0] == 'bet':
+        return {'action': 'bet', 'bet_type': action[1]}
+    if action[0] == 'play':
+        return {'action': 'play', 'card': list(action[1])}
+    return {'action': action[0]}
+
+
+def utility(scores_before, scores_after, player_idx):
+    """Hand outcome for player_idx, scaled to [-1, 1].
+
+    Points past 12 are worthless and reaching 12 is worth a full match on top,
+    so running at 10x9 is not mistaken for a cheap loss.
+    """
+    gains = []
+    for team in (0, 1):
+        gain = min(scores_after[team], MATCH_POINTS) - scores_before[team]
+        if scores_after[team] >= MATCH_POINTS:
+            gain += MATCH_POINTS
+        gains.append(gain)
+    return (gains[player_idx] - gains[1 - player_idx]) / MAX_UTILITY
+
+
+class Node:
+    __slots__ = ('children', 'visits', 'value_sum', 'availability')
+
+    def __init__(self):
+        self.children = {}
+        self.visits = 0
+        self.value_sum = 0.0  # From the root player's perspective
+        self.availability = 0
+
+
+def _determinize(engine, player_idx, rng):
+    """Replace the opponent's hidden cards with a sample of the unseen cards"""
+    opponent = 1 - player_idx
+    seen = set(engine.dealt_hands[player_idx])
+    seen.add(engine.vira)
+    seen.update(card for _, card in engine.played_cards)
+    unseen = [card for card in CARDS if card not in seen]
+    hidden = rng.sample(unseen, len(engine.player_hands[opponent]))
+    engine.player_hands = {player_idx: engine.player_hands[player_idx], opponent: hidden}
+
+
+def _rollout(state, rng):
+    """Finish the hand accepting every bet and playing random cards"""
+    while True:
+        decision = state.decision()
+        if decision is None:
+            return
+        _, legal = decision
+        if legal[0][0] == 'play':
+            state.apply(rng.choice(legal))
+        else:
+            state.apply(legal[0])  # 'pass' or 'accept'
+
+
+def search(root_state, player_idx, betting_done, iterations, time_budget=None, seed=None, exploration=0.7):
+    """Run single-observer information-set MCTS, returns {action: (visits, value_sum)} at the root"""
+    rng = random.Random(seed)
+    deadline = time.monotonic() + time_budget if time_budget else None
+    engine = TrucoEngine()
+    root = Node()
+    scores_before = root_state.scores
+
+    for iteration in range(iterations):
+        if deadline and iteration % 16 == 0 and time.monotonic() > deadline:
+            break
+
+        engine.restore(root_state)
+        _determinize(engine, player_idx, rng)
+        state = HandState(engine, betting_done)
+        node = root
+        path = [root]
+
+        # Selection and expansion over the actions legal in this determinization
+        decision = state.decision()
+        while decision is not None:
+            actor, legal = decision
+            unvisited = []
+            for action in legal:
+                child = node.children.get(action)
+                if child is None:
+                    child = node.children[action] = Node()
+                child.availability += 1
+                if child.visits == 0:
+                    unvisited.append(action)
+
+            if unvisited:
+                action = rng.choice(unvisited)
+            else:
+                sign = 1 if actor == player_idx else -1
+                action = max(legal, key=lambda a: sign * node.children[a].value_sum / node.children[a].visits
+                             + exploration * math.sqrt(math.log(node.children[a].availability) / node.children[a].visits))
+
+            state.apply(action)
+            node = node.children[action]
+            path.append(node)
+            if unvisited:
+                break
+            decision = state.decision()
+
+        _rollout(state, rng)
+        reward = utility(scores_before, engine.scores, player_idx)
+        for visited in path:
+            visited.visits += 1
+            visited.value_sum += reward
+
+    return {action: (child.visits, child.value_sum) for action, child in root.children.items()}
+
+
+class MCTSPlayer:
+    """Non-LLM reference player using determinized MCTS over the opponent's hidden cards.
+
+    Implements the same decide_bet/decide_play interface as TrucoPlayer. The
+    player reads public information from the engine it is seated at; the
+    game_state argument is accepted for compatibility only.
+
+    Each decision spreads `iterations` across `workers` processes and stops
+    early once `time_budget` seconds have passed. With time_budget=None the
+    search is fully determined by `seed`, which makes the bot a fixed anchor.
+    """
+
+    def __init__(self, name, engine, player_idx, iterations=4000, time_budget=1.0, workers=None, seed=0):
+        self.name = name
+        self.model = f"mcts-{iterations}"
+        self.engine = engine
+        self.player_idx = player_idx
+        self.iterations = iterations
+        self.time_budget = time_budget
+        self.workers = workers or os.cpu_count() or 1
+        self.seed = seed
+        self.total_cost = 0.0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.decisions = 0
+        self._executor = None
+
+    def decide_bet(self, game_state=None):
+        """Decide whether to make/respond to a bet"""
+        return action_to_dict(self._best_action(betting_done=False))
+
+    def decide_play(self, game_state=None):
+        """Decide which card to play"""
+        return action_to_dict(self._best_action(betting_done=True))
+
+    async def adecide_bet(self, game_state=None):
+        """decide_bet off the event loop, for the asyncio tournament runner"""
+        return await asyncio.to_thread(self.decide_bet, game_state)
+
+    async def adecide_play(self, game_state=None):
+        """decide_play off the event loop, for the asyncio tournament runner"""
+        return await asyncio.to_thread(self.decide_play, game_state)
+
+    def decision_stats(self):
+        """No requests are made, so there is nothing to account for"""
+        return None
+
+    def _best_action(self, betting_done):
+        root_state = self.engine.snapshot()
+        self.decisions += 1
+        per_worker = max(1, self.iterations // self.workers)
+        seeds = [hash((self.seed, self.player_idx, self.decisions, worker)) for worker in range(self.workers)]
+
+        if self.workers == 1:
+            results = [search(root_state, self.player_idx, betting_done, per_worker, self.time_budget, seeds[0])]
+        else:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            futures = [
+                self._executor.submit(search, root_state, self.player_idx, betting_done,
+                                      per_worker, self.time_budget, seed)
+                for seed in seeds
+            ]
+            results = [future.result() for future in futures]
+
+        totals = {}
+        for result in results:
+            for action, (visits, value_sum) in result.items():
+                prev_visits, prev_value = totals.get(action, (0, 0.0))
+                totals[action] = (prev_visits + visits, prev_value + value_sum)
+        # Most visited action, ties broken by value, then by a stable key order
+        return max(sorted(totals), key=lambda a: (totals[a][0], totals[a][1]))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+if __name__ == '__main__':
+    # MCTS (A) against a player that accepts every bet and plays random cards (B)
+    engine = TrucoEngine()
+    bot = MCTSPlayer("A", engine, 0, iterations=2000, time_budget=None, workers=4)
+    rng = random.Random(0)
+    random.seed(0)
+    points = [0, 0]
+    num_hands = 50
+    start = time.perf_counter()
+
+    for _ in range(num_hands):
+        engine.scores = [0, 0]
+        engine.game_finished = False
+        engine.new_hand()
+        engine.start_betting_phase()
+        state = HandState(engine, betting_done=False)
+        decision = state.decision()
+        while decision is not None:
+            player_idx, legal = decision
+            if player_idx == 0:
+                action = bot._best_action(state.betting_done)
+            elif legal[0][0] == 'play':
+                action = rng.choice(legal)
+            else:
+                action = legal[0]
+            state.apply(action)
+            decision = state.decision()
+        points[0] += engine.scores[0]
+        points[1] += engine.scores[1]
+
+    bot.close()
+    elapsed = time.perf_counter() - start
+    print(f"Points over {num_hands} hands: MCTS {points[0]} x {points[1]} random")
+    print(f"{bot.decisions} decisions, {elapsed / bot.decisions * 1000:.1f}ms per decision")
@@ -0,0 +1,134 @@
+import json
+import math
+import threading
+from trace_store import atomic_write
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Per-decision samples kept for percentiles: field name -> Prometheus metric
+TIMINGS = {
+    'wall_time': ('truco_decision_seconds', "Wall time per decision, retries and backoff included"),
+    'latency': ('truco_request_seconds', "Time spent in completion requests per decision"),
+    'ttfb': ('truco_time_to_first_byte_seconds', "Time to the first streamed chunk of the accepted request"),
+}
+COUNTERS = {
+    'decisions': ('truco_decisions_total', "Decisions made"),
+    'failed': ('truco_failed_decisions_total', "Decisions that ran out of retries"),
+    'retries': ('truco_retries_total', "Extra requests made after a failed one"),
+    'parse_failures': ('truco_parse_failures_total', "Answers the action parser could not use"),
+    'planned': ('truco_planned_plays_total', "Plays taken from a combined bet-and-play answer"),
+    'cost_errors': ('truco_cost_errors_total', "Responses whose cost litellm could not compute"),
+    'cost': ('truco_cost_dollars_total', "Completion cost in dollars"),
+    'prompt_tokens': ('truco_prompt_tokens_total', "Input tokens"),
+    'cached_prompt_tokens': ('truco_cached_prompt_tokens_total', "Input tokens served from the provider's prompt cache"),
+    'completion_tokens': ('truco_completion_tokens_total', "Output tokens"),
+    'reasoning_tokens': ('truco_reasoning_tokens_total', "Reasoning tokens, part of the output tokens"),
+}
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    return sorted_values[max(math.ceil(q * len(sorted_values)) - 1, 0)]
+
+
+class DecisionMetrics:
+    """Per (model, action_type) timings, tokens, retries and cost of LLM decisions.
+
+    Players feed it one record per decision; at the end of a run it is
+    summarized with p50/p95/p99 per timing and exported as JSON and as a
+    Prometheus text file.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timings = {}
+        self._counters = {}
+
+    def record(self, model, action_type, wall_time, stats, failed=False):
+        """Add one decision; stats is the dict from TrucoPlayer.decision_stats()"""
+        key = (model, action_type)
+        with self._lock:
+            timings = self._timings.setdefault(key, {field: [] for field in TIMINGS})
+            counters = self._counters.setdefault(key, dict.fromkeys(COUNTERS, 0))
+            timings['wall_time'].append(wall_time)
+            if not stats.get('planned'):
+                timings['latency'].append(stats.get('latency') or 0.0)
+            if stats.get('ttfb') is not None:
+                timings['ttfb'].append(stats['ttfb'])
+            counters['decisions'] += 1
+            counters['failed'] += int(failed)
+            for field in COUNTERS:
+                if field not in ('decisions', 'failed'):
+                    counters[field] += stats.get(field) or 0
+
+    def samples(self, field='wall_time'):
+        """Every recorded value of a timing field across models and action types, sorted"""
+        with self._lock:
+            return sorted(value for timings in self._timings.values() for value in timings[field])
+
+    def reset(self):
+        """Forget everything recorded so far"""
+        with self._lock:
+            self._timings = {}
+            self._counters = {}
+
+    def summary(self):
+        """Percentiles and totals per model and action type, with each one's share of time and cost"""
+        with self._lock:
+            keys = sorted(self._timings)
+            timings = {key: {field: sorted(values) for field, values in self._timings[key].items()} for key in keys}
+            counters = {key: dict(self._counters[key]) for key in keys}
+
+        total_time = sum(sum(timings[key]['wall_time']) for key in keys)
+        total_cost = sum(counters[key]['cost'] for key in keys)
+        rows = []
+        for model, action_type in keys:
+            row = {'model': model, 'action_type': action_type}
+            row.update(counters[(model, action_type)])
+            for field, values in timings[(model, action_type)].items():
+                row[field] = {f'p{int(q * 100)}': percentile(values, q) for q in QUANTILES}
+                row[field]['sum'] = sum(values)
+                row[field]['count'] = len(values)
+            row['time_share'] = row['wall_time']['sum'] / total_time if total_time else 0.0
+            row['cost_share'] = row['cost'] / total_cost if total_cost else 0.0
+            rows.append(row)
+        return {'total_wall_time': total_time, 'total_cost': total_cost, 'decisions': rows}
+
+    def prometheus(self):
+        """The summary in the Prometheus text exposition format"""
+        rows = self.summary()['decisions']
+        lines = []
+        for field, (name, help_text) in TIMINGS.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} summary"]
+            for row in rows:
+                labels = _labels(row)
+                for q in QUANTILES:
+                    value = row[field][f'p{int(q * 100)}']
+                    if value is not None:
+                        lines.append(f'{name}{{{labels},quantile="{q}"}} {value}')
+                lines.append(f"{name}_sum{{{labels}}} {row[field]['sum']}")
+                lines.append(f"{name}_count{{{labels}}} {row[field]['count']}")
+        for field, (name, help_text) in COUNTERS.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for row in rows:
+                lines.append(f"{name}{{{_labels(row)}}} {row[field]}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path="metrics"):
+        """Write <path>.json and <path>.prom, replacing them atomically"""
+        atomic_write(f"{path}.json", json.dumps(self.summary(), indent=2, ensure_ascii=False))
+        atomic_write(f"{path}.prom", self.prometheus())
+
+
+def _labels(row):
+    model = row['model'].replace('\\', '\\\\').replace('"', '\\"')
+    return f'model="{model}",action_type="{row["action_type"]}"'
+
+
+_default_metrics = DecisionMetrics()
+
+def get_metrics():
+    """The process-wide DecisionMetrics that the match loops record into"""
+    return _default_metrics
@@ -0,0 +1,290 @@
+import argparse
+import ast
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from mcts_player import NEXT_BET
+
+# "- Label: value" lines of the prompts built by TrucoPlayer and HandSession
+STATE_LINE = re.compile(r"^- (Suas cartas|Histórico de apostas|Aposta pendente): (.*)$", re.MULTILINE)
+MALFORMED_ANSWERS = (
+    "Vou pensar melhor sobre essa jogada.",
+    "{action: ",
+    "```python\n{'acao': 'talvez'}\n```",
+    "",
+)
+
+
+def read_state(messages):
+    """Hand, bet history and pending bet from the user messages, later messages winning"""
+    state = {'cards': [], 'history': [], 'pending': None}
+    for message in messages:
+        if message.get('role') != 'user' or not isinstance(message.get('content'), str):
+            continue
+        for label, value in STATE_LINE.findall(message['content']):
+            if label == 'Suas cartas':
+                state['cards'] = [tuple(card) for card in ast.literal_eval(value)]
+            elif label == 'Histórico de apostas':
+                state['history'] = ast.literal_eval(value)
+            else:
+                state['pending'] = None if value.strip() == 'Nenhuma' else value.strip()
+    return state
+
+
+def legal_bet_actions(state):
+    """Betting actions the engine accepts in this state"""
+    next_bet = NEXT_BET[state['history'][-1]['type'] if state['history'] else None]
+    actions = [{'action': 'accept'}, {'action': 'run'}] if state['pending'] else [{'action': 'pass'}]
+    if next_bet:
+        actions.append({'action': 'bet', 'bet_type': next_bet})
+    return actions
+
+
+def random_policy(state, action_type, rng):
+    """Uniformly random legal action"""
+    if action_type == 'play':
+        return {'action': 'play', 'card': list(rng.choice(state['cards']))}
+    return rng.choice(legal_bet_actions(state))
+
+
+def passive_policy(state, action_type, rng):
+    """Never raises, accepts every bet and plays the first card in hand"""
+    if action_type == 'play':
+        return {'action': 'play', 'card': list(state['cards'][0])}
+    return {'action': 'accept'} if state['pending'] else {'action': 'pass'}
+
+
+def aggressive_policy(state, action_type, rng):
+    """Raises whenever it can and plays a random card"""
+    if action_type == 'play':
+        return random_policy(state, action_type, rng)
+    actions = legal_bet_actions(state)
+    return actions[-1] if actions[-1]['action'] == 'bet' else actions[0]
+
+
+POLICIES = {
+    'random': random_policy,
+    'passive': passive_policy,
+    'aggressive': aggressive_policy,
+}
+
+
+class MockConfig:
+    """Behavior of the mock provider.
+
+    Latency is log-normal around `latency` seconds (latency_sigma=0 makes it
+    fixed), plus reasoning_tokens / reasoning_tokens_per_second when reasoning
+    padding is on. The rates are per request probabilities of an HTTP 500, an
+    HTTP 429 and an answer the action parser cannot use.
+    """
+
+    def __init__(self, policy='random', latency=0.5, latency_sigma=0.5, error_rate=0.0, rate_limit_rate=0.0,
+                 malformed_rate=0.0, reasoning_tokens=0, reasoning_tokens_per_second=0.0, seed=None):
+        self.policy = policy
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.reasoning_tokens = reasoning_tokens
+        self.reasoning_tokens_per_second = reasoning_tokens_per_second
+        self.seed = seed
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """OpenAI-compatible /v1/chat/completions endpoint that plays legal Truco actions.
+
+    The policy comes from the model name when it ends in a POLICIES key
+    (e.g. "openai/mock-passive"), otherwise from the config. Point litellm
+    at it with OPENAI_API_BASE=http://host:port/v1 and an "openai/" model.
+    Prompt caching is imitated by reporting every request prefix already
+    seen as cached tokens. GET /stats returns the request counts.
+    """
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, config=None):
+        super().__init__(address, MockRequestHandler)
+        self.config = config or MockConfig()
+        self.rng = random.Random(self.config.seed)
+        self.stats = {'requests': 0, 'ok': 0, 'errors': 0, 'rate_limited': 0, 'malformed': 0, 'streamed': 0}
+        self._seen_prefixes = set()
+        self._lock = threading.Lock()
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def cached_tokens(self, messages):
+        """Tokens of the longest earlier-seen message prefix, recording this request's prefixes"""
+        cached = 0
+        with self._lock:
+            for end in range(1, len(messages)):
+                digest = hashlib.sha256(json.dumps(messages[:end], sort_keys=True).encode()).hexdigest()
+                if digest in self._seen_prefixes:
+                    cached = count_tokens(messages[:end])
+                else:
+                    self._seen_prefixes.add(digest)
+        return cached
+
+    def latency(self):
+        config = self.config
+        latency = config.latency * math.exp(config.latency_sigma * self.rng.gauss(0, 1)) if config.latency else 0.0
+        if config.reasoning_tokens and config.reasoning_tokens_per_second:
+            latency += config.reasoning_tokens / config.reasoning_tokens_per_second
+        return latency
+
+
+def count_tokens(messages):
+    """Rough token count, four characters per token"""
+    return sum(len(json.dumps(message.get('content'), ensure_ascii=False)) for message in messages) // 4
+
+
+def answer(state, action_type, policy, rng, combined=False, structured=False):
+    """Answer text for an action, as a JSON object or in a python code block like the prompts ask"""
+    action = policy(state, action_type, rng)
+    if combined and action_type == 'bet' and state['cards']:
+        action['card'] = list(rng.choice(state['cards']))
+    if structured:
+        return json.dumps(dict({'bet_type': None} if action_type == 'bet' else {}, **action))
+    return f"Analisando a mão, esta é a minha decisão.\n\n```python\n{json.dumps(action, ensure_ascii=False)}\n```"
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/stats'):
+            self._send_json(200, self.server.stats)
+        else:
+            self._send_json(404, {'error': {'message': 'Not found', 'type': 'invalid_request_error'}})
+
+    def do_POST(self):
+        server = self.server
+        config = server.config
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'Not found', 'type': 'invalid_request_error'}})
+            return
+        server.count('requests')
+
+        time.sleep(server.latency())
+        roll = server.rng.random()
+        if roll < config.rate_limit_rate:
+            server.count('rate_limited')
+            self._send_json(429, {'error': {'message': 'Rate limit exceeded (mock)', 'type': 'rate_limit_error'}},
+                            {'Retry-After': '1'})
+            return
+        if roll < config.rate_limit_rate + config.error_rate:
+            server.count('errors')
+            self._send_json(500, {'error': {'message': 'Internal error (mock)', 'type': 'server_error'}})
+            return
+
+        messages = request.get('messages') or []
+        model = request.get('model', 'mock')
+        last = messages[-1].get('content') if messages else ''
+        last = last if isinstance(last, str) else ''
+        action_type = 'play' if 'Qual carta' in last else 'bet'
+        policy = POLICIES.get(model.rsplit('-', 1)[-1], POLICIES.get(config.policy, random_policy))
+
+        if server.rng.random() < config.malformed_rate:
+            server.count('malformed')
+            content = server.rng.choice(MALFORMED_ANSWERS)
+        else:
+            content = answer(read_state(messages), action_type, policy, server.rng,
+                             combined='"card"' in last, structured='response_format' in request)
+        prompt_tokens = count_tokens(messages)
+        usage = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': len(content) // 4 + config.reasoning_tokens,
+            'total_tokens': prompt_tokens + len(content) // 4 + config.reasoning_tokens,
+            'prompt_tokens_details': {'cached_tokens': server.cached_tokens(messages)},
+            'completion_tokens_details': {'reasoning_tokens': config.reasoning_tokens},
+        }
+        server.count('ok')
+        if request.get('stream'):
+            server.count('streamed')
+            self._stream(model, content, usage, (request.get('stream_options') or {}).get('include_usage'))
+            return
+        self._send_json(200, {
+            'id': f"chatcmpl-mock-{uuid.uuid4().hex[:12]}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': usage,
+        })
+
+    def _stream(self, model, content, usage, include_usage):
+        """Server-sent events in the OpenAI chunk format, closing the connection at the end"""
+        completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def chunk(delta, finish_reason=None, chunk_usage=None):
+            body = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model,
+                    'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}] if delta is not None else []}
+            if chunk_usage is not None:
+                body['usage'] = chunk_usage
+            self.wfile.write(f"data: {json.dumps(body)}\n\n".encode())
+
+        chunk({'role': 'assistant', 'content': ''})
+        for start in range(0, len(content), 16):
+            chunk({'content': content[start:start + 16]})
+        chunk({}, finish_reason='stop')
+        if include_usage:
+            chunk(None, chunk_usage=usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+
+
+def serve(config=None, host="127.0.0.1", port=8000, ready=None):
+    """Run the mock server until the process is stopped; sets `ready` once listening"""
+    server = MockLLMServer((host, port), config)
+    if ready is not None:
+        ready.set()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock provider that plays legal Truco actions")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='random')
+    parser.add_argument('--latency', type=float, default=0.5, help="median seconds per request")
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help="log-normal sigma, 0 for fixed latency")
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--malformed-rate', type=float, default=0.0)
+    parser.add_argument('--reasoning-tokens', type=int, default=0)
+    parser.add_argument('--reasoning-tokens-per-second', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    config = MockConfig(args.policy, args.latency, args.latency_sigma, args.error_rate, args.rate_limit_rate,
+                        args.malformed_rate, args.reasoning_tokens, args.reasoning_tokens_per_second, args.seed)
+    print(f"Mock LLM server on http://{args.host}:{args.port}/v1")
+    serve(config, args.host, args.port)
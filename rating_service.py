@@ -0,0 +1,145 @@
+import json
+import threading
+import time
+import numpy as np
+from bradley_terry import fit, load_match_results
+from trace_store import atomic_write
+
+BOOTSTRAP_SAMPLES = 2000
+CONFIDENCE = 0.95
+INTERVAL_REFRESH_SECONDS = 60  # Bootstrap at most this often when writing the leaderboard
+
+
+class RatingService:
+    """Bradley-Terry leaderboard kept up to date one match result at a time.
+
+    Each new result refits the ratings with MM iterations warm-started from the
+    previous fit, which converges in a handful of iterations instead of a full
+    refit. Confidence intervals come from a bootstrap over matches where all
+    resamples are fitted as one batch of arrays; being far more expensive than
+    the scores, they are refreshed at most every `interval_refresh` seconds.
+    """
+
+    def __init__(self, results=(), bootstrap_samples=BOOTSTRAP_SAMPLES, seed=0,
+                 interval_refresh=INTERVAL_REFRESH_SECONDS):
+        self.models = []
+        self._index = {}
+        self.wins = np.zeros((0, 0))
+        self.matches = []  # (winner_idx, loser_idx) per result, for the bootstrap
+        self.theta = np.zeros(0)
+        self.bootstrap_samples = bootstrap_samples
+        self.rng = np.random.default_rng(seed)
+        self.interval_refresh = interval_refresh
+        self._intervals = None
+        self._intervals_time = 0.0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # One leaderboard write (and bootstrap) at a time
+        self.add_results(results)
+
+    def _model_index(self, model):
+        if model not in self._index:
+            self._index[model] = len(self.models)
+            self.models.append(model)
+            self.wins = np.pad(self.wins, ((0, 1), (0, 1)))
+            self.theta = np.append(self.theta, 0.0)
+        return self._index[model]
+
+    def _record(self, model_a, model_b, winner):
+        i, j = self._model_index(model_a), self._model_index(model_b)
+        if winner == 'B':
+            i, j = j, i
+        self.wins[i, j] += 1
+        self.matches.append((i, j))
+
+    def add_result(self, model_a, model_b, winner):
+        """Add one match result ('A' or 'B' won) and refit, returns the MM iterations used"""
+        with self._lock:
+            self._record(model_a, model_b, winner)
+            self.theta, iterations = fit(self.wins, theta0=self.theta)
+        return iterations
+
+    def add_results(self, results):
+        """Add many results with a single refit"""
+        with self._lock:
+            for result in results:
+                self._record(*result)
+            if self.models:
+                self.theta, _ = fit(self.wins, theta0=self.theta)
+
+    def results(self):
+        """Every result added so far, as (winner, loser, 'A')"""
+        with self._lock:
+            return [(self.models[i], self.models[j], 'A') for i, j in self.matches]
+
+    def bootstrap_intervals(self, samples=None, confidence=CONFIDENCE):
+        """Percentile intervals of theta from resampling matches with replacement"""
+        with self._lock:
+            n = len(self.models)
+            matches = np.array(self.matches, dtype=np.int64).reshape(-1, 2)
+            theta = self.theta.copy()
+        samples = samples or self.bootstrap_samples
+        if not len(matches):
+            # (low, high) rows like the resampled ones, unbounded as for a model first seen after a bootstrap
+            return np.tile([-np.inf, np.inf], (n, 1))
+
+        # Resample counts per match, then scatter them into one wins matrix per resample
+        counts = self.rng.multinomial(len(matches), np.full(len(matches), 1 / len(matches)), size=samples)
+        pair_ids = matches[:, 0] * n + matches[:, 1]
+        wins = np.zeros((samples, n * n))
+        np.add.at(wins, (slice(None), pair_ids), counts)
+        boot_theta, _ = fit(wins.reshape(samples, n, n), theta0=theta, tol=1e-6, max_iter=1000)
+
+        alpha = (1 - confidence) / 2
+        return np.quantile(boot_theta, [alpha, 1 - alpha], axis=0).T
+
+    def leaderboard(self):
+        """Rows sorted by rating; scores are exp(theta), with geometric mean 1"""
+        stale = self._intervals is None or len(self._intervals) != len(self.models)
+        if stale or time.monotonic() - self._intervals_time > self.interval_refresh:
+            self._intervals = self.bootstrap_intervals()
+            self._intervals_time = time.monotonic()
+        with self._lock:
+            # A model first seen after the bootstrap gets an unbounded interval until the next refresh
+            intervals = list(self._intervals) + [(-np.inf, np.inf)] * (len(self.models) - len(self._intervals))
+            wins = self.wins.sum(axis=1)
+            losses = self.wins.sum(axis=0)
+            rows = [
+                {
+                    'model': model,
+                    'score': float(np.exp(self.theta[i])),
+                    'ci_low': float(np.exp(intervals[i][0])),
+                    'ci_high': float(np.exp(intervals[i][1])),
+                    'wins': int(wins[i]),
+                    'losses': int(losses[i]),
+                    'win_rate': float(wins[i] / (wins[i] + losses[i])) if wins[i] + losses[i] else 0.0,
+                }
+                for i, model in enumerate(self.models)
+            ]
+        return sorted(rows, key=lambda row: row['score'], reverse=True)
+
+    def write_leaderboard(self, path="leaderboard"):
+        """Write <path>.json and a README-style <path>.md table, replacing them atomically"""
+        with self._write_lock:
+            self._write_leaderboard(path)
+
+    def _write_leaderboard(self, path):
+        rows = self.leaderboard()
+        lines = [
+            "| Modelo | Pontuação | IC 95% | Vit | Der | % Vit |",
+            "|--------|-----------|--------|-----|-----|-------|",
+        ]
+        for row in rows:
+            lines.append(
+                f"| {row['model'].split('/')[-1]} | {row['score']:.2f} | "
+                f"{row['ci_low']:.2f} – {row['ci_high']:.2f} | {row['wins']} | {row['losses']} | "
+                f"{row['win_rate'] * 100:.1f} |"
+            )
+
+        atomic_write(f"{path}.json", json.dumps(rows, indent=2, ensure_ascii=False))
+        atomic_write(f"{path}.md", "\n".join(lines) + "\n")
+
+
+if __name__ == '__main__':
+    service = RatingService(load_match_results())
+    service.write_leaderboard()
+    print(open("leaderboard.md", encoding="utf-8").read())
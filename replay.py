@@ -0,0 +1,315 @@
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import repeat
+from engine import TrucoEngine, CARD_INDEX, NUM_CARDS
+from event_log import EVENT_DIR, event_decisions, event_log_path, read_events
+from llm_play import run_match
+from trace_store import TRACE_DIR, trace_files, read_trace_records, legacy_match_id
+
+REPLAY_TYPES = {'match_start', 'decision', 'match_end'}
+
+
+class ReplayDivergence(Exception):
+    """The replayed match asked for a decision the trace does not have"""
+
+
+class NotReplayable(Exception):
+    """The match has neither a seed nor an event log to rebuild its deals from"""
+
+
+class ReplayPlayer:
+    """Player that answers with the decisions logged for its seat, in order"""
+
+    def __init__(self, name, decisions):
+        self.name = name
+        self.model = f"replay-{name}"
+        self.total_cost = 0.0
+        self.decisions = deque(decisions)
+
+    def _next(self, action_type):
+        if not self.decisions:
+            raise ReplayDivergence(f"Player {self.name} has no logged decision left for '{action_type}'")
+        logged_type, action = self.decisions.popleft()
+        if logged_type != action_type:
+            raise ReplayDivergence(f"Player {self.name} logged '{logged_type}' but the engine asked for '{action_type}'")
+        return action
+
+    def decide_bet(self, game_state):
+        return self._next('bet')
+
+    def decide_play(self, game_state):
+        return self._next('play')
+
+
+class HookedReplayPlayer(ReplayPlayer):
+    """ReplayPlayer that passes each logged decision to hook(player, action_type, action) before returning it"""
+
+    def __init__(self, name, decisions, hook):
+        super().__init__(name, decisions)
+        self.hook = hook
+
+    def decide_bet(self, game_state):
+        action = self._next('bet')
+        self.hook(self.name, 'bet', action)
+        return action
+
+    def decide_play(self, game_state):
+        action = self._next('play')
+        self.hook(self.name, 'play', action)
+        return action
+
+
+class LoggedDealEngine(TrucoEngine):
+    """TrucoEngine that deals the hands of an event log, in order, instead of shuffling"""
+
+    def __init__(self, deals):
+        super().__init__()
+        self.deals = deque(deals)
+
+    def new_hand(self):
+        if not self.deals:
+            raise ReplayDivergence("The event log has no hand left to deal")
+        vira, hand_a, hand_b = self.deals.popleft()
+        self.round_winners = []
+        self.played_cards = []
+        self.player_hands = {0: list(hand_a), 1: list(hand_b)}
+        self.dealt_hands = {0: list(hand_a), 1: list(hand_b)}
+        dealt = {CARD_INDEX[card] for card in (vira, *hand_a, *hand_b)}
+        self.deck = [idx for idx in range(NUM_CARDS) if idx not in dealt]
+        self.vira_index = CARD_INDEX[vira]
+        self.vira = vira
+        self._set_manilhas()
+        self.current_bet = 1
+        self.bet_stack = []
+
+
+def event_replay(events):
+    """(engine, decisions) rebuilding a match from its event log, for matches traced without a seed"""
+    deals, decisions = event_decisions(events)
+    return LoggedDealEngine(deals), decisions
+
+
+class NullEventLogger:
+    """Stand-in for MatchEventLogger that keeps nothing"""
+
+    def __init__(self):
+        self.events = []
+
+    def log_hand_start(self, *args, **kwargs):
+        pass
+
+    def log_betting_action(self, *args, **kwargs):
+        pass
+
+    def log_card_play(self, *args, **kwargs):
+        pass
+
+    def log_round_end(self, *args, **kwargs):
+        pass
+
+    def log_hand_end(self, *args, **kwargs):
+        pass
+
+    def log_match_end(self, *args, **kwargs):
+        pass
+
+
+def load_trace(records):
+    """Split one match's trace records into header, per-player decisions and final scores"""
+    header = None
+    final_scores = None
+    decisions = {'A': [], 'B': []}
+
+    for record in records:
+        record_type = record.get('type')
+        if record_type == 'match_start':
+            header = record
+        elif record_type == 'decision':
+            decisions[record['player']].append((record['action_type'], record['action']))
+        elif record_type == 'match_end':
+            final_scores = record['final_scores']
+
+    return header, decisions, final_scores
+
+
+def replay_match(match_id, records):
+    """Rebuild a match from its trace records and compare the final scores with the logged ones"""
+    header, decisions, logged_scores = load_trace(records)
+    result = {'match_id': match_id, 'logged_scores': logged_scores, 'replayed_scores': None}
+
+    if header is None or header.get('seed') is None:
+        result['status'] = 'not_replayable'  # Traces written before seeds were recorded
+        return result
+
+    engine = TrucoEngine(seed=header['seed'])
+    player_a = ReplayPlayer('A', decisions['A'])
+    player_b = ReplayPlayer('B', decisions['B'])
+
+    try:
+        completed = run_match(engine, player_a, player_b, NullEventLogger())
+    except (ReplayDivergence, ValueError) as e:  # ValueError: a logged card the replayed deal did not give
+        result['status'] = 'incomplete' if logged_scores is None else 'diverged'
+        result['error'] = str(e)
+        return result
+
+    result['replayed_scores'] = {'A': engine.scores[0], 'B': engine.scores[1]}
+    if not completed or logged_scores is None:
+        result['status'] = 'incomplete'
+    elif result['replayed_scores'] == logged_scores:
+        result['status'] = 'ok'
+    else:
+        result['status'] = 'score_mismatch'
+    return result
+
+
+def replay_decisions(engine, decisions, hook):
+    """Play the logged decisions on engine, calling hook(engine, player, action_type, action) before each is applied"""
+    def record(player, action_type, action):
+        hook(engine, player, action_type, action)
+
+    return run_match(engine, HookedReplayPlayer('A', decisions['A'], record),
+                     HookedReplayPlayer('B', decisions['B'], record), NullEventLogger())
+
+
+def replay_rows(match_id, records, hook, event_dir=EVENT_DIR):
+    """Rows hook(engine, player, action_type, action) returns for the logged decisions of one match.
+
+    The match is replayed from its seed and the hook sees the engine before
+    each decision is applied; it returns a row dict, or None to skip the
+    decision. Rows get the match_id, player, action_type and model. Matches
+    traced without a seed are rebuilt from the deals and actions of their
+    event log instead. An unfinished match ends where its log does; any
+    other failure to replay is raised, NotReplayable if there is nothing to
+    replay from.
+    """
+    header, decisions, logged_scores = load_trace(records)
+    if header is not None:
+        models = {'A': header['model_a'], 'B': header['model_b']}
+    else:
+        # Baseline traces name each seat's model in its completions only
+        models = {record.get('player'): record.get('model') for record in records
+                  if record.get('type', 'completion') == 'completion'}
+
+    if header is not None and header.get('seed') is not None:
+        engine = TrucoEngine(seed=header['seed'])
+        finished = logged_scores is not None
+    else:
+        events = read_events(event_log_path(match_id, event_dir))
+        if events is None:
+            raise NotReplayable(f"Match {match_id} has no seed and no event log")
+        engine, decisions = event_replay(events)
+        finished = any(event['event'] == 'match_end' for event in events)
+    rows = []
+
+    def record(engine, player, action_type, action):
+        row = hook(engine, player, action_type, action)
+        if row is not None:
+            row.update(match_id=match_id, player=player, action_type=action_type, model=models.get(player))
+            rows.append(row)
+
+    try:
+        replay_decisions(engine, decisions, record)
+    except ReplayDivergence:
+        if finished:
+            raise
+    return rows
+
+
+def _rows_or_error(hook, event_dir, match_id, records):
+    """replay_rows, as (rows, None), or ([], the reason) for a match that could not be replayed"""
+    try:
+        return replay_rows(match_id, records, hook, event_dir), None
+    except Exception as e:
+        return [], f"{match_id}: {type(e).__name__}: {e}"
+
+
+def replay_corpus_rows(hook, trace_dir=TRACE_DIR, workers=None, event_dir=EVENT_DIR):
+    """(rows, skipped) of replay_rows over every match, skipped holding the reason of each match that failed"""
+    rows = []
+    skipped = []
+    for match_rows, error in map_matches(partial(_rows_or_error, hook, event_dir), trace_dir, workers):
+        rows.extend(match_rows)
+        if error is not None:
+            skipped.append(error)
+    return rows, skipped
+
+
+def _map_file(func, path):
+    """func over the matches that start and end in one trace file, plus the records of the others.
+
+    A legacy per-match file is a whole match. Baseline ones hold only
+    completions, of which the seat and model are kept.
+    """
+    legacy = legacy_match_id(path) is not None
+    matches = {}
+    for record in read_trace_records(path):
+        record_type = record.get('type', 'completion')
+        if record_type in REPLAY_TYPES:
+            matches.setdefault(record['match_id'], []).append(record)
+        elif legacy and record_type == 'completion':
+            matches.setdefault(record['match_id'], []).append(
+                {'type': 'completion', 'match_id': record['match_id'], 'player': record.get('player'),
+                 'model': record.get('model')}
+            )
+
+    results = []
+    unfinished = {}
+    for match_id, records in matches.items():
+        types = {record['type'] for record in records}
+        if legacy or ('match_start' in types and 'match_end' in types):
+            results.append(func(match_id, records))
+        else:
+            unfinished[match_id] = records
+    return results, unfinished
+
+
+def map_matches(func, trace_dir=TRACE_DIR, workers=None):
+    """func(match_id, records) for every match in the traces, across worker processes.
+
+    Each worker reads its own trace files, so the parent never holds the
+    corpus. Matches a segment rotation split across files, and unfinished
+    ones, come back as records and are mapped once every file is read.
+    """
+    unfinished = {}
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for file_results, file_unfinished in executor.map(_map_file, repeat(func), trace_files(trace_dir)):
+            results.extend(file_results)
+            for match_id, records in file_unfinished.items():
+                unfinished.setdefault(match_id, []).extend(records)
+        results.extend(executor.map(func, unfinished.keys(), unfinished.values(), chunksize=16))
+    return results
+
+
+def replay_corpus(trace_dir=TRACE_DIR, workers=None):
+    """Replay every match in the traces across worker processes, returns replay_match's results"""
+    return map_matches(replay_match, trace_dir, workers)
+
+
+def print_skipped(skipped, examples=5):
+    """Report the matches a corpus scorer could not replay, with a few of the reasons"""
+    if not skipped:
+        return
+    print(f"Skipped {len(skipped)} matches that could not be replayed:")
+    for reason in skipped[:examples]:
+        print(f"  {reason}")
+    if len(skipped) > examples:
+        print(f"  ... and {len(skipped) - examples} more")
+
+
+def print_replay_report(results):
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+        if result['status'] in ('diverged', 'score_mismatch'):
+            print(f"{result['status']}: {result['match_id']} logged={result['logged_scores']} "
+                  f"replayed={result['replayed_scores']} {result.get('error', '')}")
+
+    print(f"Replayed {len(results)} traces: {counts}")
+    return counts
+
+
+if __name__ == '__main__':
+    print_replay_report(replay_corpus(sys.argv[1] if len(sys.argv) > 1 else TRACE_DIR))
@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from metrics import get_metrics, percentile
+from mock_llm_server import MockConfig, serve
+
+CONCURRENCY_LEVELS = (1, 8, 32, 128)
+MOCK_MODELS = ('openai/mock-random', 'openai/mock-aggressive')
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mock_server(config):
+    """Run the mock provider in its own process, so it does not compete with the runner for the GIL"""
+    port = _free_port()
+    ready = multiprocessing.Event()
+    process = multiprocessing.Process(target=serve, args=(config, "127.0.0.1", port, ready), daemon=True)
+    process.start()
+    if not ready.wait(30):
+        process.terminate()
+        raise RuntimeError("Mock LLM server did not start")
+    return process, f"http://127.0.0.1:{port}/v1"
+
+
+def server_stats(api_base):
+    with urllib.request.urlopen(f"{api_base}/stats", timeout=10) as response:
+        return json.load(response)
+
+
+def run_level(concurrency, num_matches, player_options=None):
+    """Play num_matches through the asyncio runner with `concurrency` matches and requests in flight"""
+    # Imported here so litellm loads after run_benchmark has pointed it at the mock server
+    from async_runner import ProviderLimiter, run_tournament
+
+    metrics = get_metrics()
+    metrics.reset()
+    pairs = [MOCK_MODELS if i % 2 == 0 else MOCK_MODELS[::-1] for i in range(num_matches)]
+    limiter = ProviderLimiter({'openai/': concurrency})
+    start = time.perf_counter()
+    failures = asyncio.run(run_tournament(pairs, limiter, max_matches_in_flight=concurrency,
+                                          player_options=player_options))
+    elapsed = time.perf_counter() - start
+
+    wall_times = metrics.samples('wall_time')
+    latencies = metrics.samples('latency')
+    retries = sum(row['retries'] for row in metrics.summary()['decisions'])
+    return {
+        'concurrency': concurrency,
+        'matches': num_matches,
+        'failures': failures,
+        'seconds': elapsed,
+        'matches_per_minute': (num_matches - failures) / elapsed * 60,
+        'decisions': len(wall_times),
+        'decisions_per_second': len(wall_times) / elapsed,
+        'retries': retries,
+        'decision_seconds': {f'p{int(q * 100)}': percentile(wall_times, q) for q in (0.5, 0.95, 0.99)},
+        'request_seconds': {f'p{int(q * 100)}': percentile(latencies, q) for q in (0.5, 0.95, 0.99)},
+    }
+
+
+def run_benchmark(config, levels=CONCURRENCY_LEVELS, matches_per_level=None, player_options=None):
+    """Runner throughput and tail latency at each concurrency level against one mock server"""
+    process, api_base = start_mock_server(config)
+    os.environ["OPENAI_API_BASE"] = api_base
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")  # No price map download
+    try:
+        results = []
+        for level in levels:
+            num_matches = matches_per_level or max(2 * level, 8)
+            results.append(run_level(level, num_matches, player_options))
+            results[-1]['server'] = server_stats(api_base)
+        return results
+    finally:
+        process.terminate()
+        process.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Runner throughput against the mock LLM server")
+    parser.add_argument('--levels', default=",".join(map(str, CONCURRENCY_LEVELS)))
+    parser.add_argument('--matches', type=int, default=None, help="matches per level, default 2x the concurrency")
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--latency-sigma', type=float, default=0.5)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--malformed-rate', type=float, default=0.0)
+    parser.add_argument('--reasoning-tokens', type=int, default=0)
+    parser.add_argument('--reasoning-tokens-per-second', type=float, default=0.0)
+    parser.add_argument('--output', default="runner_benchmark.json")
+    args = parser.parse_args()
+
+    config = MockConfig('random', args.latency, args.latency_sigma, args.error_rate, args.rate_limit_rate,
+                        args.malformed_rate, args.reasoning_tokens, args.reasoning_tokens_per_second, seed=0)
+    output = Path(args.output).resolve()
+    # Traces, checkpoints and match histories of the benchmark go to a scratch directory
+    os.chdir(tempfile.mkdtemp(prefix="truco_bench_"))
+    results = run_benchmark(config, [int(level) for level in args.levels.split(",")], args.matches)
+    output.write_text(json.dumps(results, indent=2))
+
+    print("| Concorrência | Partidas | Falhas | Partidas/min | Decisões/s | Retries "
+          "| Decisão p50 (s) | Decisão p95 (s) | Decisão p99 (s) |")
+    print("|--------------|----------|--------|--------------|------------|---------"
+          "|-----------------|-----------------|-----------------|")
+    for row in results:
+        tail = row['decision_seconds']
+        print(f"| {row['concurrency']} | {row['matches']} | {row['failures']} | {row['matches_per_minute']:.1f} | "
+              f"{row['decisions_per_second']:.1f} | {row['retries']} | " +
+              " | ".join(f"{tail[key]:.3f}" if tail[key] is not None else "-" for key in ('p50', 'p95', 'p99')) + " |")
+    print(f"Wrote {output}")
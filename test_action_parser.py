@@ -0,0 +1,53 @@
+import pytest
+from action_parser import ActionParseError, parse_action
+
+HAND = [('7', 'C'), ('A', 'P'), ('K', 'O')]
+
+
+def test_strict_json():
+    assert parse_action('{"action": "bet", "bet_type": "truco"}', 'bet') == (
+        {'action': 'bet', 'bet_type': 'truco'}, 'strict')
+    assert parse_action('```json\n{"action": "play", "card": ["A", "P"]}\n```', 'play', HAND) == (
+        {'action': 'play', 'card': ['A', 'P']}, 'strict')
+
+
+def test_single_quoted_python_dict():
+    assert parse_action("```python\n{'action': 'accept'}\n```", 'bet') == ({'action': 'accept'}, 'strict')
+    assert parse_action("{'action': 'play', 'card': ('K', 'O')}", 'play', HAND) == (
+        {'action': 'play', 'card': ['K', 'O']}, 'strict')
+
+
+def test_bare_words_are_rescued():
+    # The old regex + eval parser raised on these, costing a re-query each
+    assert parse_action("{action: bet, bet_type: six}", 'bet') == ({'action': 'bet', 'bet_type': 'six'}, 'rescued')
+    assert parse_action('{"action": "play", card: [7, C]}', 'play', HAND) == (
+        {'action': 'play', 'card': ['7', 'C']}, 'rescued')
+    assert parse_action("Correr", 'bet') == ({'action': 'run'}, 'rescued')
+
+
+def test_portuguese_names():
+    assert parse_action('{"ação": "aceitar"}', 'bet') == ({'action': 'accept'}, 'tolerant')
+    # Card names the old parser could not match against the hand
+    assert parse_action('{"action": "play", "card": "Ás de Paus"}', 'play', HAND) == (
+        {'action': 'play', 'card': ['A', 'P']}, 'rescued')
+    assert parse_action('{"action": "play", "card": ["Rei", "Ouros"]}', 'play', HAND) == (
+        {'action': 'play', 'card': ['K', 'O']}, 'rescued')
+
+
+def test_last_dict_is_the_answer():
+    content = ('Posso apostar {"action": "bet", "bet_type": "truco"} ou passar.\n'
+               'Resposta final:\n```json\n{"action": "pass"}\n```')
+    assert parse_action(content, 'bet') == ({'action': 'pass'}, 'strict')
+
+
+def test_wrong_phase_or_card():
+    with pytest.raises(ActionParseError):
+        parse_action('{"action": "bet", "bet_type": "truco"}', 'play', HAND)
+    with pytest.raises(ActionParseError):
+        parse_action('{"action": "play", "card": ["3", "E"]}', 'play', HAND)
+    with pytest.raises(ActionParseError):
+        parse_action("Vou pensar melhor sobre essa jogada.", 'bet')
+
+
+def test_bet_dict_without_action_falls_back_to_pass():
+    assert parse_action('{"acao": "talvez"}', 'bet') == ({'action': 'pass'}, 'fallback')
@@ -0,0 +1,103 @@
+import json
+from decision_index import DecisionIndex
+from engine import TrucoEngine
+from event_log import EventLogRecorder
+from llm_play import DECISION_STATE_KEYS, run_match
+from replay import NullEventLogger
+
+MATCH_ID = "20250101_120000_abcdef12"
+
+
+def _completion(player, model, action_type, content):
+    """Completion record as the baseline MatchTraceLogger wrote it: no type, no match_id"""
+    return {
+        'timestamp': "2025-01-01T12:00:00",
+        'model': model,
+        'player': player,
+        'action_type': action_type,
+        'messages': [{'role': 'user', 'content': "..."}],
+        'response': {
+            'choices': [{'message': {'role': 'assistant', 'content': content}}],
+            'usage': {'prompt_tokens': 100, 'completion_tokens': 10},
+        },
+    }
+
+
+class PassingPlayer:
+    """Passes every bet and plays its first card, logging baseline completions and the states it saw"""
+
+    def __init__(self, name, model, completions):
+        self.name = name
+        self.model = model
+        self.completions = completions
+        self.seen = []
+
+    def decide_bet(self, state):
+        if not self.seen:
+            # An answer the parser cannot read, retried as the baseline did
+            self.completions.append(_completion(self.name, self.model, 'bet', "Vou pensar..."))
+        self.seen.append(('bet', {key: state[key] for key in DECISION_STATE_KEYS}))
+        self.completions.append(_completion(self.name, self.model, 'bet', "```python\n{'action': 'pass'}\n```"))
+        return {'action': 'pass'}
+
+    def decide_play(self, state):
+        card = list(state['my_cards'][0])
+        self.seen.append(('play', {key: state[key] for key in DECISION_STATE_KEYS}))
+        self.completions.append(_completion(self.name, self.model, 'play',
+                                            f"{{'action': 'play', 'card': {card!r}}}"))
+        return {'action': 'play', 'card': card}
+
+
+def _baseline_match(tmp_path):
+    completions = []
+    player_a = PassingPlayer('A', 'openai/model-a', completions)
+    player_b = PassingPlayer('B', 'openai/model-b', completions)
+    logger = NullEventLogger()
+    logger.match_id = MATCH_ID
+    events = EventLogRecorder(logger)
+    engine = TrucoEngine(seed=7)
+    assert run_match(engine, player_a, player_b, events)
+    events.log_match_end({'A': engine.scores[0], 'B': engine.scores[1]}, 'A', {'A': 0.0, 'B': 0.0})
+    events.save(tmp_path / "match_history")
+
+    trace_dir = tmp_path / "match_traces"
+    trace_dir.mkdir()
+    with open(trace_dir / f"match_trace_{MATCH_ID}.jsonl", "w", encoding="utf-8") as f:
+        for record in completions:
+            f.write(json.dumps(record) + "\n")
+    return trace_dir, player_a, player_b
+
+
+def test_baseline_trace_gets_one_row_per_answer(tmp_path):
+    trace_dir, player_a, player_b = _baseline_match(tmp_path)
+    index = DecisionIndex(tmp_path / "index.sqlite")
+    assert index.ingest(trace_dir, tmp_path / "match_history") == 1
+
+    for player in (player_a, player_b):
+        rows = index.query(
+            "SELECT * FROM decisions WHERE player = ? ORDER BY rowid", (player.name,)
+        )
+        assert len(rows) == len(player.seen)
+        assert {row['model'] for row in rows} == {player.model}
+        assert [(row['action_type'], {key: row[key] for key in DECISION_STATE_KEYS}) for row in rows] == player.seen
+        assert all(row['prompt_tokens'] == 100 * (row['retries'] + 1) for row in rows)
+
+    first = index.query("SELECT * FROM decisions WHERE player = 'A' ORDER BY rowid LIMIT 1")[0]
+    assert (first['action'], first['retries'], first['parse_failures'], first['parse']) == ('pass', 1, 1, 'strict')
+
+    behavior = index.behavior()
+    assert [row['model'] for row in behavior] == ['openai/model-a', 'openai/model-b']
+    assert all(row['bet_rate'] == 0.0 for row in behavior)
+    assert index.ingest(trace_dir, tmp_path / "match_history") == 0
+    index.close()
+
+
+def test_baseline_trace_without_event_log(tmp_path):
+    trace_dir, player_a, player_b = _baseline_match(tmp_path)
+    index = DecisionIndex(tmp_path / "index.sqlite")
+    index.ingest(trace_dir, tmp_path / "missing")
+
+    rows = index.query("SELECT action, card, my_score FROM decisions WHERE action_type = 'play'")
+    assert len(rows) == sum(action_type == 'play' for action_type, _ in player_a.seen + player_b.seen)
+    assert all(row['action'] == 'play' and row['card'] and row['my_score'] is None for row in rows)
+    index.close()
@@ -0,0 +1,32 @@
+from engine import TrucoEngine
+from mcts_player import HandState
+from endgame_solver import EndgameSolver
+
+
+def _hand_after(seed, scores, actions):
+    """Engine and HandState of a fresh seeded hand at `scores` after the given action keys"""
+    engine = TrucoEngine(seed=seed)
+    engine.new_hand()
+    engine.scores = list(scores)
+    engine.start_betting_phase()
+    state = HandState(engine, betting_done=False)
+    for action in actions:
+        state.apply(action)
+    return engine, state
+
+
+def test_hand_won_in_round_two_is_awarded_once():
+    # A wins round 1 and then round 2 with either card, ending the hand 2-0 with a card left each
+    engine, state = _hand_after(1, (10, 0), [('pass',), ('pass',), ('play', ('6', 'P')), ('play', ('5', 'O')),
+                                             ('pass',), ('pass',)])
+    values = EndgameSolver().action_values(engine.snapshot(), state.betting_done)
+    assert values == {('play', ('3', 'P')): 1.0, ('play', ('5', 'P')): 1.0}
+
+
+def test_apply_reports_the_hand_finished():
+    engine, state = _hand_after(1, (10, 0), [('pass',), ('pass',), ('play', ('6', 'P')), ('play', ('5', 'O')),
+                                             ('pass',), ('pass',), ('play', ('3', 'P'))])
+    assert state.apply(('play', ('Q', 'P')))
+    assert engine.scores == [11, 0]
+    assert HandState(engine, state.betting_done, finished=True).decision() is None
+    assert engine.scores == [11, 0]
@@ -0,0 +1,69 @@
+import json
+from decision_quality import decision_features
+from engine import TrucoEngine
+from event_log import EventLogRecorder
+from llm_play import run_match
+from replay import NullEventLogger, replay_rows, replay_corpus_rows
+
+MATCH_ID = "20250101_120000_abcdef12"
+
+
+class FirstCardPlayer:
+    """Bets truco once per match, passes otherwise (accepting a pending bet) and plays its first card"""
+
+    def __init__(self, name, records):
+        self.name = name
+        self.model = f"model-{name}"
+        self.records = records
+
+    def _log(self, action_type, action):
+        self.records.append({'type': 'decision', 'match_id': MATCH_ID, 'player': self.name,
+                             'action_type': action_type, 'action': action})
+        return action
+
+    def decide_bet(self, state):
+        if self.name == 'A' and not state['bet_history'] and not self.records[1:]:
+            return self._log('bet', {'action': 'bet', 'bet_type': 'truco'})
+        return self._log('bet', {'action': 'pass'})
+
+    def decide_play(self, state):
+        return self._log('play', {'action': 'play', 'card': list(state['my_cards'][0])})
+
+
+def _seeded_match(tmp_path, seed=11):
+    records = [{'type': 'match_start', 'match_id': MATCH_ID, 'model_a': 'model-A', 'model_b': 'model-B',
+                'seed': seed}]
+    logger = NullEventLogger()
+    logger.match_id = MATCH_ID
+    events = EventLogRecorder(logger)
+    engine = TrucoEngine(seed=seed)
+    assert run_match(engine, FirstCardPlayer('A', records), FirstCardPlayer('B', records), events)
+    scores = {'A': engine.scores[0], 'B': engine.scores[1]}
+    records.append({'type': 'match_end', 'match_id': MATCH_ID, 'final_scores': scores})
+    events.log_match_end(scores, 'A' if scores['A'] >= 12 else 'B', {'A': 0.0, 'B': 0.0})
+    events.save(tmp_path / "match_history")
+    return records
+
+
+def test_match_without_seed_is_rebuilt_from_its_event_log(tmp_path):
+    records = _seeded_match(tmp_path)
+    seeded = replay_rows(MATCH_ID, records, decision_features, tmp_path / "match_history")
+
+    unseeded = [dict(record) for record in records]
+    del unseeded[0]['seed']
+    rebuilt = replay_rows(MATCH_ID, unseeded, decision_features, tmp_path / "match_history")
+    assert seeded and rebuilt == seeded
+    assert any(row['action'] == 'bet' for row in rebuilt)
+
+
+def test_corpus_counts_matches_that_cannot_be_replayed(tmp_path):
+    trace_dir = tmp_path / "match_traces"
+    trace_dir.mkdir()
+    # A baseline trace: completions only, and no event log to rebuild the deals from
+    with open(trace_dir / f"match_trace_{MATCH_ID}.jsonl", "w", encoding="utf-8") as f:
+        f.write(json.dumps({'model': 'model-A', 'player': 'A', 'action_type': 'bet', 'response': {}}) + "\n")
+
+    rows, skipped = replay_corpus_rows(decision_features, trace_dir, workers=1,
+                                       event_dir=tmp_path / "match_history")
+    assert rows == []
+    assert len(skipped) == 1 and 'NotReplayable' in skipped[0]
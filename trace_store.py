@@ -0,0 +1,272 @@
+import atexit
+import gzip
+import io
+import json
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:  # zstd segments are optional, gzip is always available
+    zstandard = None
+
+TRACE_DIR = "match_traces"
+SEGMENT_BYTES = 64 * 1024 ** 2  # Uncompressed bytes per segment before rotating
+BATCH_RECORDS = 256
+LEGACY_PATTERN = "match_trace_*.jsonl"  # One plain file per match, before segments
+SEGMENT_PATTERNS = ("traces_*.jsonl.gz", "traces_*.jsonl.zst")
+
+
+def _encode(value):
+    """json.dumps fallback for litellm responses and other pydantic objects"""
+    if hasattr(value, 'model_dump'):
+        return value.model_dump()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class TraceWriter:
+    """Background writer shared by every match in the process.
+
+    Callers only enqueue records; JSON encoding (including the
+    response.model_dump() of completions), compression and file I/O happen on
+    one writer thread, in batches. Records from all matches go to rotating
+    compressed segments and carry their match_id.
+
+    A record that cannot be encoded is reported and dropped. An I/O error
+    drops the current segment (the next batch starts a new one) and is raised
+    from the next flush(match_id) of each match that had records in it, so a
+    match learns its own records were lost and no other match fails with it.
+    flush() and close() without a match raise the first error of any match.
+    """
+
+    def __init__(self, trace_dir=TRACE_DIR, compression=None, segment_bytes=SEGMENT_BYTES):
+        self.trace_dir = Path(trace_dir)
+        self.trace_dir.mkdir(exist_ok=True)
+        self.compression = compression or ('zstd' if zstandard else 'gzip')
+        if self.compression == 'zstd' and zstandard is None:
+            raise ValueError("zstd compression needs the 'zstandard' package")
+        self.segment_bytes = segment_bytes
+        self.records_written = 0
+
+        self._queue = queue.Queue()
+        self._file = None
+        self._raw_file = None
+        self._segment_size = 0
+        self._segment_seq = 0
+        self._closed = False
+        self._segment_matches = set()  # match_ids with records in the current segment
+        self._error = None
+        self._match_errors = {}
+        self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, record):
+        """Enqueue a record; it is encoded and written on the writer thread"""
+        if self._closed:
+            raise ValueError("TraceWriter is closed")
+        self._queue.put(record)
+
+    def flush(self, match_id=None):
+        """Block until every record enqueued so far is written and flushed.
+
+        Raises the I/O error that lost records of match_id, or of any match
+        when match_id is None.
+        """
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+        self._raise_error(match_id)
+
+    def close(self):
+        """Flush, finish the current segment and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self._raise_error()
+
+    def _raise_error(self, match_id=None):
+        """Re-raise, once, the first I/O error that lost records of match_id (of any match if None)"""
+        if match_id is None:
+            error, self._error = self._error, None
+        else:
+            error = self._match_errors.pop(match_id, None)
+        if error is not None:
+            raise error
+
+    def _fail(self, error, match_ids):
+        print(f"Trace writer error: {error}")
+        if self._error is None:
+            self._error = error
+        for match_id in self._segment_matches | match_ids:
+            self._match_errors.setdefault(match_id, error)
+        self._segment_matches = set()
+        try:
+            self._close_segment()
+        except Exception:
+            pass
+        self._file = None
+        self._raw_file = None
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < BATCH_RECORDS:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            lines = []
+            match_ids = set()
+            for item in batch:
+                if isinstance(item, dict):
+                    match_ids.add(item.get('match_id'))
+                    try:
+                        lines.append(json.dumps(item, ensure_ascii=False, default=_encode) + '\n')
+                    except Exception as e:
+                        print(f"Dropping {item.get('type', 'completion')} trace record "
+                              f"of match {item.get('match_id')}: {e}")
+
+            # Sync markers (flush/close) are handled after the records queued before them,
+            # and always released, so a failed write never leaves a caller waiting
+            markers = [item for item in batch if not isinstance(item, dict)]
+            try:
+                if lines:
+                    self._write_lines(lines)
+                    self._segment_matches |= match_ids
+                if markers:
+                    self._flush_file()
+            except Exception as e:
+                self._fail(e, match_ids)
+            for item in markers:
+                if item is None:
+                    try:
+                        self._close_segment()
+                    except Exception as e:
+                        self._fail(e, set())
+                    return
+                item.set()
+
+    def _write_lines(self, lines):
+        data = ''.join(lines).encode('utf-8')
+        if self._file is None or self._segment_size + len(data) > self.segment_bytes:
+            self._close_segment()
+            self._open_segment()
+        self._file.write(data)
+        self._segment_size += len(data)
+        self.records_written += len(lines)
+
+    def _open_segment(self):
+        timestamp = datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')
+        suffix = 'zst' if self.compression == 'zstd' else 'gz'
+        path = self.trace_dir / f"traces_{timestamp}_{os.getpid()}_{self._segment_seq:04d}.jsonl.{suffix}"
+        self._segment_seq += 1
+        self._raw_file = open(path, 'wb')
+        if self.compression == 'zstd':
+            self._file = zstandard.ZstdCompressor().stream_writer(self._raw_file)
+        else:
+            self._file = gzip.GzipFile(fileobj=self._raw_file, mode='wb')
+        self._segment_size = 0
+        self._segment_matches = set()
+
+    def _flush_file(self):
+        if self._file is None:
+            return
+        # A sync flush makes everything written so far readable even if the process dies
+        if self.compression == 'zstd':
+            self._file.flush(zstandard.FLUSH_BLOCK)
+        else:
+            self._file.flush()
+        self._raw_file.flush()
+
+    def _close_segment(self):
+        if self._file is not None:
+            self._file.close()
+            self._raw_file.close()
+            self._file = None
+            self._raw_file = None
+
+
+_default_writer = None
+_default_writer_lock = threading.Lock()
+
+def get_trace_writer():
+    """The process-wide TraceWriter, created on first use and closed at exit"""
+    global _default_writer
+    with _default_writer_lock:
+        if _default_writer is None:
+            _default_writer = TraceWriter()
+            atexit.register(_default_writer.close)
+        return _default_writer
+
+
+def atomic_write(path, text):
+    """Write text to path through a temporary file, so readers never see a partial file"""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _open_text(path):
+    path = Path(path)
+    if path.suffix == '.gz':
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if path.suffix == '.zst':
+        if zstandard is None:
+            raise ValueError(f"Reading {path} needs the 'zstandard' package")
+        stream = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return io.TextIOWrapper(stream, encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def trace_files(trace_dir=TRACE_DIR):
+    """Legacy per-match files and segments, in write order"""
+    trace_dir = Path(trace_dir)
+    paths = sorted(trace_dir.glob(LEGACY_PATTERN))
+    for pattern in SEGMENT_PATTERNS:
+        paths.extend(sorted(trace_dir.glob(pattern)))
+    return paths
+
+
+def legacy_match_id(path):
+    """match_id of a legacy per-match trace file, None for segments"""
+    name = Path(path).name
+    if name.startswith("match_trace_"):
+        return name[len("match_trace_"):-len(".jsonl")]
+    return None
+
+
+def read_trace_records(path):
+    """Yield the records of one trace file, stopping quietly at a truncated tail"""
+    legacy_id = legacy_match_id(path)
+
+    with _open_text(path) as f:
+        try:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # Partially written last line
+                if legacy_id and 'match_id' not in record:
+                    record['match_id'] = legacy_id
+                yield record
+        except EOFError:
+            pass  # Segment left open by a crashed writer
+
+
+def load_match_traces(trace_dir=TRACE_DIR, types=None):
+    """Group trace records by match_id, optionally keeping only some record types"""
+    matches = {}
+    for path in trace_files(trace_dir):
+        for record in read_trace_records(path):
+            if types is not None and record.get('type', 'completion') not in types:
+                continue
+            matches.setdefault(record['match_id'], []).append(record)
+    return matches